@@ -0,0 +1,35 @@
+"""
+Proveedor JSON de Flask respaldado por orjson.
+
+jsonify y request.get_json pasan por app.json; con orjson instalado se
+serializa varias veces más rápido. Sin orjson, o con JSON_CODEC=json, se
+usa el proveedor por defecto de Flask. Las fechas y Decimal se siguen
+convirtiendo como lo hace Flask.
+"""
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+USAR_ORJSON = orjson is not None and os.getenv("JSON_CODEC", "auto") != "json"
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        if not USAR_ORJSON:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=kwargs.get("default", self.default), option=option).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if not USAR_ORJSON:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
@@ -1,6 +1,7 @@
 from flask import Flask
 from flask_cors import CORS
 from app.controller.analytics_controller import analytics_bp
+from app.json_provider import FastJSONProvider
 from dotenv import load_dotenv
 from flasgger import Swagger
 import os
@@ -10,6 +11,9 @@ load_dotenv()
 
 app = Flask(__name__)
 
+# jsonify con orjson (si está instalado)
+app.json = FastJSONProvider(app)
+
 # Habilitar CORS (para que el frontend pueda hacer requests)
 CORS(app)
 
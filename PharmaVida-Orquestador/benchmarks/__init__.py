@@ -0,0 +1,3 @@
+"""
+Benchmarks de carga del orquestador con microservicios simulados.
+"""
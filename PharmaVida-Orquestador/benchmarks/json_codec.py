@@ -0,0 +1,183 @@
+"""
+Micro-benchmark de codecs JSON con cargas típicas de PharmaVida.
+
+Compara la biblioteca estándar (con las opciones que usaba el renderer de
+DRF y en modo compacto) contra orjson, codificando y decodificando:
+
+- ``catalogo``: páginas de ``/api/productos/paged`` (productos con fechas)
+- ``historial``: respuestas de ``compras/me`` con ``detalle=full``
+
+Reporta microsegundos por operación, throughput en MB/s y tamaño de la carga.
+No necesita Django ni red.
+
+Ejemplo:
+
+    python -m benchmarks.json_codec --sizes 25,100,500 --repeat 200 --output resultados/json.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+PAYLOADS = ('catalogo', 'historial')
+TIPOS = ('analgésico', 'antibiótico', 'antiinflamatorio', 'vitamina', 'antialérgico', 'cuidado personal')
+
+
+def _producto(i, rnd, base):
+    creado = base + timedelta(minutes=rnd.randint(0, 500000))
+    return {
+        'nombre': f'{rnd.choice(("Paracetamol", "Amoxicilina", "Ibuprofeno", "Loratadina"))} {i} mg',
+        'tipo': rnd.choice(TIPOS),
+        'precio': round(rnd.uniform(1, 250), 2),
+        'stock': rnd.randint(0, 500),
+        'requiere_receta': rnd.random() < 0.3,
+        'id': i,
+        'fecha_creacion': creado.isoformat(),
+        'fecha_actualizacion': (creado + timedelta(days=rnd.randint(0, 90))).isoformat(),
+    }
+
+
+def catalogo(size, seed=1):
+    """Página del catálogo de productos, como la devuelve Productos."""
+    rnd = random.Random(seed)
+    base = datetime(2024, 1, 1)
+    return {
+        'total': size * 40,
+        'page': 1,
+        'pagesize': size,
+        'productos': [_producto(i, rnd, base) for i in range(1, size + 1)],
+    }
+
+
+def historial(size, seed=1, productos_por_compra=4):
+    """Respuesta de compras/me enriquecida (detalle=full)."""
+    rnd = random.Random(seed)
+    base = datetime(2024, 1, 1)
+    compras = []
+    for i in range(1, size + 1):
+        ids = rnd.sample(range(1, 2000), productos_por_compra)
+        cantidades = [rnd.randint(1, 5) for _ in ids]
+        compras.append({
+            'id': i,
+            'usuario_id': 7,
+            'fecha_compra': (base + timedelta(hours=i * 7)).isoformat(),
+            'productos': ids,
+            'cantidades': cantidades,
+            'productos_detalle': [
+                {
+                    'producto_id': pid,
+                    'cantidad': cantidad,
+                    'nombre': f'Producto {pid}',
+                    'precio': round(rnd.uniform(1, 250), 2),
+                    'tipo': rnd.choice(TIPOS),
+                    'stock': rnd.randint(0, 500),
+                }
+                for pid, cantidad in zip(ids, cantidades)
+            ],
+        })
+    return {'compras': compras}
+
+
+def codecs():
+    """Pares (encode, decode) a comparar; ``encode`` siempre devuelve bytes."""
+    disponibles = {
+        # Lo que hacía JSONRenderer de DRF: ensure_ascii=False y separadores compactos
+        'json': (
+            lambda obj: json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+            json.loads,
+        ),
+        # response.json() de requests / JsonResponse de Django: ensure_ascii y espacios
+        'json-default': (
+            lambda obj: json.dumps(obj).encode('utf-8'),
+            json.loads,
+        ),
+    }
+    if orjson is not None:
+        disponibles['orjson'] = (orjson.dumps, orjson.loads)
+    return disponibles
+
+
+def _medir(fn, arg, repeat):
+    mejor = float('inf')
+    # Mejor de 3 tandas: reduce el ruido del scheduler en máquinas compartidas
+    for _ in range(3):
+        inicio = time.perf_counter()
+        for _ in range(repeat):
+            fn(arg)
+        mejor = min(mejor, (time.perf_counter() - inicio) / repeat)
+    return mejor
+
+
+def run(sizes, repeat, payloads=PAYLOADS):
+    resultados = []
+    generadores = {'catalogo': catalogo, 'historial': historial}
+    for payload in payloads:
+        for size in sizes:
+            obj = generadores[payload](size)
+            for nombre, (encode, decode) in codecs().items():
+                data = encode(obj)
+                enc = _medir(encode, obj, repeat)
+                dec = _medir(decode, data, repeat)
+                resultados.append({
+                    'payload': payload,
+                    'size': size,
+                    'codec': nombre,
+                    'bytes': len(data),
+                    'encode_us': enc * 1e6,
+                    'decode_us': dec * 1e6,
+                    'encode_mb_s': len(data) / enc / 1e6,
+                    'decode_mb_s': len(data) / dec / 1e6,
+                })
+    return resultados
+
+
+def print_table(resultados):
+    print(f"{'payload':<10} {'items':>6} {'codec':<13} {'KB':>8} {'enc µs':>10} {'dec µs':>10} "
+          f"{'enc MB/s':>9} {'dec MB/s':>9} {'vs json':>8}")
+    base = {(r['payload'], r['size']): r for r in resultados if r['codec'] == 'json'}
+    for r in resultados:
+        ref = base[(r['payload'], r['size'])]
+        speedup = (ref['encode_us'] + ref['decode_us']) / (r['encode_us'] + r['decode_us'])
+        print(f"{r['payload']:<10} {r['size']:>6} {r['codec']:<13} {r['bytes'] / 1024:>8.1f} "
+              f"{r['encode_us']:>10.1f} {r['decode_us']:>10.1f} {r['encode_mb_s']:>9.1f} "
+              f"{r['decode_mb_s']:>9.1f} {speedup:>7.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Micro-benchmark de codecs JSON con cargas de catálogo e historial')
+    parser.add_argument('--sizes', default='25,100,500', help='Productos por página / compras por historial')
+    parser.add_argument('--payloads', default=','.join(PAYLOADS), help=f'Cargas a medir ({", ".join(PAYLOADS)})')
+    parser.add_argument('--repeat', type=int, default=200, help='Operaciones por tanda')
+    parser.add_argument('--output', help='Archivo JSON donde guardar los resultados')
+    args = parser.parse_args(argv)
+
+    if orjson is None:
+        print('orjson no está instalado: solo se mide la biblioteca estándar', file=sys.stderr)
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    resultados = run(sizes, args.repeat, [p for p in args.payloads.split(',') if p])
+    print_table(resultados)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({
+                'fecha': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'orjson': getattr(orjson, '__version__', None),
+                'resultados': resultados,
+            }, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""
+Benchmark de carga de los flujos orquestados.
+
+Levanta los microservicios simulados (``benchmarks/stubs.py``) y, salvo que
+se indique ``--target``, el propio orquestador en un servidor WSGI local.
+Luego ejecuta cada flujo con cada tamaño de carrito a la concurrencia pedida
+y reporta throughput y percentiles de latencia. Todo corre sin red externa.
+
+Ejemplos:
+
+    python -m benchmarks.run --requests 200 --concurrency 16 --cart-sizes 1,5,20 \\
+        --output resultados/actual.json
+    python -m benchmarks.run --compare resultados/base.json --max-regression 0.10
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from benchmarks.stubs import StubServer, add_stub_arguments, stub_config_from_args  # noqa: E402
+
+BENCH_JWT_SECRET = 'benchmark-secret-benchmark-secret-benchmark'
+FLOWS = ('compras', 'compras_me', 'compras_me_ndjson', 'receta')
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    f = int(k)
+    c = min(f + 1, len(ordered) - 1)
+    return ordered[f] + (ordered[c] - ordered[f]) * (k - f)
+
+
+def make_token(secret):
+    import jwt
+
+    ahora = int(time.time())
+    return jwt.encode({'sub': '12345678', 'role': 'USER', 'iat': ahora, 'exp': ahora + 3600}, secret, algorithm='HS256')
+
+
+def start_orchestrator(stub_url, host='127.0.0.1', port=0, env=None):
+    """Levanta el orquestador (WSGI) en un hilo, apuntando a los microservicios simulados."""
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    os.environ['DEBUG'] = 'False'
+    for var in ('URL_USUARIOS_COMPRAS', 'URL_PRODUCTOS_OFERTAS', 'URL_RECETAS_MEDICOS'):
+        os.environ[var] = stub_url
+    os.environ.setdefault('TRACE_LOG_SPANS', 'False')
+    os.environ.update(env or {})
+
+    from config.wsgi import application
+
+    class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+
+    class QuietHandler(WSGIRequestHandler):
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+    httpd = make_server(host, port, application, server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, f'http://{host}:{httpd.server_address[1]}'
+
+
+def build_request(flow, cart_size, catalog_size, n):
+    """Método, ruta y cuerpo de la petición ``n`` de un flujo."""
+    if flow == 'compras':
+        # Carritos distintos en cada petición para no medir solo la caché
+        productos = [((n * cart_size + k) % catalog_size) + 1 for k in range(cart_size)]
+        return 'POST', '/api/orchestrator/compras', {'productos': productos, 'cantidades': [1] * cart_size}
+    if flow == 'compras_me':
+        return 'GET', '/api/orchestrator/compras/me', None
+    if flow == 'compras_me_ndjson':
+        return 'GET', '/api/orchestrator/compras/me?formato=ndjson', None
+    if flow == 'receta':
+        return 'PUT', f'/api/orchestrator/recetas/validar/receta-{n}', None
+    raise ValueError(f'Flujo desconocido: {flow}')
+
+
+def run_scenario(base_url, token, flow, cart_size, args, stub_state=None):
+    import requests
+
+    if stub_state is not None:
+        stub_state.config.items_por_compra = cart_size
+        stub_state.config.items_por_receta = cart_size
+
+    headers = {'Authorization': f'Bearer {token}'}
+    local = threading.local()
+    latencias, errores, status = [], 0, {}
+    lock = threading.Lock()
+
+    def session():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return local.session
+
+    def una(n):
+        nonlocal errores
+        method, path, body = build_request(flow, cart_size, args.catalog_size, n)
+        inicio = time.perf_counter()
+        try:
+            response = session().request(method, base_url + path, json=body, headers=headers, timeout=60)
+            code = response.status_code
+        except Exception:
+            code = 'exception'
+        duracion = (time.perf_counter() - inicio) * 1000
+        with lock:
+            status[str(code)] = status.get(str(code), 0) + 1
+            if isinstance(code, int) and code < 400:
+                latencias.append(duracion)
+            else:
+                errores += 1
+
+    for n in range(args.warmup):
+        una(-1 - n)
+    latencias.clear()
+    status.clear()
+    errores = 0
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(una, range(args.requests)))
+    elapsed = time.perf_counter() - inicio
+
+    return {
+        'flow': flow,
+        'cart_size': cart_size,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'errors': errores,
+        'status': status,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(args.requests / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencias), 3) if latencias else 0.0,
+            'p50': round(percentile(latencias, 50), 3),
+            'p95': round(percentile(latencias, 95), 3),
+            'p99': round(percentile(latencias, 99), 3),
+            'max': round(max(latencias), 3) if latencias else 0.0,
+        },
+    }
+
+
+def compare(actual, base, max_regression):
+    """Compara dos corridas escenario por escenario; devuelve las regresiones."""
+    indice = {(r['flow'], r['cart_size']): r for r in base['results']}
+    regresiones = []
+    print(f"\n{'escenario':<22}{'p95 base':>12}{'p95 actual':>12}{'delta':>9}{'rps base':>11}{'rps actual':>12}")
+    for r in actual['results']:
+        b = indice.get((r['flow'], r['cart_size']))
+        if b is None:
+            continue
+        p95_b, p95_a = b['latency_ms']['p95'], r['latency_ms']['p95']
+        delta = (p95_a - p95_b) / p95_b if p95_b else 0.0
+        nombre = f"{r['flow']}[{r['cart_size']}]"
+        print(f"{nombre:<22}{p95_b:>12.1f}{p95_a:>12.1f}{delta:>+9.1%}{b['throughput_rps']:>11.1f}{r['throughput_rps']:>12.1f}")
+        if delta > max_regression:
+            regresiones.append({'escenario': nombre, 'p95_base': p95_b, 'p95_actual': p95_a, 'delta': round(delta, 4)})
+    return regresiones
+
+
+def print_table(results):
+    print(f"\n{'escenario':<22}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errores':>9}")
+    for r in results:
+        lat = r['latency_ms']
+        nombre = f"{r['flow']}[{r['cart_size']}]"
+        print(f"{nombre:<22}{r['throughput_rps']:>9.1f}{lat['p50']:>9.1f}{lat['p95']:>9.1f}{lat['p99']:>9.1f}{r['errors']:>9}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de los flujos del orquestador con microservicios simulados')
+    parser.add_argument('--flows', default=','.join(FLOWS), help=f'Flujos a medir, separados por coma ({", ".join(FLOWS)})')
+    parser.add_argument('--cart-sizes', default='1,5,20', help='Tamaños de carrito / productos por compra o receta')
+    parser.add_argument('--requests', type=int, default=200, help='Peticiones medidas por escenario')
+    parser.add_argument('--warmup', type=int, default=10, help='Peticiones de calentamiento por escenario (no medidas)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Clientes simultáneos')
+    parser.add_argument('--target', help='URL de un orquestador ya levantado (por defecto se levanta uno local)')
+    parser.add_argument('--stub-url', help='URL de microservicios simulados ya levantados (por defecto se levantan)')
+    parser.add_argument('--jwt-secret', default=BENCH_JWT_SECRET, help='Secreto para firmar el token de prueba')
+    parser.add_argument('--label', default='', help='Etiqueta libre guardada en el resultado')
+    parser.add_argument('--output', help='Archivo JSON donde guardar los resultados')
+    parser.add_argument('--compare', help='Resultado JSON previo contra el cual comparar')
+    parser.add_argument('--max-regression', type=float, default=0.10, help='Aumento máximo tolerado del p95 (0.10 = 10%%)')
+    add_stub_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    flows = [f.strip() for f in args.flows.split(',') if f.strip()]
+    cart_sizes = [int(n) for n in args.cart_sizes.split(',') if n.strip()]
+
+    stub = None
+    stub_url = args.stub_url
+    if stub_url is None:
+        stub = StubServer(stub_config_from_args(args)).start()
+        stub_url = stub.url
+
+    httpd = None
+    base_url = args.target
+    if base_url is None:
+        httpd, base_url = start_orchestrator(stub_url, env={'JWT_SECRET': args.jwt_secret})
+
+    token = make_token(args.jwt_secret)
+    results = []
+    try:
+        for flow in flows:
+            for cart_size in cart_sizes:
+                results.append(run_scenario(base_url, token, flow, cart_size, args, stub.state if stub else None))
+    finally:
+        if httpd is not None:
+            httpd.shutdown()
+        if stub is not None:
+            stub.stop()
+
+    run = {
+        'label': args.label,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'target': args.target or 'local-wsgi',
+        'python': platform.python_version(),
+        'config': {
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'latency_ms': args.latency_ms,
+            'jitter_ms': args.jitter_ms,
+            'error_rate': args.error_rate,
+            'catalog_size': args.catalog_size,
+            'compras_por_usuario': args.compras_por_usuario,
+        },
+        'results': results,
+    }
+    print_table(results)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(run, f, indent=2)
+        print(f'\nResultados guardados en {args.output}')
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+        regresiones = compare(run, base, args.max_regression)
+        if regresiones:
+            print(f'\nRegresiones por encima de {args.max_regression:.0%}:')
+            for r in regresiones:
+                print(f"  {r['escenario']}: p95 {r['p95_base']:.1f} -> {r['p95_actual']:.1f} ms ({r['delta']:+.1%})")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
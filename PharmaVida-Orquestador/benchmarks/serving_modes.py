@@ -0,0 +1,167 @@
+"""
+Comparación de modos de servicio del orquestador: WSGI (gunicorn con hilos)
+contra ASGI (gunicorn con workers de uvicorn y views asíncronos).
+
+Levanta los microservicios simulados en este proceso y, para cada modo, un
+gunicorn en un subproceso con la misma cantidad de workers. Ejecuta los
+mismos escenarios de ``benchmarks.run`` contra ambos e imprime la tabla
+lado a lado.
+
+Ejemplo:
+
+    python -m benchmarks.serving_modes --workers 2 --threads 8 --concurrency 64 \\
+        --latency-ms 20 --cart-sizes 5,20 --output resultados/modos.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from benchmarks.run import BENCH_JWT_SECRET, FLOWS, make_token, run_scenario  # noqa: E402
+from benchmarks.stubs import StubServer, add_stub_arguments, stub_config_from_args  # noqa: E402
+
+MODES = ('wsgi', 'asgi')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def gunicorn_command(mode, port, args):
+    """Línea de comandos de gunicorn para un modo (la misma que se usaría en producción)."""
+    comando = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+               '--workers', str(args.workers), '--log-level', 'warning']
+    if mode == 'wsgi':
+        return comando + ['--worker-class', 'gthread', '--threads', str(args.threads), 'config.wsgi:application']
+    return comando + ['--worker-class', 'uvicorn.workers.UvicornWorker', 'config.asgi:application']
+
+
+def start_mode(mode, stub_url, args):
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        'DJANGO_SETTINGS_MODULE': 'config.settings',
+        'DEBUG': 'False',
+        'URL_USUARIOS_COMPRAS': stub_url,
+        'URL_PRODUCTOS_OFERTAS': stub_url,
+        'URL_RECETAS_MEDICOS': stub_url,
+        'TRACE_LOG_SPANS': 'False',
+        'JWT_SECRET': args.jwt_secret,
+        'ORCHESTRATOR_ASYNC': 'True' if mode == 'asgi' else 'False',
+    })
+    proceso = subprocess.Popen(gunicorn_command(mode, port, args), cwd=BASE_DIR, env=env)
+    _wait_ready(port, proceso)
+    return proceso, f'http://127.0.0.1:{port}'
+
+
+def _wait_ready(port, proceso, timeout=30):
+    import requests
+
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f'gunicorn terminó con código {proceso.returncode}')
+        try:
+            requests.get(f'http://127.0.0.1:{port}/api/orchestrator/echo', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn no respondió a tiempo')
+
+
+def stop_mode(proceso):
+    proceso.terminate()
+    try:
+        proceso.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proceso.kill()
+
+
+def print_comparison(resultados):
+    print(f"\n{'escenario':<22}{'modo':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errores':>9}")
+    escenarios = {}
+    for r in resultados:
+        escenarios.setdefault((r['flow'], r['cart_size']), []).append(r)
+    for (flow, cart_size), filas in escenarios.items():
+        nombre = f'{flow}[{cart_size}]'
+        for r in filas:
+            lat = r['latency_ms']
+            print(f"{nombre:<22}{r['mode']:>6}{r['throughput_rps']:>9.1f}{lat['p50']:>9.1f}"
+                  f"{lat['p95']:>9.1f}{lat['p99']:>9.1f}{r['errors']:>9}")
+            nombre = ''
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Comparación WSGI vs ASGI del orquestador')
+    parser.add_argument('--modes', default=','.join(MODES), help='Modos a medir (wsgi, asgi)')
+    parser.add_argument('--workers', type=int, default=2, help='Procesos de gunicorn por modo')
+    parser.add_argument('--threads', type=int, default=8, help='Hilos por worker en modo WSGI (gthread)')
+    parser.add_argument('--flows', default=','.join(FLOWS), help='Flujos a medir, separados por coma')
+    parser.add_argument('--cart-sizes', default='5,20', help='Tamaños de carrito / productos por compra o receta')
+    parser.add_argument('--requests', type=int, default=300, help='Peticiones medidas por escenario')
+    parser.add_argument('--warmup', type=int, default=20, help='Peticiones de calentamiento por escenario')
+    parser.add_argument('--concurrency', type=int, default=64, help='Clientes simultáneos')
+    parser.add_argument('--jwt-secret', default=BENCH_JWT_SECRET, help='Secreto para firmar el token de prueba')
+    parser.add_argument('--output', help='Archivo JSON donde guardar los resultados')
+    add_stub_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    modes = [m.strip() for m in args.modes.split(',') if m.strip()]
+    flows = [f.strip() for f in args.flows.split(',') if f.strip()]
+    cart_sizes = [int(n) for n in args.cart_sizes.split(',') if n.strip()]
+
+    stub = StubServer(stub_config_from_args(args)).start()
+    token = make_token(args.jwt_secret)
+    resultados = []
+    try:
+        for mode in modes:
+            proceso, base_url = start_mode(mode, stub.url, args)
+            try:
+                for flow in flows:
+                    for cart_size in cart_sizes:
+                        r = run_scenario(base_url, token, flow, cart_size, args, stub.state)
+                        r['mode'] = mode
+                        resultados.append(r)
+            finally:
+                stop_mode(proceso)
+    finally:
+        stub.stop()
+
+    print_comparison(resultados)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'config': {
+                    'workers': args.workers,
+                    'threads': args.threads,
+                    'requests': args.requests,
+                    'concurrency': args.concurrency,
+                    'latency_ms': args.latency_ms,
+                    'catalog_size': args.catalog_size,
+                },
+                'results': resultados,
+            }, f, indent=2)
+        print(f'\nResultados guardados en {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""
+Microservicios simulados para los benchmarks del orquestador.
+
+Un único servidor HTTP atiende las rutas de usuarios/compras, productos y
+recetas que usa el orquestador, con latencia, tasa de error y tamaño de
+catálogo configurables. Funciona sin red externa ni bases de datos.
+
+Uso independiente (por ejemplo, para apuntar un orquestador ya levantado):
+
+    python -m benchmarks.stubs --port 9100 --latency-ms 5 --catalog-size 5000
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+USUARIO = {'id': 1, 'dni': '12345678', 'firstName': 'Bench', 'lastName': 'Usuario', 'role': 'USER'}
+
+
+class StubConfig:
+    def __init__(self, latency_ms=5.0, jitter_ms=0.0, error_rate=0.0, catalog_size=1000,
+                 compras_por_usuario=20, items_por_compra=3, items_por_receta=3, seed=42):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.catalog_size = catalog_size
+        self.compras_por_usuario = compras_por_usuario
+        self.items_por_compra = items_por_compra
+        self.items_por_receta = items_por_receta
+        self.seed = seed
+
+
+class StubState:
+    """Catálogo y contadores compartidos por todos los hilos del servidor."""
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        rnd = random.Random(config.seed)
+        self.productos = {
+            i: {
+                'id': i,
+                'nombre': f'Producto {i}',
+                'tipo': rnd.choice(['analgesico', 'antibiotico', 'vitamina', 'antialergico']),
+                'precio': round(rnd.uniform(1, 200), 2),
+                'stock': 10 ** 9,
+                'requiere_receta': i % 10 == 0,
+                'fecha_creacion': '2025-01-01T00:00:00',
+                'fecha_actualizacion': '2025-01-01T00:00:00',
+            }
+            for i in range(1, config.catalog_size + 1)
+        }
+        # La receta validada cubre todos los productos que requieren receta
+        self.receta_validada = {
+            'id': 'receta-bench',
+            'pacienteDNI': USUARIO['dni'],
+            'estado': 'validada',
+            'productos': [{'id': i, 'nombre': p['nombre']} for i, p in self.productos.items() if p['requiere_receta']],
+        }
+        self.requests = 0
+        self.errors = 0
+
+    def ids(self, n, offset=0):
+        return [((offset + k) % self.config.catalog_size) + 1 for k in range(n)]
+
+
+def make_handler(state):
+    config = state.config
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers y cuerpo van en escrituras separadas: sin esto, Nagle y el
+        # ACK diferido agregan ~40 ms a cada respuesta sobre keep-alive
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, data):
+            body = json.dumps(data).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return json.loads(self.rfile.read(length)) if length else None
+
+        def _handle(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            body = self._body()
+            with state.lock:
+                state.requests += 1
+            delay = config.latency_ms + (random.uniform(0, config.jitter_ms) if config.jitter_ms else 0)
+            if delay:
+                time.sleep(delay / 1000)
+            if config.error_rate and random.random() < config.error_rate:
+                with state.lock:
+                    state.errors += 1
+                return self._send(503, {'error': 'Error simulado'})
+            return self._route(self.command, url.path, query, body)
+
+        def _route(self, method, path, query, body):
+            if path == '/api/user/me':
+                return self._send(200, USUARIO)
+            if path == '/api/compras' and method == 'POST':
+                return self._send(201, dict(body or {}, id=random.randint(1, 10 ** 6)))
+            if path == '/api/compras/lote' and method == 'POST':
+                return self._send(200, [dict(compra, id=random.randint(1, 10 ** 6)) for compra in body or []])
+            if path == '/api/compras/me':
+                return self._send(200, [
+                    {
+                        'id': n,
+                        'usuarioId': USUARIO['id'],
+                        'productos': state.ids(config.items_por_compra, offset=n),
+                        'cantidades': [1] * config.items_por_compra,
+                    }
+                    for n in range(config.compras_por_usuario)
+                ])
+            if path == '/api/recetas/filter':
+                page = int(query.get('page', ['1'])[0])
+                items = [state.receta_validada] if page == 1 else []
+                return self._send(200, {'items': items, 'page': page, 'total': 1})
+            match = re.fullmatch(r'/api/recetas/([^/]+)(/validar)?', path)
+            if match:
+                receta = {
+                    'id': match.group(1),
+                    'pacienteDNI': USUARIO['dni'],
+                    'productos': [
+                        {'id': i, 'nombre': state.productos[i]['nombre']}
+                        for i in state.ids(config.items_por_receta)
+                    ],
+                }
+                if match.group(2):
+                    receta['estadovalidacion'] = (body or {}).get('estadovalidacion')
+                return self._send(200, receta)
+            if path == '/api/productos/batch':
+                ids = [int(i) for i in query.get('ids', [])]
+                return self._send(200, {
+                    'productos': [state.productos[i] for i in ids if i in state.productos],
+                    'faltantes': [i for i in ids if i not in state.productos],
+                })
+            if path in ('/api/productos/stock/descontar', '/api/productos/stock/reponer'):
+                items = (body or {}).get('items', [])
+                return self._send(200, {'items': [
+                    {'producto_id': it['producto_id'], 'cantidad': it['cantidad'],
+                     'stock_restante': state.productos.get(it['producto_id'], {}).get('stock', 0)}
+                    for it in items
+                ]})
+            match = re.fullmatch(r'/api/productos/(\d+)', path)
+            if match:
+                producto = state.productos.get(int(match.group(1)))
+                if producto is None:
+                    return self._send(404, {'detail': 'Producto no encontrado'})
+                return self._send(200, producto)
+            return self._send(404, {'error': f'Ruta no simulada: {method} {path}'})
+
+        do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    return Handler
+
+
+class StubServer:
+    """Servidor de microservicios simulados ejecutándose en un hilo propio."""
+
+    def __init__(self, config, host='127.0.0.1', port=0):
+        self.state = StubState(config)
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.state))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def add_stub_arguments(parser):
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Latencia base de cada respuesta simulada')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Latencia aleatoria adicional (0..jitter)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fracción de respuestas 503 simuladas')
+    parser.add_argument('--catalog-size', type=int, default=1000, help='Productos en el catálogo simulado')
+    parser.add_argument('--compras-por-usuario', type=int, default=20, help='Compras devueltas por /api/compras/me')
+
+
+def stub_config_from_args(args):
+    return StubConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        catalog_size=args.catalog_size,
+        compras_por_usuario=args.compras_por_usuario,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microservicios simulados para benchmarks del orquestador')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    server = StubServer(stub_config_from_args(args), args.host, args.port)
+    print(f'Microservicios simulados en {server.url} (Ctrl+C para detener)')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
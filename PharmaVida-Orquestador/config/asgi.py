@@ -7,5 +7,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Bajo ASGI se sirven los views asíncronos (ver orchestrator/async_views.py)
+os.environ.setdefault('ORCHESTRATOR_ASYNC', 'True')
 
-application = get_asgi_application()
\ No newline at end of file
+application = get_asgi_application()
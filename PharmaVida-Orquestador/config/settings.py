@@ -5,6 +5,8 @@ Django settings para el backend orquestador.
 import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-orchestrator-key-change-in-production')
@@ -23,11 +25,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'orchestrator.tracing.TracingMiddleware',
+    'orchestrator.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'orchestrator.middleware.MetricsMiddleware',
+    'orchestrator.admission.AdmissionMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -61,10 +67,10 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'orchestrator.jsoncodec.JSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'orchestrator.jsoncodec.JSONParser',
     ],
     'EXCEPTION_HANDLER': 'orchestrator.utils.custom_exception_handler',
 }
@@ -72,6 +78,8 @@ REST_FRAMEWORK = {
 # CORS
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key', 'x-profile')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed', 'Location', 'Retry-After', 'X-Profile-ID']
 
 # URLs de los microservicios
 MICROSERVICES = {
@@ -88,3 +96,149 @@ MICROSERVICES = {
         'http://localhost:8083'
     ),
 }
+
+# Cliente HTTP hacia los microservicios (una sesión keep-alive por servicio)
+ORCHESTRATOR_HTTP_CLIENT = {
+    'POOL_CONNECTIONS': int(os.environ.get('HTTP_POOL_CONNECTIONS', '4')),
+    'POOL_MAXSIZE': int(os.environ.get('HTTP_POOL_MAXSIZE', '20')),
+    'POOL_BLOCK': os.environ.get('HTTP_POOL_BLOCK', 'False') == 'True',
+    'CONNECT_TIMEOUT': float(os.environ.get('HTTP_CONNECT_TIMEOUT', '3')),
+    'READ_TIMEOUT': float(os.environ.get('HTTP_READ_TIMEOUT', '15')),
+    'KEEP_ALIVE': os.environ.get('HTTP_KEEP_ALIVE', 'True') == 'True',
+}
+
+# Codec JSON: 'auto' usa orjson si está instalado y si no la biblioteca
+# estándar; 'orjson' o 'json' fuerzan uno (ver orchestrator/jsoncodec.py)
+ORCHESTRATOR_JSON_CODEC = os.environ.get('JSON_CODEC', 'auto')
+
+# Máximo de llamadas simultáneas a microservicios dentro de una misma petición
+# (el cliente puede reducirlo con el header X-Max-Concurrency)
+ORCHESTRATOR_MAX_CONCURRENCY = int(os.environ.get('ORCHESTRATOR_MAX_CONCURRENCY', '8'))
+
+# Recetas por página al buscar las que cubren los productos de una compra
+# (se leen páginas solo mientras falte cubrir algún producto; máximo 100)
+ORCHESTRATOR_RECETAS_PAGESIZE = int(os.environ.get('RECETAS_PAGESIZE', '100'))
+
+# Compra en lote (compras/lote): carritos por petición y productos por
+# llamada a /api/productos/batch y /stock/descontar (igual que en Productos)
+ORCHESTRATOR_LOTE_MAX_CARRITOS = int(os.environ.get('LOTE_MAX_CARRITOS', '100'))
+ORCHESTRATOR_PRODUCTOS_BATCH_MAX = int(os.environ.get('PRODUCTOS_BATCH_MAX', '200'))
+
+# Tamaño máximo de página del historial de compras (?page=&pagesize=)
+ORCHESTRATOR_COMPRAS_MAX_PAGESIZE = int(os.environ.get('COMPRAS_MAX_PAGESIZE', '100'))
+
+# Idempotency-Key en POST compras: backend 'memory' (por proceso), 'sqlite'
+# (compartido por los workers del host) o la ruta a una clase IdempotencyStore
+ORCHESTRATOR_IDEMPOTENCY = {
+    'BACKEND': os.environ.get('IDEMPOTENCY_BACKEND', 'memory'),
+    'TTL': int(os.environ.get('IDEMPOTENCY_TTL', '86400')),
+    'LEASE': int(os.environ.get('IDEMPOTENCY_LEASE', '120')),
+    'WAIT_TIMEOUT': float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', '30')),
+    'SQLITE_PATH': os.environ.get('IDEMPOTENCY_SQLITE_PATH', str(BASE_DIR / 'idempotency.sqlite3')),
+}
+
+# Checkout asíncrono: MODE 'off', 'prefer' (solo con Prefer: respond-async) o
+# 'always'; la cola SQLite la comparten los procesos del host
+ORCHESTRATOR_CHECKOUT = {
+    'MODE': os.environ.get('CHECKOUT_MODE', 'off'),
+    'BACKEND': os.environ.get('CHECKOUT_QUEUE_BACKEND', 'sqlite'),
+    'SQLITE_PATH': os.environ.get('CHECKOUT_QUEUE_PATH', str(BASE_DIR / 'checkout_queue.sqlite3')),
+    'WORKERS': int(os.environ.get('CHECKOUT_WORKERS', '4')),
+    'POLL_INTERVAL': float(os.environ.get('CHECKOUT_POLL_INTERVAL', '0.5')),
+    'LEASE': int(os.environ.get('CHECKOUT_LEASE', '300')),
+    'MAX_ATTEMPTS': int(os.environ.get('CHECKOUT_MAX_ATTEMPTS', '3')),
+    'MAX_PENDING': int(os.environ.get('CHECKOUT_MAX_PENDING', '10000')),
+    'RETENTION': int(os.environ.get('CHECKOUT_RETENTION', str(7 * 86400))),
+}
+
+# Compras enriquecidas por tanda en las respuestas NDJSON de compras/me
+ORCHESTRATOR_STREAM_WINDOW = int(os.environ.get('COMPRAS_STREAM_WINDOW', '10'))
+
+# Caché en memoria de productos (por proceso)
+ORCHESTRATOR_PRODUCT_CACHE = {
+    'ENABLED': os.environ.get('PRODUCT_CACHE_ENABLED', 'True') == 'True',
+    'MAX_ENTRIES': int(os.environ.get('PRODUCT_CACHE_MAX_ENTRIES', '5000')),
+    'TTL': float(os.environ.get('PRODUCT_CACHE_TTL', '30')),
+}
+
+# Verificación local de JWT (mismo secreto que el microservicio de usuarios).
+# Sin JWT_SECRET la identidad se obtiene de /api/user/me, memoizada por token.
+ORCHESTRATOR_JWT = {
+    'SECRET': os.environ.get('JWT_SECRET', ''),
+    'ALGORITHMS': ['HS256'],
+    'LEEWAY': int(os.environ.get('JWT_LEEWAY', '0')),
+    'ME_CACHE_MAX_ENTRIES': int(os.environ.get('USER_ME_CACHE_MAX_ENTRIES', '10000')),
+    'ME_CACHE_MAX_TTL': int(os.environ.get('USER_ME_CACHE_MAX_TTL', '900')),
+}
+
+# Resiliencia por microservicio: timeouts, reintentos (solo GET), circuit
+# breaker y bulkhead. 'DEFAULT' aplica a todos; 'SERVICIOS' permite ajustar
+# cada entrada de MICROSERVICES (ver orchestrator/resilience.py).
+ORCHESTRATOR_RESILIENCE = {
+    'DEFAULT': {
+        'RETRIES': int(os.environ.get('HTTP_RETRIES', '2')),
+        'BREAKER_FAILURE_THRESHOLD': int(os.environ.get('BREAKER_FAILURE_THRESHOLD', '5')),
+        'BREAKER_RESET_TIMEOUT': float(os.environ.get('BREAKER_RESET_TIMEOUT', '30')),
+        'BULKHEAD_MAX_CONCURRENT': int(os.environ.get('BULKHEAD_MAX_CONCURRENT', '50')),
+    },
+    'SERVICIOS': {
+        'productos_y_ofertas': {
+            'READ_TIMEOUT': float(os.environ.get('PRODUCTOS_READ_TIMEOUT', '5')),
+        },
+        'recetas_y_medicos': {
+            'READ_TIMEOUT': float(os.environ.get('RECETAS_READ_TIMEOUT', '10')),
+        },
+    },
+}
+
+# Profiler por muestreo: perfila SAMPLE_RATE de las peticiones, o las que
+# envían X-Profile: 1 con token de administrador (o X-Profile: <PROFILE_TOKEN>),
+# y guarda pilas colapsadas <request_id>.folded en DIR (rotando). Desactivado
+# no tiene costo: el middleware se quita de la cadena.
+ORCHESTRATOR_PROFILING = {
+    'ENABLED': os.environ.get('PROFILING_ENABLED', 'False') == 'True',
+    'SAMPLE_RATE': float(os.environ.get('PROFILING_SAMPLE_RATE', '0')),
+    'INTERVAL': float(os.environ.get('PROFILING_INTERVAL', '0.005')),
+    'TOKEN': os.environ.get('PROFILE_TOKEN', ''),
+    'DIR': os.environ.get('PROFILING_DIR', str(BASE_DIR / 'profiles')),
+    'MAX_FILES': int(os.environ.get('PROFILING_MAX_FILES', '200')),
+    'MAX_BYTES': int(os.environ.get('PROFILING_MAX_BYTES', str(50 * 1024 * 1024))),
+}
+
+# Control de admisión por endpoint (nombre de la URL): peticiones simultáneas,
+# cola de espera acotada (503 + Retry-After al llenarse o pasar QUEUE_TIMEOUT)
+# y token bucket por cliente (429; RATE=0 lo desactiva). 'DEFAULT' aplica a
+# todos; 'ENDPOINTS' ajusta cada uno (ver orchestrator/admission.py).
+ORCHESTRATOR_ADMISSION = {
+    'DEFAULT': {
+        'ENABLED': os.environ.get('ADMISSION_ENABLED', 'True') == 'True',
+        'CONCURRENCY': int(os.environ.get('ADMISSION_CONCURRENCY', '64')),
+        'QUEUE': int(os.environ.get('ADMISSION_QUEUE', '128')),
+        'QUEUE_TIMEOUT': float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '2')),
+        'RATE': float(os.environ.get('ADMISSION_RATE', '0')),
+        'BURST': int(os.environ.get('ADMISSION_BURST', '20')),
+    },
+    'ENDPOINTS': {
+        'comprar': {
+            'CONCURRENCY': int(os.environ.get('ADMISSION_COMPRAS_CONCURRENCY', '16')),
+            'QUEUE': int(os.environ.get('ADMISSION_COMPRAS_QUEUE', '32')),
+        },
+        # Un lote equivale a muchas compras: menos lotes simultáneos
+        'comprar-lote': {
+            'CONCURRENCY': int(os.environ.get('ADMISSION_COMPRAS_LOTE_CONCURRENCY', '4')),
+            'QUEUE': int(os.environ.get('ADMISSION_COMPRAS_LOTE_QUEUE', '8')),
+        },
+    },
+}
+
+# Trazas por petición: X-Request-ID propagado a los microservicios, spans por
+# paso en el log 'orchestrator.tracing' y header Server-Timing (siempre si
+# SERVER_TIMING=True, o cuando el cliente envía X-Server-Timing: 1)
+ORCHESTRATOR_TRACING = {
+    'SERVER_TIMING': os.environ.get('SERVER_TIMING', 'False') == 'True',
+    'LOG_SPANS': os.environ.get('TRACE_LOG_SPANS', 'True') == 'True',
+}
+
+# Modo ASGI: los endpoints orquestados usan views asíncronos (httpx) en lugar
+# de los APIView síncronos. config/asgi.py lo activa por defecto.
+ORCHESTRATOR_ASYNC = os.environ.get('ORCHESTRATOR_ASYNC', 'False') == 'True'
@@ -0,0 +1,31 @@
+"""
+Configuración de pytest: los tests corren con ``config.settings`` sin
+microservicios (las llamadas HTTP se reemplazan en cada test).
+"""
+
+import os
+
+import django
+import pytest
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('TRACE_LOG_SPANS', 'False')
+django.setup()
+
+from django.test.utils import setup_test_environment  # noqa: E402
+
+setup_test_environment()
+
+
+@pytest.fixture(autouse=True)
+def _estado_limpio():
+    """Cachés y stores del proceso vacíos en cada test."""
+    from orchestrator import idempotency
+    from orchestrator.auth import user_me_cache
+    from orchestrator.cache import product_cache
+
+    idempotency._store = None
+    product_cache.clear()
+    user_me_cache._cache = None
+    yield
+    idempotency._store = None
@@ -0,0 +1,342 @@
+"""
+Control de admisión del orquestador.
+
+Cada endpoint tiene un límite de peticiones simultáneas y una cola de espera
+acotada. Una petición que encuentra la cola llena se rechaza al instante, y
+una que espera más de ``QUEUE_TIMEOUT`` segundos se descarta sin llegar al
+view; ambas reciben ``503`` con ``Retry-After``. Además, cada cliente (el
+usuario del token, o la IP si no hay token) tiene un token bucket por
+endpoint: al agotarlo recibe ``429``.
+
+Así, cuando los microservicios se vuelven lentos, el exceso de carga se
+descarta pronto y barato en lugar de acumular hilos y memoria, y las
+peticiones admitidas conservan una latencia predecible.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .auth import alcance_usuario
+from .jsoncodec import json_response
+from .tracing import span
+
+DEFAULT_ADMISSION = {
+    'ENABLED': True,
+    'CONCURRENCY': 64,
+    'QUEUE': 128,
+    'QUEUE_TIMEOUT': 2.0,
+    'RETRY_AFTER': 2,
+    'RATE': 0,  # peticiones por segundo y cliente; 0 desactiva el rate limit
+    'BURST': 20,
+    'MAX_CLIENTS': 10000,
+}
+
+# Endpoints de operación: nunca se limitan, para poder observar la sobrecarga
+DEFAULT_EXEMPT = ('echo', 'metrics', 'stats-http', 'stats-cache', 'stats-resilience', 'stats-admission',
+                  'swagger-ui', 'openapi-yaml')
+
+COLA_LLENA = 'cola_llena'
+TIMEOUT = 'timeout'
+RATE_LIMIT = 'rate_limit'
+
+
+def get_admission_config(endpoint):
+    """
+    Límites de un endpoint (nombre de la URL, por ejemplo ``comprar``).
+
+    Se combinan, en orden, los valores por defecto, ``DEFAULT`` y la entrada
+    del endpoint en ``settings.ORCHESTRATOR_ADMISSION['ENDPOINTS']``.
+    """
+    user_config = getattr(settings, 'ORCHESTRATOR_ADMISSION', {}) or {}
+    config = dict(DEFAULT_ADMISSION)
+    config.update(user_config.get('DEFAULT', {}))
+    config.update(user_config.get('ENDPOINTS', {}).get(endpoint, {}))
+    return config
+
+
+def _exentos():
+    user_config = getattr(settings, 'ORCHESTRATOR_ADMISSION', {}) or {}
+    return user_config.get('EXEMPT', DEFAULT_EXEMPT)
+
+
+class ConcurrencyLimiter:
+    """Lugares simultáneos de un endpoint con una cola de espera acotada."""
+
+    def __init__(self, limit, queue, timeout):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = {COLA_LLENA: 0, TIMEOUT: 0}
+
+    def _rechazar(self, motivo):
+        self.rejected[motivo] += 1
+        return motivo
+
+    def _tomar(self):
+        self.in_flight += 1
+        self.admitted += 1
+
+    def acquire(self):
+        """
+        Espera un lugar libre.
+
+        Returns:
+            str | None: None si la petición fue admitida; si no, el motivo del
+            rechazo (``cola_llena`` o ``timeout``)
+        """
+        with self._cond:
+            if self.in_flight < self.limit:
+                self._tomar()
+                return None
+            if self.waiting >= self.queue:
+                return self._rechazar(COLA_LLENA)
+            self.waiting += 1
+            try:
+                if not self._cond.wait_for(lambda: self.in_flight < self.limit, self.timeout):
+                    return self._rechazar(TIMEOUT)
+                self._tomar()
+                return None
+            finally:
+                self.waiting -= 1
+
+    async def acquire_async(self, al_admitir=None, poll_interval=0.005):
+        """
+        Como ``acquire`` pero sin bloquear el event loop mientras espera.
+
+        ``al_admitir`` se llama con el lugar recién tomado, sin un ``await`` de
+        por medio: lo que registre ahí queda hecho aunque la tarea se cancele
+        justo después, así quien libera el lugar siempre lo encuentra.
+        """
+        with self._cond:
+            if self.in_flight < self.limit:
+                self._tomar()
+                if al_admitir is not None:
+                    al_admitir()
+                return None
+            if self.waiting >= self.queue:
+                return self._rechazar(COLA_LLENA)
+            self.waiting += 1
+        limite = time.monotonic() + self.timeout
+        try:
+            while True:
+                await asyncio.sleep(poll_interval)
+                with self._cond:
+                    if self.in_flight < self.limit:
+                        self._tomar()
+                        if al_admitir is not None:
+                            al_admitir()
+                        return None
+                    if time.monotonic() >= limite:
+                        return self._rechazar(TIMEOUT)
+        finally:
+            with self._cond:
+                self.waiting -= 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'queue': self.queue,
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'admitted': self.admitted,
+                'rejected': dict(self.rejected),
+            }
+
+
+class RateLimiter:
+    """
+    Token bucket por cliente: ``rate`` peticiones por segundo con ráfagas de
+    hasta ``burst``. Conserva los ``max_clients`` clientes más recientes.
+    """
+
+    def __init__(self, rate, burst, max_clients):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def acquire(self, cliente):
+        """
+        Consume un token del cliente.
+
+        Returns:
+            float: 0 si la petición puede pasar; si no, segundos hasta el
+            próximo token
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            tokens, ultimo = self._buckets.pop(cliente, (self.burst, ahora))
+            tokens = min(self.burst, tokens + (ahora - ultimo) * self.rate)
+            espera = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                espera = (1 - tokens) / self.rate
+                self.rejected += 1
+            self._buckets[cliente] = (tokens, ahora)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return espera
+
+
+class Endpoint:
+    """Políticas de admisión de un endpoint."""
+
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.limiter = ConcurrencyLimiter(config['CONCURRENCY'], config['QUEUE'], config['QUEUE_TIMEOUT'])
+        self.rate_limiter = (
+            RateLimiter(config['RATE'], config['BURST'], config['MAX_CLIENTS']) if config['RATE'] else None
+        )
+
+    def snapshot(self):
+        snapshot = self.limiter.snapshot()
+        snapshot['rate_limited'] = self.rate_limiter.rejected if self.rate_limiter else 0
+        return snapshot
+
+
+_endpoints = {}
+_endpoints_lock = threading.Lock()
+
+
+def get_endpoint(name):
+    endpoint = _endpoints.get(name)
+    if endpoint is None:
+        with _endpoints_lock:
+            endpoint = _endpoints.get(name)
+            if endpoint is None:
+                endpoint = Endpoint(name, get_admission_config(name))
+                _endpoints[name] = endpoint
+    return endpoint
+
+
+def admission_stats():
+    """Lugares ocupados, cola y rechazos por endpoint."""
+    return {name: endpoint.snapshot() for name, endpoint in list(_endpoints.items())}
+
+
+def identidad_cliente(request):
+    """Usuario del token si hay ``Authorization``; si no, la IP de origen."""
+    auth_header = request.headers.get('Authorization')
+    if auth_header:
+        return alcance_usuario(auth_header)
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def _respuesta_rechazo(motivo, retry_after):
+    retry_after = max(1, math.ceil(retry_after))
+    if motivo == RATE_LIMIT:
+        error, status_code = 'Demasiadas peticiones; reintente en unos segundos', 429
+    else:
+        error, status_code = 'El servicio está sobrecargado; reintente en unos segundos', 503
+    response = json_response(
+        {'error': error, 'details': {'motivo': motivo, 'retry_after': retry_after}},
+        status=status_code
+    )
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+class AdmissionMiddleware:
+    """
+    Aplica el control de admisión antes de ejecutar cada view.
+
+    El endpoint se identifica por el nombre de la URL resuelta; los de
+    ``EXEMPT`` no se limitan. El lugar se libera cuando el view devuelve la
+    respuesta (en las respuestas NDJSON, al empezar el streaming). La espera
+    en cola se registra como el span ``admision``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            self.process_view = self._process_view_async
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        try:
+            return self.get_response(request)
+        finally:
+            self._release(request)
+
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        finally:
+            self._release(request)
+
+    def _release(self, request):
+        endpoint = getattr(request, '_admission_endpoint', None)
+        if endpoint is not None:
+            request._admission_endpoint = None
+            endpoint.limiter.release()
+
+    def _endpoint(self, request):
+        match = request.resolver_match
+        name = match.url_name if match else None
+        if not name or name in _exentos():
+            return None
+        endpoint = get_endpoint(name)
+        return endpoint if endpoint.config['ENABLED'] else None
+
+    def _rate_limit(self, request, endpoint):
+        if endpoint.rate_limiter is None:
+            return None
+        espera = endpoint.rate_limiter.acquire(identidad_cliente(request))
+        return _respuesta_rechazo(RATE_LIMIT, espera) if espera else None
+
+    def _admitir(self, request, endpoint, motivo):
+        if motivo is not None:
+            return _respuesta_rechazo(motivo, endpoint.config['RETRY_AFTER'])
+        request._admission_endpoint = endpoint
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        endpoint = self._endpoint(request)
+        if endpoint is None:
+            return None
+        rechazo = self._rate_limit(request, endpoint)
+        if rechazo is not None:
+            return rechazo
+        with span('admision'):
+            motivo = endpoint.limiter.acquire()
+        return self._admitir(request, endpoint, motivo)
+
+    async def _process_view_async(self, request, view_func, view_args, view_kwargs):
+        endpoint = self._endpoint(request)
+        if endpoint is None:
+            return None
+        rechazo = self._rate_limit(request, endpoint)
+        if rechazo is not None:
+            return rechazo
+        with span('admision'):
+            # El endpoint se registra en la request dentro del acquire para que
+            # una cancelación no deje el lugar tomado sin nadie que lo libere
+            motivo = await endpoint.limiter.acquire_async(
+                lambda: setattr(request, '_admission_endpoint', endpoint)
+            )
+        return self._admitir(request, endpoint, motivo)
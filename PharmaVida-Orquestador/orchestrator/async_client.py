@@ -0,0 +1,93 @@
+"""
+Cliente HTTP asíncrono (httpx) para el modo ASGI.
+
+Equivalente a ``http_client`` para los views asíncronos: cada microservicio
+tiene un ``httpx.AsyncClient`` de larga vida con su pool de conexiones
+keep-alive. Como un cliente asíncrono queda atado al event loop en el que
+se crea, el registro guarda un juego de clientes por loop.
+"""
+
+import threading
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+
+from . import metrics
+from .http_client import get_http_client_config
+
+
+class AsyncMicroserviceClient:
+    """``httpx.AsyncClient`` de larga vida asociado a un microservicio."""
+
+    def __init__(self, service_name, base_url, config):
+        self.service_name = service_name
+        self.base_url = base_url
+        self.timeout = (config['CONNECT_TIMEOUT'], config['READ_TIMEOUT'])
+        limits = httpx.Limits(
+            max_connections=config['POOL_MAXSIZE'],
+            max_keepalive_connections=config['POOL_MAXSIZE'] if config['KEEP_ALIVE'] else 0,
+        )
+        self.client = httpx.AsyncClient(limits=limits, timeout=_httpx_timeout(self.timeout))
+
+    async def request(self, method, url, timeout=None, **kwargs):
+        status = 'error'
+        metrics.downstream_in_flight.inc(servicio=self.service_name)
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(
+                method, url, timeout=_httpx_timeout(timeout or self.timeout), **kwargs
+            )
+            status = response.status_code
+            return response
+        except httpx.TimeoutException:
+            status = 'timeout'
+            raise
+        finally:
+            metrics.downstream_in_flight.dec(servicio=self.service_name)
+            metrics.downstream_latency.observe(
+                time.perf_counter() - started,
+                servicio=self.service_name,
+                method=method,
+                status=status,
+            )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def _httpx_timeout(timeout):
+    connect, read = timeout
+    return httpx.Timeout(read, connect=connect)
+
+
+class AsyncClientRegistry:
+    """Clientes asíncronos por event loop y microservicio, creados de forma perezosa."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = weakref.WeakKeyDictionary()
+
+    def get(self, service_name, loop):
+        clients = self._clients.get(loop)
+        if clients is None:
+            with self._lock:
+                clients = self._clients.setdefault(loop, {})
+        client = clients.get(service_name)
+        if client is None:
+            base_url = settings.MICROSERVICES.get(service_name)
+            client = clients.setdefault(
+                service_name, AsyncMicroserviceClient(service_name, base_url, get_http_client_config())
+            )
+        return client
+
+    async def close_loop(self, loop):
+        """Cierra los clientes de un loop (por ejemplo al apagar el worker)."""
+        with self._lock:
+            clients = self._clients.pop(loop, {})
+        for client in clients.values():
+            await client.aclose()
+
+
+async_registry = AsyncClientRegistry()
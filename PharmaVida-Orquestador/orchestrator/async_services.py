@@ -0,0 +1,437 @@
+"""
+Servicios de orquestación asíncronos para el modo ASGI.
+
+Mismos flujos que ``services`` pero sobre ``httpx.AsyncClient``: los pasos
+independientes se lanzan como tareas del event loop y ningún hilo queda
+bloqueado esperando a un microservicio. Las validaciones y el armado de
+respuestas son las funciones compartidas de ``services``.
+"""
+
+import asyncio
+import logging
+from collections import deque
+
+import httpx
+from django.conf import settings
+
+from .async_client import async_registry
+from .auth import user_me_cache
+from .cache import product_cache
+from .concurrency import run_concurrently_async
+from .http_client import resolve_service_name
+from .jsoncodec import dumps
+from .pagination import DETALLE_FULL, DETALLE_NONE, paginar
+from .resilience import get_downstream
+from .services import (
+    _armar_compra_request,
+    _asignar_carritos,
+    _compra_no_registrada,
+    _compras_request_lote,
+    _detalle_compra,
+    _en_una_operacion,
+    _enriquecer_compra,
+    _error_descuento_stock,
+    _error_producto_receta_inexistente,
+    _get_microservice_url,
+    _grupos_reposicion,
+    _ids_productos_carritos,
+    _ids_productos_compras,
+    _ids_requieren_receta,
+    _IndiceRecetasBase,
+    _items_descuento,
+    _lineas,
+    _lote_no_soportado,
+    _partes,
+    _procesar_respuesta,
+    _productos_batch,
+    _registrar_no_registrados,
+    _registrar_resultados_compras,
+    _respuesta_lote,
+    _respuesta_receta,
+    _resultado_error,
+    _sin_stock,
+    _usuario_conocido,
+    _usuario_y_productos,
+    _validar_carrito,
+    _validar_nombre_producto,
+    _validar_paciente,
+    _validar_recetas,
+)
+from .tracing import current_trace, propagation_headers, span, use_trace
+from .utils import OrchestrationError
+
+logger = logging.getLogger(__name__)
+
+
+async def _make_request(method, url, headers=None, json=None, params=None):
+    """Versión asíncrona de ``services._make_request``."""
+    try:
+        logger.debug("[ORQUESTADOR][REQUEST] %s %s params=%s json=%s", method, url, params, json)
+        service_name = resolve_service_name(url)
+        client = async_registry.get(service_name, asyncio.get_running_loop())
+        with span('http', servicio=service_name, method=method, url=url) as http_span:
+            request_headers = dict(headers or {}, **propagation_headers())
+            body = None
+            if json is not None:
+                body = dumps(json)
+                request_headers['Content-Type'] = 'application/json'
+            response = await get_downstream(service_name).call_async(
+                method,
+                lambda timeout: client.request(
+                    method,
+                    url,
+                    headers=request_headers,
+                    content=body,
+                    params=params,
+                    timeout=timeout
+                )
+            )
+            if http_span is not None:
+                http_span.attrs['status'] = response.status_code
+        return _procesar_respuesta(method, url, response)
+
+    except OrchestrationError:
+        raise
+    except httpx.TimeoutException:
+        logger.error("[ORQUESTADOR][TIMEOUT] %s %s", method, url)
+        raise OrchestrationError("Timeout al comunicarse con el microservicio", status_code=504)
+    except httpx.TransportError:
+        logger.error("[ORQUESTADOR][CONNECTION ERROR] %s %s", method, url)
+        raise OrchestrationError("No se pudo conectar con el microservicio", status_code=503)
+    except Exception as e:
+        logger.exception("[ORQUESTADOR][UNEXPECTED ERROR] %s %s", method, url)
+        raise OrchestrationError(f"Error en petición al microservicio: {str(e)}", status_code=500)
+
+
+async def _obtener_usuario(usuarios_url, auth_token, headers, requiere_id=False):
+    usuario = _usuario_conocido(auth_token, requiere_id)
+    if usuario is not None:
+        return usuario
+    usuario = await _make_request('GET', f"{usuarios_url}/api/user/me", headers=headers)
+    user_me_cache.set(auth_token, usuario)
+    return usuario
+
+
+async def _obtener_producto(productos_url, producto_id, headers, use_cache=True):
+    if use_cache:
+        producto = product_cache.get(producto_id)
+        if producto is not None:
+            return producto
+    producto = await _make_request('GET', f"{productos_url}/api/productos/{producto_id}", headers=headers)
+    product_cache.set(producto_id, producto)
+    return producto
+
+
+async def _descontar_stock(productos_url, productos_detallados, headers):
+    try:
+        return await _make_request(
+            'POST',
+            f"{productos_url}/api/productos/stock/descontar",
+            headers=headers,
+            json=_items_descuento(productos_detallados)
+        )
+    except OrchestrationError as e:
+        error = _error_descuento_stock(e)
+        if error is None:
+            raise
+        raise error
+    finally:
+        product_cache.invalidate([p['producto_id'] for p in productos_detallados])
+
+
+class IndiceRecetasValidadasAsync(_IndiceRecetasBase):
+    """Versión asíncrona de ``services.IndiceRecetasValidadas``."""
+
+    async def sin_cubrir(self, producto_ids):
+        faltantes = self._sin_cubrir(producto_ids)
+        while faltantes and not self.agotado:
+            params = self._params()
+            with span('recetas', page=params['page']):
+                self._registrar_pagina(await _make_request('GET', self._url(), headers=self.headers, params=params))
+            faltantes = self._sin_cubrir(faltantes)
+        return faltantes
+
+
+async def registrar_compra_orquestada(productos_compra, cantidades_compra, auth_token, datos_adicionales=None,
+                                      max_concurrency=None, indice_recetas=None):
+    headers = {'Authorization': auth_token}
+    usuarios_url = _get_microservice_url('usuarios_y_autenticacion_y_compras')
+    productos_url = _get_microservice_url('productos_y_ofertas')
+
+    async def obtener_usuario():
+        with span('usuario'):
+            return await _obtener_usuario(usuarios_url, auth_token, headers)
+
+    async def obtener_productos(producto_ids):
+        with span('productos', cantidad=len(producto_ids)):
+            return await _obtener_productos_lote(productos_url, producto_ids, headers)
+
+    partes = _partes(list(dict.fromkeys(productos_compra)), settings.ORCHESTRATOR_PRODUCTOS_BATCH_MAX)
+    resultados = await run_concurrently_async(
+        [obtener_usuario]
+        + [lambda parte=parte: obtener_productos(parte) for parte in partes],
+        max_concurrency
+    )
+    usuario_response, productos_por_id = _usuario_y_productos(resultados)
+
+    productos_detallados, productos_requieren_receta = _validar_carrito(
+        productos_compra, cantidades_compra, productos_por_id
+    )
+
+    if productos_requieren_receta:
+        indice_recetas = IndiceRecetasValidadasAsync.del_paciente(indice_recetas, usuario_response['dni'], headers)
+        _validar_recetas(
+            productos_requieren_receta,
+            await indice_recetas.sin_cubrir([p['id'] for p in productos_requieren_receta])
+        )
+
+    with span('stock'):
+        try:
+            await _descontar_stock(productos_url, productos_detallados, headers)
+        except OrchestrationError as e:
+            if e.status_code != 504:
+                raise
+            raise _compra_no_registrada(e, False) from e
+
+    compra_request = _armar_compra_request(usuario_response, productos_detallados, datos_adicionales)
+    try:
+        with span('compra'):
+            compra_response = await _make_request(
+                'POST',
+                f"{usuarios_url}/api/compras",
+                headers=headers,
+                json=compra_request
+            )
+    except OrchestrationError as e:
+        with span('stock'):
+            repuesto = e.status_code != 504 and await _reponer_stock(productos_url, productos_detallados, headers)
+        raise _compra_no_registrada(e, repuesto) from e
+
+    compra_response['productos_detalle'] = _detalle_compra(productos_detallados)
+    return compra_response
+
+
+async def _obtener_productos_lote(productos_url, producto_ids, headers):
+    respuesta = await _make_request(
+        'GET', f"{productos_url}/api/productos/batch", headers=headers, params={'ids': producto_ids}
+    )
+    return _productos_batch(respuesta)
+
+
+async def _descontar_stock_lote(productos_url, aceptados, headers, resultados):
+    if _en_una_operacion(aceptados):
+        try:
+            await _descontar_stock(productos_url, _lineas(aceptados), headers)
+            return aceptados
+        except OrchestrationError as e:
+            if not _sin_stock(e):
+                raise
+
+    descontados = []
+    for indice, productos_detallados in aceptados:
+        try:
+            await _descontar_stock(productos_url, productos_detallados, headers)
+        except OrchestrationError as e:
+            if not _sin_stock(e):
+                raise
+            resultados[indice] = _resultado_error(indice, e)
+            continue
+        descontados.append((indice, productos_detallados))
+    return descontados
+
+
+async def _reponer_stock(productos_url, productos_detallados, headers):
+    try:
+        await _make_request(
+            'POST',
+            f"{productos_url}/api/productos/stock/reponer",
+            headers=headers,
+            json=_items_descuento(productos_detallados)
+        )
+        return True
+    except OrchestrationError as e:
+        logger.error(f"No se pudo reponer el stock de compras no registradas: {str(e)}")
+        return False
+    finally:
+        product_cache.invalidate([p['producto_id'] for p in productos_detallados])
+
+
+async def _reponer_no_registrados(productos_url, no_registrados, headers, resultados):
+    repuestos = set()
+    for grupo in _grupos_reposicion(no_registrados):
+        if await _reponer_stock(productos_url, _lineas(grupo), headers):
+            repuestos.update(indice for indice, _ in grupo)
+    _registrar_no_registrados(no_registrados, repuestos, resultados)
+
+
+async def _registrar_compras_lote(usuarios_url, compras_request, headers, max_concurrency):
+    try:
+        return await _make_request('POST', f"{usuarios_url}/api/compras/lote", headers=headers, json=compras_request)
+    except OrchestrationError as e:
+        if not _lote_no_soportado(e):
+            return [e] * len(compras_request)
+
+    async def registrar(compra_request):
+        try:
+            return await _make_request('POST', f"{usuarios_url}/api/compras", headers=headers, json=compra_request)
+        except OrchestrationError as e:
+            return e
+
+    return await run_concurrently_async(
+        [lambda compra_request=compra_request: registrar(compra_request) for compra_request in compras_request],
+        max_concurrency
+    )
+
+
+async def registrar_compras_lote(carritos, auth_token, max_concurrency=None):
+    """Versión asíncrona de ``services.registrar_compras_lote``."""
+    headers = {'Authorization': auth_token}
+    usuarios_url = _get_microservice_url('usuarios_y_autenticacion_y_compras')
+    productos_url = _get_microservice_url('productos_y_ofertas')
+
+    async def obtener_usuario():
+        with span('usuario'):
+            return await _obtener_usuario(usuarios_url, auth_token, headers)
+
+    async def obtener_productos(producto_ids):
+        with span('productos', cantidad=len(producto_ids)):
+            return await _obtener_productos_lote(productos_url, producto_ids, headers)
+
+    partes = _partes(_ids_productos_carritos(carritos), settings.ORCHESTRATOR_PRODUCTOS_BATCH_MAX)
+    resultados = await run_concurrently_async(
+        [obtener_usuario]
+        + [lambda parte=parte: obtener_productos(parte) for parte in partes],
+        max_concurrency
+    )
+    usuario_response, productos_por_id = _usuario_y_productos(resultados)
+
+    ids_receta = _ids_requieren_receta(productos_por_id)
+    ids_sin_receta = (
+        await IndiceRecetasValidadasAsync(usuario_response['dni'], headers).sin_cubrir(ids_receta)
+        if ids_receta else set()
+    )
+
+    aceptados, resultados = _asignar_carritos(carritos, productos_por_id, ids_sin_receta)
+
+    if aceptados:
+        with span('stock'):
+            aceptados = await _descontar_stock_lote(productos_url, aceptados, headers, resultados)
+
+    if aceptados:
+        compras_request = _compras_request_lote(usuario_response, aceptados, carritos)
+        with span('compra', cantidad=len(compras_request)):
+            compras_response = await _registrar_compras_lote(usuarios_url, compras_request, headers, max_concurrency)
+        no_registrados = _registrar_resultados_compras(aceptados, compras_response, resultados)
+
+        if no_registrados:
+            with span('stock'):
+                await _reponer_no_registrados(productos_url, no_registrados, headers, resultados)
+
+    return _respuesta_lote(resultados)
+
+
+async def obtener_compras_usuario(auth_token):
+    usuarios_url = _get_microservice_url('usuarios_y_autenticacion_y_compras')
+    with span('compras'):
+        compras_response = await _make_request(
+            'GET', f"{usuarios_url}/api/compras/me", headers={'Authorization': auth_token}
+        )
+    return compras_response if isinstance(compras_response, list) else []
+
+
+async def _consultar_productos_compras(compras, headers, max_concurrency, detalle=DETALLE_FULL):
+    if detalle == DETALLE_NONE:
+        return {}
+    productos_url = _get_microservice_url('productos_y_ofertas')
+    productos_ids_unicos = _ids_productos_compras(compras)
+
+    async def consultar(producto_id):
+        try:
+            return await _obtener_producto(productos_url, producto_id, headers)
+        except Exception as e:
+            logger.warning(f"No se pudo obtener detalle del producto {producto_id}: {str(e)}")
+            return None
+
+    with span('productos'):
+        return dict(zip(
+            productos_ids_unicos,
+            await run_concurrently_async(
+                [lambda producto_id=producto_id: consultar(producto_id) for producto_id in productos_ids_unicos],
+                max_concurrency
+            )
+        ))
+
+
+async def listar_compras_usuario_detalladas(auth_token, max_concurrency=None, page=None, pagesize=None,
+                                            detalle=DETALLE_FULL):
+    headers = {'Authorization': auth_token}
+    compras, paginacion = paginar(await obtener_compras_usuario(auth_token), page, pagesize)
+    productos_por_id = await _consultar_productos_compras(compras, headers, max_concurrency, detalle)
+
+    for compra in compras:
+        _enriquecer_compra(compra, productos_por_id, detalle)
+
+    return {'compras': compras, **paginacion}
+
+
+def iterar_compras_usuario_detalladas(compras, auth_token, max_concurrency=None, ventana=10,
+                                      detalle=DETALLE_FULL):
+    """Versión asíncrona de ``services.iterar_compras_usuario_detalladas`` (devuelve un generador asíncrono)."""
+    headers = {'Authorization': auth_token}
+    trace = current_trace()
+    pendientes = deque(compras)
+    compras.clear()
+
+    async def generar():
+        while pendientes:
+            lote = [pendientes.popleft() for _ in range(min(ventana, len(pendientes)))]
+            with use_trace(trace):
+                productos_por_id = await _consultar_productos_compras(lote, headers, max_concurrency, detalle)
+            for compra in lote:
+                yield _enriquecer_compra(compra, productos_por_id, detalle)
+
+    return generar()
+
+
+async def validar_y_actualizar_estado_receta(receta_id, nuevo_estado, auth_token, max_concurrency=None):
+    headers = {'Authorization': auth_token}
+    recetas_url = _get_microservice_url('recetas_y_medicos')
+    usuarios_url = _get_microservice_url('usuarios_y_autenticacion_y_compras')
+
+    async def obtener_receta():
+        with span('receta'):
+            return await _make_request('GET', f"{recetas_url}/api/recetas/{receta_id}", headers=headers)
+
+    async def obtener_usuario():
+        with span('usuario'):
+            return await _obtener_usuario(usuarios_url, auth_token, headers)
+
+    receta, usuario_me = await run_concurrently_async([obtener_receta, obtener_usuario], max_concurrency)
+
+    productos_url = _get_microservice_url('productos_y_ofertas')
+    productos_receta = receta.get('productos', [])
+
+    async def validar_producto(producto):
+        try:
+            producto_info = await _obtener_producto(productos_url, producto.get('id'), headers)
+        except OrchestrationError:
+            raise _error_producto_receta_inexistente(producto.get('id'))
+        _validar_nombre_producto(producto, producto_info)
+
+    with span('productos'):
+        await run_concurrently_async(
+            [lambda producto=producto: validar_producto(producto) for producto in productos_receta],
+            max_concurrency
+        )
+
+    _validar_paciente(receta, usuario_me)
+
+    with span('actualizacion'):
+        resultado = await _make_request(
+            'PUT',
+            f"{recetas_url}/api/recetas/{receta_id}/validar",
+            headers=headers,
+            json={'estadovalidacion': nuevo_estado}
+        )
+
+    return _respuesta_receta(resultado, productos_receta)
@@ -0,0 +1,262 @@
+"""
+Views asíncronos del orquestador para el modo ASGI.
+
+Exponen los mismos endpoints, validaciones y respuestas que ``views``, pero
+son views nativos de Django (``async def``) en lugar de ``APIView`` de DRF,
+que es solo síncrono: bajo ASGI, un view síncrono se ejecutaría en un hilo
+aparte y se perdería la ventaja del event loop.
+"""
+
+import logging
+
+from asgiref.sync import sync_to_async
+
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from . import metrics
+from .async_services import (
+    iterar_compras_usuario_detalladas,
+    listar_compras_usuario_detalladas,
+    obtener_compras_usuario,
+    registrar_compra_orquestada,
+    registrar_compras_lote,
+    validar_y_actualizar_estado_receta,
+)
+from .checkout_queue import (
+    encolar_compra,
+    estado_pedido,
+    headers_checkout,
+    pide_checkout_asincrono,
+    respuesta_encolado,
+)
+from .concurrency import get_max_concurrency
+from .idempotency import REPLAYED_HEADER, ejecutar_idempotente_async, get_idempotency_key
+from .jsoncodec import json_response, loads
+from .pagination import get_detalle, get_paginacion, paginar
+from .services import leer_carritos, status_lote
+from .streaming import NDJSON_CONTENT_TYPE, astream_ndjson, get_stream_window, pide_ndjson, streaming_headers
+from .tracing import current_request_id
+from .utils import OrchestrationError
+
+logger = logging.getLogger(__name__)
+
+
+def _error_response(e):
+    metrics.record_orchestration_error(e)
+    logger.error(f"Error de orquestación: {str(e)}")
+    return json_response(
+        {'error': str(e), 'details': getattr(e, 'details', None)},
+        status=getattr(e, 'status_code', 400)
+    )
+
+
+def _internal_error_response(e):
+    return json_response({'error': 'Error interno del servidor', 'details': str(e)}, status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncRegistrarCompraOrquestadaView(View):
+    """POST /api/orchestrator/compras (modo ASGI)."""
+
+    metrics_name = 'RegistrarCompraOrquestadaView'
+
+    async def post(self, request):
+        try:
+            auth_header = request.headers.get('Authorization')
+            try:
+                data = loads(request.body or b'{}')
+            except ValueError as e:
+                return json_response({'detail': f'JSON parse error - {str(e)}'}, status=400)
+            if not isinstance(data, dict):
+                data = {}
+
+            productos = data.get('productos')
+            cantidades = data.get('cantidades')
+            if not productos or not cantidades or len(productos) != len(cantidades):
+                return json_response(
+                    {'error': 'Se requiere arrays de productos y cantidades del mismo tamaño'},
+                    status=400
+                )
+
+            encolar = pide_checkout_asincrono(request)
+
+            async def ejecutar():
+                try:
+                    if encolar:
+                        pedido_id = await sync_to_async(encolar_compra, thread_sensitive=False)(auth_header, {
+                            'productos_compra': productos,
+                            'cantidades_compra': cantidades,
+                            'datos_adicionales': data.get('datos_adicionales', {}),
+                            'max_concurrency': get_max_concurrency(request),
+                        }, request_id=current_request_id())
+                        return 202, respuesta_encolado(pedido_id)
+                    return 201, await registrar_compra_orquestada(
+                        productos_compra=productos,
+                        cantidades_compra=cantidades,
+                        auth_token=auth_header,
+                        datos_adicionales=data.get('datos_adicionales', {}),
+                        max_concurrency=get_max_concurrency(request)
+                    )
+                except OrchestrationError as e:
+                    metrics.record_orchestration_error(e)
+                    logger.error(f"Error de orquestación: {str(e)}")
+                    return e.status_code, {'error': str(e), 'details': e.details}
+
+            clave = get_idempotency_key(request)
+            if clave is None:
+                status_code, body = await ejecutar()
+                return headers_checkout(json_response(body, status=status_code), body)
+
+            status_code, body, replayed = await ejecutar_idempotente_async(
+                clave, auth_header, request.path, data, ejecutar
+            )
+            response = headers_checkout(json_response(body, status=status_code), body)
+            if replayed:
+                response[REPLAYED_HEADER] = 'true'
+            return response
+
+        except OrchestrationError as e:
+            return _error_response(e)
+        except Exception as e:
+            logger.exception("Error inesperado en registrar compra")
+            return _internal_error_response(e)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncRegistrarComprasLoteView(View):
+    """POST /api/orchestrator/compras/lote (modo ASGI)."""
+
+    metrics_name = 'RegistrarComprasLoteView'
+
+    async def post(self, request):
+        try:
+            auth_header = request.headers.get('Authorization')
+            try:
+                data = loads(request.body or b'{}')
+            except ValueError as e:
+                return json_response({'detail': f'JSON parse error - {str(e)}'}, status=400)
+            carritos = leer_carritos(data)
+
+            async def ejecutar():
+                try:
+                    body = await registrar_compras_lote(carritos, auth_header, get_max_concurrency(request))
+                    return status_lote(body), body
+                except OrchestrationError as e:
+                    metrics.record_orchestration_error(e)
+                    logger.error(f"Error de orquestación: {str(e)}")
+                    return e.status_code, {'error': str(e), 'details': e.details}
+
+            clave = get_idempotency_key(request)
+            if clave is None:
+                status_code, body = await ejecutar()
+                return json_response(body, status=status_code)
+
+            status_code, body, replayed = await ejecutar_idempotente_async(
+                clave, auth_header, request.path, data, ejecutar
+            )
+            response = json_response(body, status=status_code)
+            if replayed:
+                response[REPLAYED_HEADER] = 'true'
+            return response
+
+        except OrchestrationError as e:
+            return _error_response(e)
+        except Exception as e:
+            logger.exception("Error inesperado en registrar compras en lote")
+            return _internal_error_response(e)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncListarMisComprasDetalladasView(View):
+    """GET /api/orchestrator/compras/me (modo ASGI)."""
+
+    metrics_name = 'ListarMisComprasDetalladasView'
+
+    async def get(self, request):
+        try:
+            auth_header = request.headers.get('Authorization')
+            if not auth_header:
+                return json_response({'error': 'Token de autenticación requerido'}, status=401)
+
+            page, pagesize = get_paginacion(request)
+            detalle = get_detalle(request)
+
+            if pide_ndjson(request):
+                compras, _ = paginar(await obtener_compras_usuario(auth_header), page, pagesize)
+                return streaming_headers(StreamingHttpResponse(
+                    astream_ndjson(iterar_compras_usuario_detalladas(
+                        compras,
+                        auth_header,
+                        max_concurrency=get_max_concurrency(request),
+                        ventana=get_stream_window(),
+                        detalle=detalle
+                    )),
+                    content_type=NDJSON_CONTENT_TYPE
+                ))
+
+            resultado = await listar_compras_usuario_detalladas(
+                auth_header,
+                max_concurrency=get_max_concurrency(request),
+                page=page,
+                pagesize=pagesize,
+                detalle=detalle
+            )
+            return json_response(resultado, status=200)
+
+        except OrchestrationError as e:
+            return _error_response(e)
+        except Exception as e:
+            logger.error(f"Error inesperado en listar compras: {str(e)}")
+            return _internal_error_response(e)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncEstadoCompraView(View):
+    """GET /api/orchestrator/compras/status/{id} (modo ASGI)."""
+
+    metrics_name = 'EstadoCompraView'
+
+    async def get(self, request, pedido_id):
+        try:
+            auth_header = request.headers.get('Authorization')
+            if not auth_header:
+                return json_response({'error': 'Token de autenticación requerido'}, status=401)
+
+            resultado = await sync_to_async(estado_pedido, thread_sensitive=False)(pedido_id, auth_header)
+            return json_response(resultado, status=200)
+
+        except OrchestrationError as e:
+            return json_response({'error': str(e), 'details': e.details}, status=e.status_code)
+        except Exception as e:
+            logger.error(f"Error inesperado en estado de compra: {str(e)}")
+            return _internal_error_response(e)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncValidarYActualizarRecetaView(View):
+    """PUT /api/orchestrator/recetas/validar/{id} (modo ASGI)."""
+
+    metrics_name = 'ValidarYActualizarRecetaView'
+
+    async def put(self, request, receta_id):
+        try:
+            auth_header = request.headers.get('Authorization')
+            if not auth_header:
+                return json_response({'error': 'Token de autenticación requerido'}, status=401)
+
+            resultado = await validar_y_actualizar_estado_receta(
+                receta_id=receta_id,
+                nuevo_estado="validada",
+                auth_token=auth_header,
+                max_concurrency=get_max_concurrency(request)
+            )
+            return json_response(resultado, status=200)
+
+        except OrchestrationError as e:
+            return _error_response(e)
+        except Exception as e:
+            logger.error(f"Error inesperado en validar receta: {str(e)}")
+            return _internal_error_response(e)
@@ -0,0 +1,154 @@
+"""
+Verificación local de los JWT emitidos por el microservicio de usuarios.
+
+El microservicio de usuarios firma los tokens con HS256 usando ``JWT_SECRET``
+y guarda el DNI en ``sub`` y el rol en ``role``. Si el orquestador comparte
+ese secreto puede validar el token y leer la identidad sin llamar a
+``/api/user/me``.
+"""
+
+import hashlib
+import time
+
+import jwt
+from django.conf import settings
+
+from .cache import TTLCache
+from .utils import OrchestrationError
+
+DEFAULT_JWT = {
+    'SECRET': '',
+    'ALGORITHMS': ['HS256'],
+    'LEEWAY': 0,
+    'ME_CACHE_MAX_ENTRIES': 10000,
+    'ME_CACHE_MAX_TTL': 900,
+}
+
+
+def get_jwt_config():
+    """Combina la configuración por defecto con ``settings.ORCHESTRATOR_JWT``."""
+    config = dict(DEFAULT_JWT)
+    config.update(getattr(settings, 'ORCHESTRATOR_JWT', {}) or {})
+    return config
+
+
+def extraer_token(auth_header):
+    """Obtiene el token de un header ``Authorization: Bearer <token>``."""
+    if not auth_header:
+        return None
+    partes = auth_header.split(None, 1)
+    if len(partes) == 2 and partes[0].lower() == 'bearer':
+        return partes[1].strip()
+    return auth_header.strip()
+
+
+def token_hash(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def verificar_token(auth_header):
+    """
+    Valida firma y expiración del token y devuelve sus claims.
+
+    Returns:
+        dict | None: Claims del token, o None si la verificación local está
+        desactivada (no hay ``JWT_SECRET`` configurado).
+
+    Raises:
+        OrchestrationError: 401 si el token falta, es inválido o expiró.
+    """
+    config = get_jwt_config()
+    if not config['SECRET']:
+        return None
+    token = extraer_token(auth_header)
+    if not token:
+        raise OrchestrationError("Token de autenticación requerido", status_code=401)
+    try:
+        return jwt.decode(
+            token,
+            config['SECRET'],
+            algorithms=config['ALGORITHMS'],
+            leeway=config['LEEWAY'],
+            options={'require': ['sub', 'exp']},
+        )
+    except jwt.ExpiredSignatureError:
+        raise OrchestrationError("El token de autenticación expiró", status_code=401)
+    except jwt.InvalidTokenError:
+        raise OrchestrationError("Token de autenticación inválido", status_code=401)
+
+
+def identidad_desde_claims(claims):
+    """Traduce los claims del token al formato de ``/api/user/me`` (dni, role, id si existe)."""
+    identidad = {'dni': claims.get('sub'), 'role': claims.get('role')}
+    for clave in ('id', 'userId', 'usuarioId'):
+        if claims.get(clave) is not None:
+            identidad['id'] = claims[clave]
+            break
+    return identidad
+
+
+def alcance_usuario(auth_header):
+    """
+    Identificador estable del usuario de una petición, para asociarle datos
+    guardados (claves de idempotencia, pedidos encolados).
+
+    Es el DNI si el token se puede verificar localmente; si no, el hash del
+    token.
+    """
+    try:
+        claims = verificar_token(auth_header)
+    except OrchestrationError:
+        claims = None
+    if claims is not None and claims.get('sub'):
+        return f"dni:{claims['sub']}"
+    return f"token:{token_hash(auth_header or '')}"
+
+
+class UserMeCache:
+    """
+    Memoiza respuestas de ``/api/user/me`` por hash del token.
+
+    Cada entrada vive hasta el ``exp`` del token (acotado por
+    ``ME_CACHE_MAX_TTL``), de modo que nunca sobrevive al token que la originó.
+    """
+
+    def __init__(self):
+        self._cache = None
+
+    def _store(self):
+        if self._cache is None:
+            config = get_jwt_config()
+            self._cache = TTLCache(config['ME_CACHE_MAX_ENTRIES'], config['ME_CACHE_MAX_TTL'])
+        return self._cache
+
+    def get(self, auth_header):
+        token = extraer_token(auth_header)
+        if not token:
+            return None
+        return self._store().get(token_hash(token))
+
+    def set(self, auth_header, usuario):
+        token = extraer_token(auth_header)
+        if not token or not isinstance(usuario, dict):
+            return
+        ttl = self._ttl(token)
+        if ttl > 0:
+            self._store().set(token_hash(token), usuario, ttl=ttl)
+
+    @staticmethod
+    def _ttl(token):
+        max_ttl = get_jwt_config()['ME_CACHE_MAX_TTL']
+        try:
+            # Solo se lee el exp; la validez del token ya la confirmó /api/user/me
+            exp = jwt.decode(token, options={'verify_signature': False}).get('exp')
+        except jwt.InvalidTokenError:
+            return 0
+        if exp is None:
+            return 0
+        return min(max_ttl, exp - time.time())
+
+    def stats(self):
+        return self._store().stats()
+
+
+user_me_cache = UserMeCache()
@@ -0,0 +1,140 @@
+"""
+Caché en memoria del catálogo de productos con expiración (TTL) y límite LRU.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+DEFAULT_PRODUCT_CACHE = {
+    'ENABLED': True,
+    'MAX_ENTRIES': 5000,
+    'TTL': 30.0,
+}
+
+
+class TTLCache:
+    """
+    Diccionario acotado con expiración por entrada.
+
+    Al superar ``max_entries`` se descarta la entrada usada hace más tiempo.
+    Es seguro para usarse desde los hilos de ``run_concurrently``.
+    """
+
+    def __init__(self, max_entries, ttl, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (self._clock() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / consultas, 4) if consultas else 0.0,
+                'expirations': self.expirations,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+def get_product_cache_config():
+    """Combina la configuración por defecto con ``settings.ORCHESTRATOR_PRODUCT_CACHE``."""
+    config = dict(DEFAULT_PRODUCT_CACHE)
+    config.update(getattr(settings, 'ORCHESTRATOR_PRODUCT_CACHE', {}) or {})
+    return config
+
+
+class ProductCache:
+    """Caché de lectura de productos indexada por ``producto_id``."""
+
+    def __init__(self):
+        self._cache = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return get_product_cache_config()['ENABLED']
+
+    def _store(self):
+        if self._cache is None:
+            with self._lock:
+                if self._cache is None:
+                    config = get_product_cache_config()
+                    self._cache = TTLCache(config['MAX_ENTRIES'], config['TTL'])
+        return self._cache
+
+    @staticmethod
+    def _key(producto_id):
+        return str(producto_id)
+
+    def get(self, producto_id):
+        if not self.enabled:
+            return None
+        return self._store().get(self._key(producto_id))
+
+    def set(self, producto_id, producto):
+        if self.enabled and isinstance(producto, dict):
+            self._store().set(self._key(producto_id), producto)
+
+    def invalidate(self, producto_ids):
+        store = self._store()
+        for producto_id in producto_ids:
+            store.invalidate(self._key(producto_id))
+
+    def clear(self):
+        self._store().clear()
+
+    def stats(self):
+        stats = self._store().stats()
+        stats['enabled'] = self.enabled
+        return stats
+
+
+product_cache = ProductCache()
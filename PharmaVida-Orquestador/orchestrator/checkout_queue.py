@@ -0,0 +1,502 @@
+"""
+Checkout asíncrono: cola durable de compras y workers en segundo plano.
+
+Con el modo asíncrono activo, ``POST /api/orchestrator/compras`` valida la
+entrada, encola el pedido y responde ``202`` con su id; un pool de workers
+ejecuta ``registrar_compra_orquestada`` y guarda el resultado, que se
+consulta en ``GET /api/orchestrator/compras/status/{id}``. Los picos de
+tráfico se acumulan en la cola en lugar de ocupar hilos de petición, y la
+cantidad de workers fija el ritmo de compras hacia los microservicios.
+
+La cola es intercambiable (``ORCHESTRATOR_CHECKOUT['BACKEND']``): ``sqlite``
+(archivo local, sobrevive a reinicios y se comparte entre los procesos del
+host) o la ruta a una clase propia que implemente ``CheckoutQueue``.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .auth import alcance_usuario
+from .tracing import end_trace, start_trace
+from .utils import OrchestrationError
+
+logger = logging.getLogger(__name__)
+
+PREFER_ASYNC = 'respond-async'
+
+MODO_OFF = 'off'
+MODO_PREFER = 'prefer'
+MODO_ALWAYS = 'always'
+
+PENDIENTE = 'pendiente'
+EN_PROCESO = 'en_proceso'
+COMPLETADO = 'completado'
+FALLIDO = 'fallido'
+
+PEDIDO_INTERRUMPIDO = {
+    'error': 'La compra se interrumpió mientras se descontaba el stock o se registraba; requiere revisión',
+    'details': {'requiere_revision': True},
+}
+
+DEFAULT_CHECKOUT = {
+    'MODE': MODO_OFF,
+    'BACKEND': 'sqlite',
+    'SQLITE_PATH': 'checkout_queue.sqlite3',
+    'WORKERS': 4,
+    'POLL_INTERVAL': 0.5,
+    'LEASE': 300,
+    'MAX_ATTEMPTS': 3,
+    'MAX_PENDING': 10000,
+    'RETENTION': 7 * 86400,
+}
+
+
+def get_checkout_config():
+    """Combina la configuración por defecto con ``settings.ORCHESTRATOR_CHECKOUT``."""
+    config = dict(DEFAULT_CHECKOUT)
+    config.update(getattr(settings, 'ORCHESTRATOR_CHECKOUT', {}) or {})
+    return config
+
+
+def pide_checkout_asincrono(request):
+    """
+    Decide si la compra se encola.
+
+    ``MODE='always'`` encola todas; ``MODE='prefer'`` solo las que envían
+    ``Prefer: respond-async`` (RFC 7240); ``MODE='off'`` ninguna.
+    """
+    modo = get_checkout_config()['MODE']
+    if modo == MODO_ALWAYS:
+        return True
+    if modo == MODO_PREFER:
+        prefer = request.headers.get('Prefer', '')
+        return PREFER_ASYNC in [p.strip().lower() for p in prefer.split(',')]
+    return False
+
+
+class CheckoutQueue:
+    """
+    Interfaz de la cola de pedidos.
+
+    Un pedido es un dict con ``id``, ``alcance`` (dueño), ``estado``,
+    ``payload`` (argumentos de la compra), ``auth``, ``request_id``,
+    ``intentos``, ``escribiendo``, ``creado``, ``actualizado``,
+    ``status_code`` y ``resultado``.
+    """
+
+    def enqueue(self, alcance, auth, payload, request_id=None):
+        """Encola un pedido y devuelve su id."""
+        raise NotImplementedError
+
+    def claim(self, lease):
+        """Toma el pedido pendiente más antiguo (o uno cuyo worker dejó de responder) y lo marca en proceso."""
+        raise NotImplementedError
+
+    def checkpoint(self, pedido_id, intento):
+        """
+        Marca que el intento ``intento`` del pedido empieza a descontar stock y
+        registrar la compra. Un pedido marcado cuyo worker deja de responder no
+        vuelve a la cola (repetirlo descontaría y compraría dos veces): queda
+        fallido para revisión.
+
+        Returns:
+            bool: False si el pedido ya no pertenece a ese intento (el lease
+            venció y lo tomó otro worker); en ese caso no hay que seguir
+        """
+        raise NotImplementedError
+
+    def finish(self, pedido_id, status_code, resultado):
+        raise NotImplementedError
+
+    def get(self, pedido_id):
+        raise NotImplementedError
+
+    def pending_count(self):
+        raise NotImplementedError
+
+    def counts(self):
+        """Cantidad de pedidos por estado."""
+        raise NotImplementedError
+
+    def purge(self, older_than):
+        """Elimina los pedidos terminados antes de ``older_than`` (epoch)."""
+        raise NotImplementedError
+
+
+class SQLiteCheckoutQueue(CheckoutQueue):
+    """
+    Cola en un archivo SQLite en modo WAL.
+
+    El token del cliente se guarda solo mientras el pedido está pendiente o
+    en proceso (los workers lo necesitan para llamar a los microservicios) y
+    se borra al terminar. Por eso el archivo se crea con permisos ``0600``.
+    """
+
+    COLUMNAS = ('id', 'alcance', 'estado', 'payload', 'auth', 'request_id', 'intentos', 'escribiendo',
+                'creado', 'actualizado', 'lease_hasta', 'status_code', 'resultado')
+
+    def __init__(self, config):
+        self.path = str(config['SQLITE_PATH'])
+        self.max_attempts = config['MAX_ATTEMPTS']
+        self._local = threading.local()
+        self._restringir_permisos()
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS pedidos ('
+            ' id TEXT PRIMARY KEY,'
+            ' alcance TEXT NOT NULL,'
+            ' estado TEXT NOT NULL,'
+            ' payload TEXT NOT NULL,'
+            ' auth TEXT,'
+            ' request_id TEXT,'
+            ' intentos INTEGER NOT NULL DEFAULT 0,'
+            ' escribiendo INTEGER NOT NULL DEFAULT 0,'
+            ' creado REAL NOT NULL,'
+            ' actualizado REAL NOT NULL,'
+            ' lease_hasta REAL,'
+            ' status_code INTEGER,'
+            ' resultado TEXT)'
+        )
+        columnas = {fila[1] for fila in conn.execute('PRAGMA table_info(pedidos)')}
+        if 'escribiendo' not in columnas:
+            # Colas creadas por versiones anteriores
+            conn.execute('ALTER TABLE pedidos ADD COLUMN escribiendo INTEGER NOT NULL DEFAULT 0')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_pedidos_estado_creado ON pedidos (estado, creado)')
+
+    def _restringir_permisos(self):
+        # Solo el usuario del proceso puede leer los tokens. SQLite crea los
+        # archivos -wal y -shm con los permisos del archivo principal
+        os.close(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600))
+        for path in (self.path, f'{self.path}-wal', f'{self.path}-shm'):
+            if os.path.exists(path):
+                os.chmod(path, 0o600)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _pedido(self, fila):
+        if fila is None:
+            return None
+        pedido = dict(zip(self.COLUMNAS, fila))
+        pedido['payload'] = json.loads(pedido['payload'])
+        if pedido['resultado'] is not None:
+            pedido['resultado'] = json.loads(pedido['resultado'])
+        return pedido
+
+    def enqueue(self, alcance, auth, payload, request_id=None):
+        pedido_id = uuid.uuid4().hex
+        ahora = time.time()
+        self._connection().execute(
+            'INSERT INTO pedidos (id, alcance, estado, payload, auth, request_id, creado, actualizado) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (pedido_id, alcance, PENDIENTE, json.dumps(payload), auth, request_id, ahora, ahora)
+        )
+        return pedido_id
+
+    def claim(self, lease):
+        conn = self._connection()
+        ahora = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Pedidos cuyo worker murió después de empezar a descontar stock:
+            # no se sabe qué llegó a hacer, así que no se repiten
+            interrumpidos = [fila[0] for fila in conn.execute(
+                'SELECT id FROM pedidos WHERE estado = ? AND lease_hasta < ? AND escribiendo = 1',
+                (EN_PROCESO, ahora)
+            )]
+            for pedido_id in interrumpidos:
+                logger.warning(f"[CHECKOUT] Pedido {pedido_id} interrumpido durante la compra; requiere revisión")
+                conn.execute(
+                    'UPDATE pedidos SET estado = ?, auth = NULL, status_code = 500, resultado = ?, '
+                    'lease_hasta = NULL, actualizado = ? WHERE id = ?',
+                    (FALLIDO, json.dumps(PEDIDO_INTERRUMPIDO), ahora, pedido_id)
+                )
+            # Pedidos cuyo worker murió y ya agotaron los intentos: se dan por fallidos
+            conn.execute(
+                'UPDATE pedidos SET estado = ?, auth = NULL, status_code = 500, resultado = ?, actualizado = ? '
+                'WHERE estado = ? AND lease_hasta < ? AND intentos >= ?',
+                (FALLIDO, json.dumps({'error': 'El pedido no pudo procesarse'}), ahora,
+                 EN_PROCESO, ahora, self.max_attempts)
+            )
+            fila = conn.execute(
+                f'SELECT {", ".join(self.COLUMNAS)} FROM pedidos '
+                'WHERE estado = ? OR (estado = ? AND lease_hasta < ?) '
+                'ORDER BY creado LIMIT 1',
+                (PENDIENTE, EN_PROCESO, ahora)
+            ).fetchone()
+            if fila is not None:
+                conn.execute(
+                    'UPDATE pedidos SET estado = ?, intentos = intentos + 1, lease_hasta = ?, actualizado = ? '
+                    'WHERE id = ?',
+                    (EN_PROCESO, ahora + lease, ahora, fila[0])
+                )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        pedido = self._pedido(fila)
+        if pedido is not None:
+            pedido['estado'] = EN_PROCESO
+            pedido['intentos'] += 1
+        return pedido
+
+    def checkpoint(self, pedido_id, intento):
+        cursor = self._connection().execute(
+            'UPDATE pedidos SET escribiendo = 1, actualizado = ? WHERE id = ? AND estado = ? AND intentos = ?',
+            (time.time(), pedido_id, EN_PROCESO, intento)
+        )
+        return cursor.rowcount == 1
+
+    def finish(self, pedido_id, status_code, resultado):
+        estado = COMPLETADO if status_code < 400 else FALLIDO
+        self._connection().execute(
+            'UPDATE pedidos SET estado = ?, auth = NULL, status_code = ?, resultado = ?, lease_hasta = NULL, '
+            'actualizado = ? WHERE id = ?',
+            (estado, status_code, json.dumps(resultado), time.time(), pedido_id)
+        )
+
+    def get(self, pedido_id):
+        fila = self._connection().execute(
+            f'SELECT {", ".join(self.COLUMNAS)} FROM pedidos WHERE id = ?', (pedido_id,)
+        ).fetchone()
+        return self._pedido(fila)
+
+    def pending_count(self):
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM pedidos WHERE estado = ?', (PENDIENTE,)
+        ).fetchone()[0]
+
+    def counts(self):
+        filas = self._connection().execute('SELECT estado, COUNT(*) FROM pedidos GROUP BY estado').fetchall()
+        return dict(filas)
+
+    def purge(self, older_than):
+        self._connection().execute(
+            'DELETE FROM pedidos WHERE estado IN (?, ?) AND actualizado < ?',
+            (COMPLETADO, FALLIDO, older_than)
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteCheckoutQueue,
+}
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                config = get_checkout_config()
+                backend = config['BACKEND']
+                queue_class = BACKENDS.get(backend) or import_string(backend)
+                _queue = queue_class(config)
+    return _queue
+
+
+def queue_stats():
+    """Pedidos por estado; vacío si la cola nunca se usó en este proceso."""
+    if _queue is None:
+        return {}
+    return _queue.counts()
+
+
+class _PedidoReasignado(Exception):
+    """El lease del pedido venció y otro worker lo tomó."""
+
+
+class CheckoutWorkerPool:
+    """
+    Hilos que toman pedidos de la cola y ejecutan la compra.
+
+    Se crean por proceso (si el proceso se bifurca después de arrancarlos,
+    el hijo arranca los suyos). Un pedido nuevo encolado en el mismo proceso
+    despierta a los workers de inmediato; los encolados por otros procesos
+    se detectan en el siguiente sondeo (``POLL_INTERVAL``).
+    """
+
+    def __init__(self, queue, workers, config):
+        self.queue = queue
+        self.workers = workers
+        self.poll_interval = config['POLL_INTERVAL']
+        self.lease = config['LEASE']
+        self.retention = config['RETENTION']
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid() and self._threads:
+                return self
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f'checkout-worker-{n}', daemon=True)
+                for n in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def notify(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                pedido = self.queue.claim(self.lease)
+            except Exception:
+                logger.exception("[CHECKOUT] Error leyendo la cola de pedidos")
+                pedido = None
+            if pedido is None:
+                self._maybe_purge()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self.process(pedido)
+
+    def _maybe_purge(self):
+        ahora = time.time()
+        if ahora - self._last_purge < 3600:
+            return
+        self._last_purge = ahora
+        try:
+            self.queue.purge(ahora - self.retention)
+        except Exception:
+            logger.exception("[CHECKOUT] Error depurando la cola de pedidos")
+
+    def process(self, pedido):
+        from .services import registrar_compra_orquestada
+
+        def antes_de_escribir():
+            if not self.queue.checkpoint(pedido['id'], pedido['intentos']):
+                raise _PedidoReasignado()
+
+        trace, token = start_trace(pedido.get('request_id'))
+        try:
+            resultado = registrar_compra_orquestada(
+                auth_token=pedido['auth'], antes_de_escribir=antes_de_escribir, **pedido['payload']
+            )
+            status_code = 201
+        except _PedidoReasignado:
+            logger.warning(f"[CHECKOUT] Pedido {pedido['id']} tomado por otro worker; se abandona este intento")
+            return
+        except OrchestrationError as e:
+            from .metrics import record_orchestration_error
+            record_orchestration_error(e)
+            logger.error(f"[CHECKOUT] Pedido {pedido['id']} rechazado: {str(e)}")
+            status_code, resultado = e.status_code, {'error': str(e), 'details': e.details}
+        except Exception as e:
+            logger.exception(f"[CHECKOUT] Error inesperado en el pedido {pedido['id']}")
+            status_code, resultado = 500, {'error': 'Error interno del servidor', 'details': str(e)}
+        finally:
+            end_trace(token)
+        self.queue.finish(pedido['id'], status_code, resultado)
+
+
+_pool = None
+
+
+def get_worker_pool(workers=None):
+    """Pool de workers del proceso; lo arranca si hace falta."""
+    global _pool
+    config = get_checkout_config()
+    workers = config['WORKERS'] if workers is None else workers
+    with _queue_lock:
+        if _pool is None:
+            _pool = CheckoutWorkerPool(get_queue(), workers, config)
+    if _pool.workers > 0:
+        _pool.start()
+    return _pool
+
+
+def encolar_compra(auth_header, payload, request_id=None):
+    """
+    Encola una compra validada y despierta a los workers del proceso.
+
+    Returns:
+        str: Id del pedido
+
+    Raises:
+        OrchestrationError: 503 si la cola alcanzó ``MAX_PENDING`` pedidos
+    """
+    config = get_checkout_config()
+    queue = get_queue()
+    if config['MAX_PENDING'] and queue.pending_count() >= config['MAX_PENDING']:
+        raise OrchestrationError(
+            "Hay demasiadas compras en espera; reintente en unos segundos",
+            status_code=503,
+            details={'retry_after': 5}
+        )
+    pedido_id = queue.enqueue(alcance_usuario(auth_header), auth_header, payload, request_id)
+    get_worker_pool().notify()
+    return pedido_id
+
+
+def estado_pedido(pedido_id, auth_header):
+    """
+    Estado de un pedido encolado, visible solo para el usuario que lo creó.
+
+    Raises:
+        OrchestrationError: 404 si no existe o pertenece a otro usuario
+    """
+    get_worker_pool()
+    pedido = get_queue().get(pedido_id)
+    if pedido is None or pedido['alcance'] != alcance_usuario(auth_header):
+        raise OrchestrationError("Pedido no encontrado", status_code=404)
+    respuesta = {
+        'pedido_id': pedido['id'],
+        'estado': pedido['estado'],
+        'intentos': pedido['intentos'],
+        'creado': pedido['creado'],
+        'actualizado': pedido['actualizado'],
+    }
+    if pedido['estado'] in (COMPLETADO, FALLIDO):
+        respuesta['resultado'] = {'status_code': pedido['status_code'], 'body': pedido['resultado']}
+    return respuesta
+
+
+def headers_checkout(response, body):
+    """Agrega ``Location`` a las respuestas 202 y ``Retry-After`` a los 503 por cola llena."""
+    if response.status_code == 202:
+        response['Location'] = body['status_url']
+    elif response.status_code == 503:
+        retry_after = ((body or {}).get('details') or {}).get('retry_after')
+        if retry_after:
+            response['Retry-After'] = str(retry_after)
+    return response
+
+
+def respuesta_encolado(pedido_id):
+    return {
+        'pedido_id': pedido_id,
+        'estado': PENDIENTE,
+        'status_url': f'/api/orchestrator/compras/status/{pedido_id}',
+    }
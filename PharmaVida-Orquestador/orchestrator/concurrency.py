@@ -0,0 +1,120 @@
+"""
+Ejecución concurrente acotada de pasos independientes de una orquestación.
+"""
+
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+
+from django.conf import settings
+
+from .profiling import ejecutar_perfilado
+from .utils import OrchestrationError
+
+DEFAULT_MAX_CONCURRENCY = 8
+MAX_CONCURRENCY_HEADER = 'X-Max-Concurrency'
+
+
+def get_max_concurrency(request=None):
+    """
+    Obtiene el límite de concurrencia para una petición.
+
+    El valor por defecto es ``settings.ORCHESTRATOR_MAX_CONCURRENCY``; el
+    cliente puede reducirlo (nunca aumentarlo) con el header
+    ``X-Max-Concurrency``. Un valor de 1 ejecuta todo en secuencia.
+    """
+    limite = getattr(settings, 'ORCHESTRATOR_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY)
+    if request is None:
+        return limite
+    solicitado = request.headers.get(MAX_CONCURRENCY_HEADER)
+    if not solicitado:
+        return limite
+    try:
+        solicitado = int(solicitado)
+    except (TypeError, ValueError):
+        return limite
+    return max(1, min(solicitado, limite))
+
+
+def run_concurrently(tasks, max_concurrency=None):
+    """
+    Ejecuta funciones sin argumentos en paralelo y devuelve sus resultados en orden.
+
+    La primera excepción que se produzca se propaga (por ejemplo una
+    ``OrchestrationError``) y las tareas que aún no empezaron se cancelan.
+    Cada tarea corre con una copia del contexto actual, de modo que las
+    ``contextvars`` de la petición siguen disponibles (y, si la petición se
+    está perfilando, el profiler muestrea también el hilo de la tarea).
+
+    Args:
+        tasks: Lista de callables sin argumentos
+        max_concurrency: Máximo de tareas simultáneas
+
+    Returns:
+        list: Resultados en el mismo orden que ``tasks``
+    """
+    tasks = list(tasks)
+    if max_concurrency is None:
+        max_concurrency = get_max_concurrency()
+    workers = min(max(1, max_concurrency), len(tasks))
+    if workers <= 1:
+        return [task() for task in tasks]
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='orquestador')
+    try:
+        futures = [executor.submit(contextvars.copy_context().run, ejecutar_perfilado, task) for task in tasks]
+        done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+        errores = [f.exception() for f in futures if f in done and f.exception() is not None]
+        if errores:
+            for future in pending:
+                future.cancel()
+            raise _first_error(errores)
+        return [future.result() for future in futures]
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_concurrently_async(coros_factories, max_concurrency=None):
+    """
+    Versión asíncrona de ``run_concurrently`` para los views ASGI.
+
+    Recibe callables sin argumentos que devuelven corrutinas; las ejecuta
+    como tareas del event loop con un semáforo de ``max_concurrency`` y
+    devuelve sus resultados en orden. Ante la primera excepción se cancelan
+    las tareas restantes.
+    """
+    factories = list(coros_factories)
+    if max_concurrency is None:
+        max_concurrency = get_max_concurrency()
+    limite = min(max(1, max_concurrency), len(factories))
+    if limite <= 1:
+        return [await factory() for factory in factories]
+
+    semaforo = asyncio.Semaphore(limite)
+
+    async def acotada(factory):
+        async with semaforo:
+            return await factory()
+
+    tareas = [asyncio.ensure_future(acotada(factory)) for factory in factories]
+    try:
+        done, pending = await asyncio.wait(tareas, return_when=asyncio.FIRST_EXCEPTION)
+        errores = [t.exception() for t in tareas if t in done and not t.cancelled() and t.exception() is not None]
+        if errores:
+            raise _first_error(errores)
+        return [t.result() for t in tareas]
+    finally:
+        pendientes = [t for t in tareas if not t.done()]
+        for tarea in pendientes:
+            tarea.cancel()
+        if pendientes:
+            await asyncio.gather(*pendientes, return_exceptions=True)
+
+
+def _first_error(errores):
+    # Si varias tareas fallaron a la vez se prioriza una OrchestrationError,
+    # que es la que los views saben convertir en respuesta.
+    for error in errores:
+        if isinstance(error, OrchestrationError):
+            return error
+    return errores[0]
@@ -0,0 +1,246 @@
+"""
+Cliente HTTP con pool de conexiones keep-alive por microservicio.
+
+Cada entrada de ``settings.MICROSERVICES`` obtiene una ``requests.Session``
+de larga vida con su propio pool de conexiones, de modo que las llamadas de
+una misma orquestación reutilizan las conexiones TCP ya abiertas en lugar de
+pagar el handshake en cada salto.
+"""
+
+import os
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from django.conf import settings
+
+from . import metrics
+
+DEFAULT_HTTP_CLIENT = {
+    'POOL_CONNECTIONS': 4,
+    'POOL_MAXSIZE': 20,
+    'POOL_BLOCK': False,
+    'CONNECT_TIMEOUT': 3.0,
+    'READ_TIMEOUT': 15.0,
+    'KEEP_ALIVE': True,
+}
+
+
+def get_http_client_config():
+    """Combina la configuración por defecto con ``settings.ORCHESTRATOR_HTTP_CLIENT``."""
+    config = dict(DEFAULT_HTTP_CLIENT)
+    config.update(getattr(settings, 'ORCHESTRATOR_HTTP_CLIENT', {}) or {})
+    return config
+
+
+class PoolStats:
+    """Contadores de uso del pool de conexiones de un microservicio."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def record_checkout(self, wait_time):
+        with self._lock:
+            self.requests += 1
+            self.wait_time_total += wait_time
+            if wait_time > self.wait_time_max:
+                self.wait_time_max = wait_time
+
+    def record_new_connection(self):
+        with self._lock:
+            self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            hits = max(self.requests - self.misses, 0)
+            return {
+                'requests': self.requests,
+                'hits': hits,
+                'misses': self.misses,
+                'hit_ratio': round(hits / self.requests, 4) if self.requests else 0.0,
+                'wait_time_total_ms': round(self.wait_time_total * 1000, 3),
+                'wait_time_avg_ms': round(self.wait_time_total * 1000 / self.requests, 3) if self.requests else 0.0,
+                'wait_time_max_ms': round(self.wait_time_max * 1000, 3),
+            }
+
+
+class _InstrumentedPoolMixin:
+    """Mide el tiempo de espera por una conexión y cuenta las conexiones nuevas."""
+
+    pool_stats = None
+
+    def _get_conn(self, timeout=None):
+        started = time.perf_counter()
+        conn = super()._get_conn(timeout=timeout)
+        if self.pool_stats is not None:
+            self.pool_stats.record_checkout(time.perf_counter() - started)
+        return conn
+
+    def _new_conn(self):
+        if self.pool_stats is not None:
+            self.pool_stats.record_new_connection()
+        return super()._new_conn()
+
+
+class _InstrumentedHTTPConnectionPool(_InstrumentedPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _InstrumentedHTTPSConnectionPool(_InstrumentedPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """``HTTPAdapter`` que usa pools instrumentados y sockets con TCP keep-alive."""
+
+    def __init__(self, pool_stats, keep_alive=True, **kwargs):
+        self.pool_stats = pool_stats
+        self.keep_alive = keep_alive
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self.keep_alive:
+            pool_kwargs.setdefault('socket_options', _keep_alive_socket_options())
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        stats = self.pool_stats
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('HTTPConnectionPool', (_InstrumentedHTTPConnectionPool,), {'pool_stats': stats}),
+            'https': type('HTTPSConnectionPool', (_InstrumentedHTTPSConnectionPool,), {'pool_stats': stats}),
+        }
+
+
+def _keep_alive_socket_options():
+    from urllib3.connection import HTTPConnection
+
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60))
+    if hasattr(socket, 'TCP_KEEPINTVL'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 15))
+    return options
+
+
+class MicroserviceClient:
+    """Sesión HTTP de larga vida asociada a un microservicio."""
+
+    def __init__(self, service_name, base_url, config):
+        self.service_name = service_name
+        self.base_url = base_url
+        self.timeout = (config['CONNECT_TIMEOUT'], config['READ_TIMEOUT'])
+        self.stats = PoolStats()
+        self.session = requests.Session()
+        adapter = PooledHTTPAdapter(
+            self.stats,
+            keep_alive=config['KEEP_ALIVE'],
+            pool_connections=config['POOL_CONNECTIONS'],
+            pool_maxsize=config['POOL_MAXSIZE'],
+            pool_block=config['POOL_BLOCK'],
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if config['KEEP_ALIVE']:
+            self.session.headers['Connection'] = 'keep-alive'
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        status = 'error'
+        metrics.downstream_in_flight.inc(servicio=self.service_name)
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method=method, url=url, **kwargs)
+            status = response.status_code
+            return response
+        except requests.Timeout:
+            status = 'timeout'
+            raise
+        finally:
+            metrics.downstream_in_flight.dec(servicio=self.service_name)
+            metrics.downstream_latency.observe(
+                time.perf_counter() - started,
+                servicio=self.service_name,
+                method=method,
+                status=status,
+            )
+
+    def close(self):
+        self.session.close()
+
+
+class ClientRegistry:
+    """
+    Registro de clientes por microservicio.
+
+    Los clientes se crean de forma perezosa y se asocian al PID del proceso:
+    si un worker se crea por ``fork`` después de haber usado el registro, los
+    sockets heredados se descartan y el worker abre sus propias conexiones.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._pid = os.getpid()
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # No se cierran: los sockets pertenecen al proceso padre
+                    self._clients = {}
+                    self._pid = os.getpid()
+
+    def get(self, service_name):
+        self._check_pid()
+        client = self._clients.get(service_name)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(service_name)
+            if client is None:
+                base_url = settings.MICROSERVICES.get(service_name)
+                client = MicroserviceClient(service_name, base_url, get_http_client_config())
+                self._clients[service_name] = client
+            return client
+
+    def for_url(self, url):
+        """Devuelve el cliente del microservicio cuya URL base es prefijo de ``url``."""
+        return self.get(resolve_service_name(url))
+
+    def stats(self):
+        self._check_pid()
+        return {name: client.stats.snapshot() for name, client in list(self._clients.items())}
+
+    def close_all(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients = {}
+
+
+def resolve_service_name(url):
+    """Identifica el microservicio destino de una URL; ``'externo'`` si no coincide con ninguno."""
+    best_name, best_len = None, -1
+    for name, base_url in settings.MICROSERVICES.items():
+        if base_url and url.startswith(base_url) and len(base_url) > best_len:
+            best_name, best_len = name, len(base_url)
+    return best_name or 'externo'
+
+
+registry = ClientRegistry()
+
+
+def get_client(service_name):
+    return registry.get(service_name)
+
+
+def pool_stats():
+    """Contadores de hit/miss y espera del pool por microservicio."""
+    return registry.stats()
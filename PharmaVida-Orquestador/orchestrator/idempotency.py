@@ -0,0 +1,465 @@
+"""
+Idempotencia de ``POST /api/orchestrator/compras`` mediante el header
+``Idempotency-Key``.
+
+La primera petición con una clave ejecuta la compra y guarda el resultado
+(status y cuerpo) durante ``TTL`` segundos; los reintentos con la misma
+clave reciben ese resultado sin volver a llamar a los microservicios. Si
+llega un duplicado mientras la primera sigue en curso, espera a que termine
+en lugar de ejecutar la compra otra vez.
+
+El almacenamiento es intercambiable (``ORCHESTRATOR_IDEMPOTENCY['BACKEND']``):
+
+- ``memory``: por proceso; alcanza con un solo worker.
+- ``sqlite``: archivo local compartido por todos los workers del host.
+- Ruta a una clase propia que implemente ``IdempotencyStore``.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .auth import alcance_usuario
+from .utils import OrchestrationError
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+EN_CURSO = 'en_curso'
+COMPLETADO = 'completado'
+
+DEFAULT_IDEMPOTENCY = {
+    'BACKEND': 'memory',
+    'TTL': 86400,
+    'LEASE': 120,
+    'WAIT_TIMEOUT': 30.0,
+    'POLL_INTERVAL': 0.05,
+    'MAX_ENTRIES': 10000,
+    'SQLITE_PATH': 'idempotency.sqlite3',
+}
+
+
+def get_idempotency_config():
+    """Combina la configuración por defecto con ``settings.ORCHESTRATOR_IDEMPOTENCY``."""
+    config = dict(DEFAULT_IDEMPOTENCY)
+    config.update(getattr(settings, 'ORCHESTRATOR_IDEMPOTENCY', {}) or {})
+    return config
+
+
+class IdempotencyStore:
+    """
+    Interfaz de almacenamiento de resultados por clave.
+
+    Los registros son dicts con ``estado`` (``en_curso`` o ``completado``),
+    ``fingerprint``, ``status`` y ``body``. Un registro ``en_curso`` vence a
+    los ``lease`` segundos, para que una ejecución que murió a medias no
+    bloquee la clave para siempre.
+    """
+
+    def __init__(self, config):
+        self.ttl = config['TTL']
+        self.lease = config['LEASE']
+        self.poll_interval = config['POLL_INTERVAL']
+
+    def begin(self, key, fingerprint):
+        """
+        Reserva la clave si está libre.
+
+        Returns:
+            tuple: ``(True, None)`` si la reservó; ``(False, registro)`` si ya existía
+        """
+        raise NotImplementedError
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def complete(self, key, status, body):
+        raise NotImplementedError
+
+    def release(self, key):
+        """Libera una reserva ``en_curso`` sin guardar resultado."""
+        raise NotImplementedError
+
+    def wait(self, key, timeout):
+        """
+        Espera a que el registro de ``key`` deje de estar en curso.
+
+        Returns:
+            dict: El registro completado, o None si se liberó o venció el tiempo
+        """
+        limite = time.monotonic() + timeout
+        while True:
+            registro = self.get(key)
+            if registro is None or registro['estado'] == COMPLETADO:
+                return registro
+            if time.monotonic() >= limite:
+                return registro
+            time.sleep(self.poll_interval)
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """
+    Registros en un dict del proceso, acotado a ``MAX_ENTRIES``.
+
+    Para hacer lugar se descartan los registros completados (o vencidos) más
+    antiguos, nunca uno en curso: un duplicado que llegara después volvería a
+    ejecutar la compra. Si todos los lugares están en curso, la clave nueva
+    se rechaza con 503.
+    """
+
+    def __init__(self, config, clock=time.monotonic):
+        super().__init__(config)
+        self.max_entries = config['MAX_ENTRIES']
+        self._clock = clock
+        self._data = OrderedDict()
+        self._cond = threading.Condition()
+
+    def _vigente(self, key):
+        registro = self._data.get(key)
+        if registro is not None and registro['expira'] <= self._clock():
+            del self._data[key]
+            return None
+        return registro
+
+    def begin(self, key, fingerprint):
+        with self._cond:
+            registro = self._vigente(key)
+            if registro is not None:
+                return False, dict(registro)
+            if not self._hacer_lugar():
+                raise _sin_capacidad()
+            self._data[key] = {
+                'estado': EN_CURSO,
+                'fingerprint': fingerprint,
+                'status': None,
+                'body': None,
+                'expira': self._clock() + self.lease,
+            }
+            return True, None
+
+    def _hacer_lugar(self):
+        """Descarta registros hasta que entre uno nuevo; False si todos están en curso."""
+        if len(self._data) < self.max_entries:
+            return True
+        ahora = self._clock()
+        for key in list(self._data):
+            registro = self._data[key]
+            if registro['estado'] == COMPLETADO or registro['expira'] <= ahora:
+                del self._data[key]
+                if len(self._data) < self.max_entries:
+                    return True
+        return False
+
+    def get(self, key):
+        with self._cond:
+            registro = self._vigente(key)
+            return dict(registro) if registro is not None else None
+
+    def complete(self, key, status, body):
+        with self._cond:
+            registro = self._data.get(key)
+            if registro is not None:
+                registro.update(estado=COMPLETADO, status=status, body=body, expira=self._clock() + self.ttl)
+                self._data.move_to_end(key)
+            self._cond.notify_all()
+
+    def release(self, key):
+        with self._cond:
+            registro = self._data.get(key)
+            if registro is not None and registro['estado'] == EN_CURSO:
+                del self._data[key]
+            self._cond.notify_all()
+
+    def wait(self, key, timeout):
+        limite = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                registro = self._vigente(key)
+                restante = limite - time.monotonic()
+                if registro is None or registro['estado'] == COMPLETADO or restante <= 0:
+                    return dict(registro) if registro is not None else None
+                self._cond.wait(restante)
+
+
+class SQLiteIdempotencyStore(IdempotencyStore):
+    """
+    Registros en un archivo SQLite, compartido entre procesos del mismo host.
+
+    Cada hilo usa su propia conexión; la reserva se hace dentro de una
+    transacción ``IMMEDIATE`` para que dos workers no tomen la misma clave.
+    """
+
+    PURGE_EVERY = 500
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.path = str(config['SQLITE_PATH'])
+        self._local = threading.local()
+        self._operaciones = 0
+        with self._transaction() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS idempotencia ('
+                ' clave TEXT PRIMARY KEY,'
+                ' fingerprint TEXT NOT NULL,'
+                ' estado TEXT NOT NULL,'
+                ' status INTEGER,'
+                ' body TEXT,'
+                ' expira REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_idempotencia_expira ON idempotencia (expira)')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    @staticmethod
+    def _registro(fila):
+        if fila is None:
+            return None
+        fingerprint, estado, status, body = fila
+        return {
+            'estado': estado,
+            'fingerprint': fingerprint,
+            'status': status,
+            'body': json.loads(body) if body is not None else None,
+        }
+
+    def begin(self, key, fingerprint):
+        ahora = time.time()
+        with self._transaction() as conn:
+            self._operaciones += 1
+            if self._operaciones % self.PURGE_EVERY == 0:
+                conn.execute('DELETE FROM idempotencia WHERE expira <= ?', (ahora,))
+            fila = conn.execute(
+                'SELECT fingerprint, estado, status, body FROM idempotencia WHERE clave = ? AND expira > ?',
+                (key, ahora)
+            ).fetchone()
+            if fila is not None:
+                return False, self._registro(fila)
+            conn.execute(
+                'INSERT OR REPLACE INTO idempotencia (clave, fingerprint, estado, status, body, expira) '
+                'VALUES (?, ?, ?, NULL, NULL, ?)',
+                (key, fingerprint, EN_CURSO, ahora + self.lease)
+            )
+            return True, None
+
+    def get(self, key):
+        fila = self._connection().execute(
+            'SELECT fingerprint, estado, status, body FROM idempotencia WHERE clave = ? AND expira > ?',
+            (key, time.time())
+        ).fetchone()
+        return self._registro(fila)
+
+    def complete(self, key, status, body):
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE idempotencia SET estado = ?, status = ?, body = ?, expira = ? WHERE clave = ?',
+                (COMPLETADO, status, json.dumps(body), time.time() + self.ttl, key)
+            )
+
+    def release(self, key):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM idempotencia WHERE clave = ? AND estado = ?', (key, EN_CURSO))
+
+
+class _Transaction:
+    """``BEGIN IMMEDIATE`` ... ``COMMIT`` (o ``ROLLBACK`` si hubo error) sobre una conexión."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+
+BACKENDS = {
+    'memory': MemoryIdempotencyStore,
+    'sqlite': SQLiteIdempotencyStore,
+}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = get_idempotency_config()
+                backend = config['BACKEND']
+                store_class = BACKENDS.get(backend) or import_string(backend)
+                _store = store_class(config)
+    return _store
+
+
+def get_idempotency_key(request):
+    """
+    Clave de idempotencia de la petición, o None si no se envió.
+
+    Raises:
+        OrchestrationError: 400 si la clave es demasiado larga
+    """
+    clave = request.headers.get(IDEMPOTENCY_HEADER)
+    if not clave:
+        return None
+    if len(clave) > MAX_KEY_LENGTH:
+        raise OrchestrationError(
+            f"El header {IDEMPOTENCY_HEADER} no puede superar {MAX_KEY_LENGTH} caracteres",
+            status_code=400
+        )
+    return clave
+
+
+def _clave_completa(clave, auth_header, path):
+    # La clave se asocia al usuario: dos usuarios distintos pueden enviar la
+    # misma clave sin ver el resultado del otro
+    return f'{path}:{alcance_usuario(auth_header)}:{clave}'
+
+
+def _fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _clave_reutilizada():
+    return OrchestrationError(
+        f"El {IDEMPOTENCY_HEADER} ya se usó con un cuerpo distinto",
+        status_code=422
+    )
+
+
+def _sin_capacidad():
+    return OrchestrationError(
+        f"Hay demasiadas peticiones con {IDEMPOTENCY_HEADER} en curso; reintente en unos segundos",
+        status_code=503,
+        details={'retry_after': 1}
+    )
+
+
+def _en_curso():
+    return OrchestrationError(
+        f"Hay una petición con el mismo {IDEMPOTENCY_HEADER} en curso; reintente más tarde",
+        status_code=409
+    )
+
+
+def _requiere_revision(body):
+    details = body.get('details') if isinstance(body, dict) else None
+    return isinstance(details, dict) and bool(details.get('requiere_revision'))
+
+
+def _registrar_resultado(store, key, status, body):
+    # Los errores 5xx no se guardan: el cliente puede reintentar de verdad.
+    # Salvo los que dejaron stock descontado sin compra (``requiere_revision``):
+    # repetir la compra lo descontaría otra vez
+    if status < 500 or _requiere_revision(body):
+        store.complete(key, status, body)
+    else:
+        store.release(key)
+
+
+def ejecutar_idempotente(clave, auth_header, path, data, ejecutar):
+    """
+    Ejecuta ``ejecutar()`` una sola vez por clave de idempotencia.
+
+    Args:
+        clave: Valor del header ``Idempotency-Key``
+        auth_header: Header Authorization (define el alcance de la clave)
+        path: Ruta del endpoint
+        data: Cuerpo de la petición (reusar la clave con otro cuerpo es un error 422)
+        ejecutar: Callable que devuelve ``(status, body)``
+
+    Returns:
+        tuple: ``(status, body, replayed)``
+
+    Raises:
+        OrchestrationError: 422 si la clave se reusó con otro cuerpo; 409 si
+            la ejecución original sigue en curso después de ``WAIT_TIMEOUT``
+    """
+    store = get_store()
+    config = get_idempotency_config()
+    key = _clave_completa(clave, auth_header, path)
+    fingerprint = _fingerprint(data)
+    limite = time.monotonic() + config['WAIT_TIMEOUT']
+
+    while True:
+        reservada, registro = store.begin(key, fingerprint)
+        if reservada:
+            break
+        if registro['fingerprint'] != fingerprint:
+            raise _clave_reutilizada()
+        if registro['estado'] == EN_CURSO:
+            registro = store.wait(key, max(0.0, limite - time.monotonic()))
+        if registro is not None and registro['estado'] == COMPLETADO:
+            return registro['status'], registro['body'], True
+        if registro is not None:
+            raise _en_curso()
+        # La ejecución original se liberó sin resultado: se toma la clave
+
+    try:
+        status, body = ejecutar()
+    except BaseException:
+        store.release(key)
+        raise
+    _registrar_resultado(store, key, status, body)
+    return status, body, False
+
+
+async def ejecutar_idempotente_async(clave, auth_header, path, data, ejecutar):
+    """
+    Versión para los views ASGI: ``ejecutar()`` es una corrutina y la espera no
+    bloquea el loop. Las operaciones del store (SQLite con ``BEGIN IMMEDIATE``
+    puede esperar el lock de la base) corren en el pool de hilos.
+    """
+    store = get_store()
+    begin = sync_to_async(store.begin, thread_sensitive=False)
+    get = sync_to_async(store.get, thread_sensitive=False)
+    release = sync_to_async(store.release, thread_sensitive=False)
+    config = get_idempotency_config()
+    key = _clave_completa(clave, auth_header, path)
+    fingerprint = _fingerprint(data)
+    limite = time.monotonic() + config['WAIT_TIMEOUT']
+
+    while True:
+        reservada, registro = await begin(key, fingerprint)
+        if reservada:
+            break
+        if registro['fingerprint'] != fingerprint:
+            raise _clave_reutilizada()
+        while registro is not None and registro['estado'] == EN_CURSO and time.monotonic() < limite:
+            await asyncio.sleep(config['POLL_INTERVAL'])
+            registro = await get(key)
+        if registro is not None and registro['estado'] == COMPLETADO:
+            return registro['status'], registro['body'], True
+        if registro is not None:
+            raise _en_curso()
+
+    try:
+        status, body = await ejecutar()
+    except BaseException:
+        await release(key)
+        raise
+    await sync_to_async(_registrar_resultado, thread_sensitive=False)(store, key, status, body)
+    return status, body, False
@@ -0,0 +1,115 @@
+"""
+Codificación y decodificación JSON del orquestador.
+
+Usa ``orjson`` si está instalado (serializa directo a bytes, varias veces
+más rápido que el módulo estándar con las respuestas de compras/me y los
+listados de productos) y, si no, ``json`` de la biblioteca estándar con
+salida compacta. ``settings.ORCHESTRATOR_JSON_CODEC`` fuerza uno u otro
+(``auto``, ``orjson`` o ``json``).
+
+Todo el orquestador pasa por aquí: respuestas de los microservicios, cuerpos
+enviados a ellos, renderer y parser de DRF, views asíncronos y NDJSON.
+"""
+
+import datetime
+import decimal
+import json
+import uuid
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser as DRFJSONParser
+from rest_framework.renderers import JSONRenderer as DRFJSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+CODEC_AUTO = 'auto'
+CODEC_ORJSON = 'orjson'
+CODEC_JSON = 'json'
+
+
+def _default(obj):
+    """Tipos que ninguno de los dos codecs serializa por sí mismo."""
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError(f"Tipo no serializable a JSON: {type(obj).__name__}")
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+def _json_loads(data):
+    return json.loads(data)
+
+
+def _orjson_dumps(obj):
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _resolver_codec():
+    pedido = getattr(settings, 'ORCHESTRATOR_JSON_CODEC', CODEC_AUTO)
+    if pedido == CODEC_ORJSON and orjson is None:
+        raise ImportError("ORCHESTRATOR_JSON_CODEC='orjson' requiere el paquete orjson")
+    if pedido in (CODEC_AUTO, CODEC_ORJSON) and orjson is not None:
+        return CODEC_ORJSON, _orjson_dumps, orjson.loads
+    return CODEC_JSON, _json_dumps, _json_loads
+
+
+_codec = None
+
+
+def _get_codec():
+    global _codec
+    if _codec is None:
+        _codec = _resolver_codec()
+    return _codec
+
+
+def codec_name():
+    """Codec en uso: ``orjson`` o ``json``."""
+    return _get_codec()[0]
+
+
+def dumps(obj):
+    """Serializa ``obj`` a JSON compacto en UTF-8 (bytes)."""
+    return _get_codec()[1](obj)
+
+
+def loads(data):
+    """Decodifica JSON desde ``bytes`` o ``str``."""
+    return _get_codec()[2](data)
+
+
+def json_response(data, status=200, **kwargs):
+    """Equivalente a ``JsonResponse`` serializando con el codec rápido."""
+    return HttpResponse(dumps(data), status=status, content_type='application/json', **kwargs)
+
+
+class JSONRenderer(DRFJSONRenderer):
+    """Renderer de DRF que serializa con el codec rápido (ignora ``indent``)."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data)
+
+
+class JSONParser(DRFJSONParser):
+    """Parser de DRF que decodifica con el codec rápido."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return loads(stream.read())
+        except ValueError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
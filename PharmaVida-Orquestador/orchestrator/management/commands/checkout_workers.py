@@ -0,0 +1,32 @@
+"""
+Workers de checkout asíncrono como proceso dedicado.
+
+Útil con ``CHECKOUT_WORKERS=0`` en los procesos web: las peticiones solo
+encolan y este comando ejecuta las compras.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from orchestrator.checkout_queue import CheckoutWorkerPool, get_checkout_config, get_queue
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de compras del checkout asíncrono'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Hilos de trabajo (por defecto CHECKOUT_WORKERS)')
+
+    def handle(self, *args, **options):
+        config = get_checkout_config()
+        workers = options['workers'] or config['WORKERS'] or 1
+        pool = CheckoutWorkerPool(get_queue(), workers, config).start()
+        self.stdout.write(f'Procesando la cola de checkout con {workers} workers (Ctrl+C para salir)')
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stdout.write('Deteniendo workers...')
+            pool.stop(timeout=30)
@@ -0,0 +1,231 @@
+"""
+Métricas del orquestador en formato de exposición de Prometheus.
+
+Implementación mínima en memoria (por proceso) de contadores, gauges e
+histogramas con etiquetas. Registrar una observación solo toma un lock y
+actualiza unos pocos enteros, así que puede usarse en el camino crítico.
+"""
+
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pares = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f'{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}' for k, v in items
+        ]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def collect(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f'{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}' for k, v in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            serie = self._values.get(key)
+            if serie is None:
+                serie = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][index] += 1
+            serie[1] += value
+            serie[2] += 1
+
+    def collect(self):
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            acumulado = 0
+            for limite, n in zip(self.buckets + (float('inf'),), counts):
+                acumulado += n
+                le = f'le="{_format_value(float(limite))}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {acumulado}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+class Registry:
+    """Conjunto de métricas y colectores que se exponen en ``/metrics``."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """Registra una función que devuelve métricas calculadas al momento del scrape."""
+        self._collectors.append(collector)
+
+    def expose(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        for collector in self._collectors:
+            for metric in collector():
+                lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+view_latency = registry.register(Histogram(
+    'orquestador_view_request_duration_seconds',
+    'Latencia de las peticiones atendidas por cada view del orquestador.',
+    ('view', 'method', 'status'),
+))
+view_in_flight = registry.register(Gauge(
+    'orquestador_view_requests_in_flight',
+    'Peticiones en curso por view.',
+    ('view',),
+))
+downstream_latency = registry.register(Histogram(
+    'orquestador_downstream_request_duration_seconds',
+    'Latencia de cada llamada a un microservicio.',
+    ('servicio', 'method', 'status'),
+))
+downstream_in_flight = registry.register(Gauge(
+    'orquestador_downstream_requests_in_flight',
+    'Llamadas en curso por microservicio.',
+    ('servicio',),
+))
+orchestration_errors = registry.register(Counter(
+    'orquestador_orchestration_errors_total',
+    'Errores de orquestación devueltos al cliente, por código de estado.',
+    ('status_code',),
+))
+
+
+def record_orchestration_error(error):
+    orchestration_errors.inc(status_code=getattr(error, 'status_code', 500))
+
+
+def _collect_runtime():
+    # Importaciones diferidas: estos módulos dependen de settings
+    from .admission import admission_stats
+    from .cache import product_cache
+    from .checkout_queue import queue_stats
+    from .http_client import pool_stats
+    from .resilience import resilience_stats, CLOSED, HALF_OPEN, OPEN
+
+    pool_requests = Counter('orquestador_http_pool_requests_total', 'Conexiones pedidas al pool.', ('servicio', 'resultado'))
+    pool_wait = Counter('orquestador_http_pool_wait_seconds_total', 'Tiempo total esperando una conexión del pool.', ('servicio',))
+    for servicio, stats in pool_stats().items():
+        pool_requests.inc(stats['hits'], servicio=servicio, resultado='hit')
+        pool_requests.inc(stats['misses'], servicio=servicio, resultado='miss')
+        pool_wait.inc(stats['wait_time_total_ms'] / 1000, servicio=servicio)
+
+    cache_ops = Counter('orquestador_product_cache_requests_total', 'Consultas a la caché de productos.', ('resultado',))
+    cache_entries = Gauge('orquestador_product_cache_entries', 'Productos en caché.')
+    cache_stats = product_cache.stats()
+    cache_ops.inc(cache_stats['hits'], resultado='hit')
+    cache_ops.inc(cache_stats['misses'], resultado='miss')
+    cache_entries.set(cache_stats['entries'])
+
+    estados = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+    breaker = Gauge('orquestador_circuit_breaker_state', 'Estado del circuit breaker (0=closed, 1=half_open, 2=open).', ('servicio',))
+    retries = Counter('orquestador_downstream_retries_total', 'Reintentos por microservicio.', ('servicio',))
+    rejected = Counter('orquestador_downstream_rejected_total', 'Llamadas rechazadas por breaker o bulkhead.', ('servicio', 'motivo'))
+    for servicio, stats in resilience_stats().items():
+        breaker.set(estados[stats['circuit_breaker']['state']], servicio=servicio)
+        retries.inc(stats['retries'], servicio=servicio)
+        rejected.inc(stats['circuit_breaker']['rejected'], servicio=servicio, motivo='circuit_breaker')
+        rejected.inc(stats['bulkhead']['rejected'], servicio=servicio, motivo='bulkhead')
+
+    pedidos = Gauge('orquestador_checkout_pedidos', 'Pedidos en la cola de checkout asíncrono.', ('estado',))
+    for estado, cantidad in queue_stats().items():
+        pedidos.set(cantidad, estado=estado)
+
+    admision_en_curso = Gauge('orquestador_admission_in_flight', 'Peticiones admitidas en curso por endpoint.', ('endpoint',))
+    admision_en_cola = Gauge('orquestador_admission_queued', 'Peticiones esperando un lugar por endpoint.', ('endpoint',))
+    admision_rechazos = Counter('orquestador_admission_rejected_total', 'Peticiones descartadas por el control de admisión.', ('endpoint', 'motivo'))
+    for endpoint, stats in admission_stats().items():
+        admision_en_curso.set(stats['in_flight'], endpoint=endpoint)
+        admision_en_cola.set(stats['waiting'], endpoint=endpoint)
+        for motivo, cantidad in stats['rejected'].items():
+            admision_rechazos.inc(cantidad, endpoint=endpoint, motivo=motivo)
+        admision_rechazos.inc(stats['rate_limited'], endpoint=endpoint, motivo='rate_limit')
+    return [pool_requests, pool_wait, cache_ops, cache_entries, breaker, retries, rejected, pedidos,
+            admision_en_curso, admision_en_cola, admision_rechazos]
+
+
+registry.register_collector(_collect_runtime)
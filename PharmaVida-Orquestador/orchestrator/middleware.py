@@ -0,0 +1,71 @@
+"""
+Middlewares del orquestador.
+"""
+
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+
+class MetricsMiddleware:
+    """
+    Registra latencia y peticiones en curso por view.
+
+    La etiqueta ``view`` es el nombre de la clase del view resuelto por el
+    URLconf (por ejemplo ``RegistrarCompraOrquestadaView``) o su atributo
+    ``metrics_name``: los views asíncronos usan el nombre del view síncrono
+    para que las series no dependan del modo en que se sirve. Las peticiones
+    que no llegan a un view no se registran.
+
+    Funciona tanto en WSGI como en ASGI: en modo asíncrono Django no tiene
+    que pasar la petición por un hilo para atravesar este middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            self.process_view = self._process_view_async
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, response, started)
+        return response
+
+    def _observe(self, request, response, started):
+        view = getattr(request, '_metrics_view', None)
+        if view is not None:
+            metrics.view_in_flight.dec(view=view)
+            metrics.view_latency.observe(
+                time.perf_counter() - started,
+                view=view,
+                method=request.method,
+                status=response.status_code,
+            )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        if view_class is not None:
+            request._metrics_view = getattr(view_class, 'metrics_name', view_class.__name__)
+        else:
+            request._metrics_view = view_func.__name__
+        metrics.view_in_flight.inc(view=request._metrics_view)
+        return None
+
+    async def _process_view_async(self, request, view_func, view_args, view_kwargs):
+        # Versión corrutina para que Django no la envuelva en sync_to_async
+        return MetricsMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
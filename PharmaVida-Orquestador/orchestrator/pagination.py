@@ -0,0 +1,76 @@
+"""
+Paginación y nivel de detalle del historial de compras.
+"""
+
+from django.conf import settings
+
+from .utils import OrchestrationError
+
+DEFAULT_MAX_PAGESIZE = 100
+DEFAULT_PAGESIZE = 20
+
+DETALLE_NONE = 'none'
+DETALLE_BASIC = 'basic'
+DETALLE_FULL = 'full'
+NIVELES_DETALLE = (DETALLE_NONE, DETALLE_BASIC, DETALLE_FULL)
+
+
+def _entero_positivo(valor, nombre):
+    try:
+        numero = int(valor)
+    except (TypeError, ValueError):
+        numero = 0
+    if numero < 1:
+        raise OrchestrationError(f"El parámetro '{nombre}' debe ser un entero mayor a 0", status_code=400)
+    return numero
+
+
+def get_paginacion(request):
+    """
+    Lee ``page`` y ``pagesize`` de la query string.
+
+    Returns:
+        tuple: ``(page, pagesize)``, o ``(None, None)`` si no se pidió paginar
+
+    Raises:
+        OrchestrationError: 400 si algún valor no es un entero positivo
+    """
+    page = request.GET.get('page')
+    pagesize = request.GET.get('pagesize')
+    if page is None and pagesize is None:
+        return None, None
+    maximo = getattr(settings, 'ORCHESTRATOR_COMPRAS_MAX_PAGESIZE', DEFAULT_MAX_PAGESIZE)
+    page = _entero_positivo(page, 'page') if page is not None else 1
+    pagesize = _entero_positivo(pagesize, 'pagesize') if pagesize is not None else min(DEFAULT_PAGESIZE, maximo)
+    return page, min(pagesize, maximo)
+
+
+def get_detalle(request):
+    """Nivel de enriquecimiento pedido con ``?detalle=none|basic|full`` (por defecto ``full``)."""
+    detalle = request.GET.get('detalle', DETALLE_FULL).lower()
+    if detalle not in NIVELES_DETALLE:
+        raise OrchestrationError(
+            f"El parámetro 'detalle' debe ser uno de: {', '.join(NIVELES_DETALLE)}",
+            status_code=400
+        )
+    return detalle
+
+
+def paginar(items, page, pagesize):
+    """
+    Recorta la página pedida de una lista.
+
+    Returns:
+        tuple: ``(pagina, metadatos)``; sin ``page`` se devuelve la lista completa
+        y metadatos vacíos
+    """
+    if page is None:
+        return items, {}
+    inicio = (page - 1) * pagesize
+    total = len(items)
+    return items[inicio:inicio + pagesize], {
+        'page': page,
+        'pagesize': pagesize,
+        'total': total,
+        'total_pages': (total + pagesize - 1) // pagesize,
+    }
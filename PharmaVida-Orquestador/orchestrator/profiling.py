@@ -0,0 +1,279 @@
+"""
+Profiler por muestreo de peticiones individuales.
+
+Con ``ORCHESTRATOR_PROFILING['ENABLED']`` activo, una fracción de las
+peticiones (``SAMPLE_RATE``) o las que lo pidan con ``X-Profile: 1`` desde un
+token de administrador (o con ``X-Profile: <PROFILE_TOKEN>``) se perfilan:
+un hilo toma la pila del hilo que atiende la petición (y de los hilos de
+``run_concurrently`` que trabajan para ella) cada ``INTERVAL`` segundos y, al terminar, se guarda un archivo ``<request_id>.folded`` con
+las pilas colapsadas (``frame;frame;frame cantidad``), el formato que leen
+``flamegraph.pl``, speedscope o inferno.
+
+El directorio se acota por cantidad de archivos y bytes, borrando los más
+viejos. Desactivado, el middleware se quita de la cadena al arrancar y no
+cuesta nada.
+"""
+
+import contextvars
+import hmac
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .admission import DEFAULT_EXEMPT
+from .auth import verificar_token
+from .tracing import REQUEST_ID_HEADER, current_request_id
+from .utils import OrchestrationError
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ID_HEADER = 'X-Profile-ID'
+EXTENSION = '.folded'
+
+DEFAULT_PROFILING = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.0,
+    'INTERVAL': 0.005,
+    'TOKEN': '',
+    'DIR': 'profiles',
+    'MAX_FILES': 200,
+    'MAX_BYTES': 50 * 1024 * 1024,
+    'MAX_DEPTH': 128,
+    'EXEMPT': DEFAULT_EXEMPT,
+}
+
+
+# (sampler, perfil) de la petición en curso; los hilos de run_concurrently lo
+# reciben con la copia del contexto
+_perfil_activo = contextvars.ContextVar('perfil_activo', default=None)
+
+
+def get_profiling_config():
+    """Combina la configuración por defecto con ``settings.ORCHESTRATOR_PROFILING``."""
+    config = dict(DEFAULT_PROFILING)
+    config.update(getattr(settings, 'ORCHESTRATOR_PROFILING', {}) or {})
+    return config
+
+
+def _etiqueta(frame):
+    # modulo:funcion, sin ';' (separador de frames del formato colapsado)
+    code = frame.f_code
+    modulo = frame.f_globals.get('__name__') or os.path.basename(code.co_filename)
+    return f"{modulo}:{getattr(code, 'co_qualname', code.co_name)}".replace(';', ':').replace(' ', '_')
+
+
+class Profile:
+    """Muestras de pila acumuladas de los hilos de una petición."""
+
+    def __init__(self, request_id, thread_id):
+        self.request_id = request_id
+        self.thread_id = thread_id
+        self.samples = Counter()
+        self.start = time.perf_counter()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+
+class Sampler:
+    """
+    Hilo único que muestrea los hilos con un perfil activo.
+
+    Solo corre mientras hay al menos una petición perfilándose.
+    """
+
+    def __init__(self, interval, max_depth):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._activos = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, profile):
+        with self._lock:
+            self._activos[profile.thread_id] = profile
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+                self._thread.start()
+
+    def stop(self, profile):
+        with self._lock:
+            self._activos = {
+                thread_id: activo for thread_id, activo in self._activos.items() if activo is not profile
+            }
+
+    def agregar_hilo(self, profile, thread_id):
+        """Muestrea también ``thread_id`` para ``profile`` mientras el perfil siga activo."""
+        with self._lock:
+            if self._activos.get(profile.thread_id) is profile:
+                self._activos[thread_id] = profile
+
+    def quitar_hilo(self, profile, thread_id):
+        with self._lock:
+            if self._activos.get(thread_id) is profile:
+                del self._activos[thread_id]
+
+    def _run(self):
+        propio = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._activos:
+                    self._thread = None
+                    return
+                activos = dict(self._activos)
+            frames = sys._current_frames()
+            for thread_id, profile in activos.items():
+                frame = frames.get(thread_id)
+                if frame is None or thread_id == propio:
+                    continue
+                pila = []
+                while frame is not None and len(pila) < self.max_depth:
+                    pila.append(_etiqueta(frame))
+                    frame = frame.f_back
+                profile.samples[';'.join(reversed(pila))] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+def ejecutar_perfilado(task):
+    """
+    Ejecuta ``task`` en el hilo actual, muestreándolo para el perfil de la
+    petición en curso si hay uno (``run_concurrently`` lo usa con cada tarea).
+    """
+    activo = _perfil_activo.get()
+    if activo is None:
+        return task()
+    sampler, profile = activo
+    thread_id = threading.get_ident()
+    sampler.agregar_hilo(profile, thread_id)
+    try:
+        return task()
+    finally:
+        sampler.quitar_hilo(profile, thread_id)
+
+
+class ProfileStore:
+    """Directorio de perfiles acotado por cantidad de archivos y bytes."""
+
+    def __init__(self, directory, max_files, max_bytes):
+        self.directory = str(directory)
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def save(self, profile):
+        os.makedirs(self.directory, exist_ok=True)
+        nombre = ''.join(c for c in profile.request_id if c.isalnum() or c in '-_.')[:128] or 'perfil'
+        path = os.path.join(self.directory, nombre + EXTENSION)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(profile.collapsed())
+        self.rotate()
+        return path
+
+    def rotate(self):
+        with self._lock:
+            archivos = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(EXTENSION):
+                    stat = entry.stat()
+                    archivos.append((stat.st_mtime, stat.st_size, entry.path))
+            archivos.sort(reverse=True)
+            total = 0
+            for n, (_, size, path) in enumerate(archivos):
+                total += size
+                if n >= self.max_files or total > self.max_bytes:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+
+def _es_admin(auth_header):
+    try:
+        claims = verificar_token(auth_header)
+    except OrchestrationError:
+        return False
+    rol = str((claims or {}).get('role') or '').upper()
+    return rol in ('ADMIN', 'ROLE_ADMIN')
+
+
+class ProfilingMiddleware:
+    """
+    Perfila peticiones a los views del orquestador.
+
+    Debe ir después de ``TracingMiddleware`` (el archivo se nombra con el
+    request id). El perfil cubre desde la resolución del view hasta que
+    devuelve la respuesta; la respuesta lleva ``X-Profile-ID``. Bajo ASGI el
+    hilo del event loop atiende varias peticiones a la vez, así que las
+    muestras pueden incluir trabajo de otras peticiones concurrentes.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = get_profiling_config()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.config = config
+        self.sampler = Sampler(config['INTERVAL'], config['MAX_DEPTH'])
+        self.store = ProfileStore(config['DIR'], config['MAX_FILES'], config['MAX_BYTES'])
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            self.process_view = self._process_view_async
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        return self._finish(request, response)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self._finish(request, response)
+
+    def _pedido(self, request):
+        valor = request.headers.get(PROFILE_HEADER)
+        if not valor:
+            return False
+        if self.config['TOKEN'] and hmac.compare_digest(valor, self.config['TOKEN']):
+            return True
+        return valor in ('1', 'true') and _es_admin(request.headers.get('Authorization'))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if match is None or match.url_name in self.config['EXEMPT']:
+            return None
+        if not self._pedido(request) and random.random() >= self.config['SAMPLE_RATE']:
+            return None
+        request_id = current_request_id() or request.headers.get(REQUEST_ID_HEADER) or f'{time.time():.6f}'
+        request._profile = Profile(request_id, threading.get_ident())
+        self.sampler.start(request._profile)
+        _perfil_activo.set((self.sampler, request._profile))
+        return None
+
+    async def _process_view_async(self, request, view_func, view_args, view_kwargs):
+        return ProfilingMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+    def _finish(self, request, response):
+        profile = getattr(request, '_profile', None)
+        if profile is None:
+            return response
+        self.sampler.stop(profile)
+        _perfil_activo.set(None)
+        try:
+            self.store.save(profile)
+            response[PROFILE_ID_HEADER] = profile.request_id
+        except OSError:
+            logger.exception("No se pudo guardar el perfil de la petición %s", profile.request_id)
+        return response
@@ -0,0 +1,398 @@
+"""
+Timeouts, reintentos, circuit breaker y bulkhead por microservicio.
+
+Cada microservicio tiene un ``Downstream`` que envuelve sus llamadas:
+
+- **Bulkhead**: limita las llamadas simultáneas hacia el servicio para que un
+  servicio lento no acapare todos los hilos del worker.
+- **Circuit breaker**: tras varios fallos seguidos deja de llamar al servicio
+  (503 inmediato) y, pasado un tiempo, deja pasar llamadas de prueba.
+- **Reintentos**: solo para GET (idempotentes), con backoff exponencial con
+  jitter y acotados por un presupuesto proporcional al tráfico.
+
+Las llamadas asíncronas (``call_async``, usadas en modo ASGI) comparten el
+mismo breaker, bulkhead y presupuesto que las síncronas.
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+
+from .http_client import get_http_client_config
+from .utils import OrchestrationError
+
+DEFAULT_RESILIENCE = {
+    'CONNECT_TIMEOUT': None,  # None: se usa el del cliente HTTP
+    'READ_TIMEOUT': None,
+    'RETRIES': 2,
+    'BACKOFF_BASE': 0.05,
+    'BACKOFF_MAX': 1.0,
+    'RETRY_BUDGET_RATIO': 0.2,
+    'RETRY_BUDGET_MIN': 10,
+    'BREAKER_FAILURE_THRESHOLD': 5,
+    'BREAKER_RESET_TIMEOUT': 30.0,
+    'BREAKER_HALF_OPEN_MAX_CALLS': 1,
+    'BULKHEAD_MAX_CONCURRENT': 50,
+    'BULKHEAD_TIMEOUT': 0.5,
+}
+
+RETRYABLE_METHODS = {'GET'}
+RETRYABLE_STATUS = {502, 503, 504}
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def get_resilience_config(service_name):
+    """
+    Perfil de resiliencia de un microservicio.
+
+    Se combinan, en orden, los valores por defecto, ``DEFAULT`` y la entrada
+    del servicio en ``settings.ORCHESTRATOR_RESILIENCE['SERVICIOS']``.
+    """
+    user_config = getattr(settings, 'ORCHESTRATOR_RESILIENCE', {}) or {}
+    config = dict(DEFAULT_RESILIENCE)
+    config.update(user_config.get('DEFAULT', {}))
+    config.update(user_config.get('SERVICIOS', {}).get(service_name, {}))
+    http_config = get_http_client_config()
+    if config['CONNECT_TIMEOUT'] is None:
+        config['CONNECT_TIMEOUT'] = http_config['CONNECT_TIMEOUT']
+    if config['READ_TIMEOUT'] is None:
+        config['READ_TIMEOUT'] = http_config['READ_TIMEOUT']
+    return config
+
+
+class CircuitBreaker:
+    """Circuit breaker clásico de tres estados (closed, open, half_open)."""
+
+    def __init__(self, failure_threshold, reset_timeout, half_open_max_calls, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def allow_request(self):
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def release_probe(self):
+        """
+        Devuelve el cupo de una llamada de prueba (half_open) que terminó sin
+        resultado: cancelada, rechazada por el bulkhead o con un error que no
+        dice nada de la salud del servicio.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive_failures = 0
+            self._state = CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if state != OPEN:
+                    self.times_opened += 1
+                self._state = OPEN
+                self._opened_at = self._clock()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'consecutive_failures': self._consecutive_failures,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+            }
+
+
+class RetryBudget:
+    """
+    Presupuesto de reintentos: cada petición deposita ``ratio`` fichas y cada
+    reintento gasta una. Evita que los reintentos multipliquen la carga sobre
+    un servicio que ya está degradado.
+    """
+
+    def __init__(self, ratio, minimum):
+        self.ratio = ratio
+        self.maximum = max(minimum, 1)
+        self._tokens = float(minimum)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.maximum, self._tokens + self.ratio)
+
+    def try_withdraw(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    @property
+    def tokens(self):
+        with self._lock:
+            return round(self._tokens, 2)
+
+
+class Bulkhead:
+    """Límite de llamadas simultáneas hacia un microservicio."""
+
+    def __init__(self, max_concurrent, timeout):
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def acquire(self):
+        if not self._semaphore.acquire(timeout=self.timeout):
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.in_flight += 1
+        return True
+
+    async def acquire_async(self, poll_interval=0.005):
+        """Como ``acquire`` pero sin bloquear el event loop mientras espera un lugar."""
+        limite = time.monotonic() + self.timeout
+        while not self._semaphore.acquire(blocking=False):
+            if time.monotonic() >= limite:
+                with self._lock:
+                    self.rejected += 1
+                return False
+            await asyncio.sleep(poll_interval)
+        with self._lock:
+            self.in_flight += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+
+class Downstream:
+    """Políticas de resiliencia aplicadas a las llamadas de un microservicio."""
+
+    def __init__(self, service_name, config):
+        self.service_name = service_name
+        self.config = config
+        self.timeout = (config['CONNECT_TIMEOUT'], config['READ_TIMEOUT'])
+        self.breaker = CircuitBreaker(
+            config['BREAKER_FAILURE_THRESHOLD'],
+            config['BREAKER_RESET_TIMEOUT'],
+            config['BREAKER_HALF_OPEN_MAX_CALLS'],
+        )
+        self.bulkhead = Bulkhead(config['BULKHEAD_MAX_CONCURRENT'], config['BULKHEAD_TIMEOUT'])
+        self.retry_budget = RetryBudget(config['RETRY_BUDGET_RATIO'], config['RETRY_BUDGET_MIN'])
+        self._lock = threading.Lock()
+        self.counters = {'calls': 0, 'failures': 0, 'retries': 0, 'timeouts': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _backoff(self, attempt):
+        techo = min(self.config['BACKOFF_MAX'], self.config['BACKOFF_BASE'] * (2 ** attempt))
+        return random.uniform(0, techo)
+
+    def call(self, method, send):
+        """
+        Ejecuta ``send(timeout)`` aplicando bulkhead, circuit breaker y reintentos.
+
+        Args:
+            method: Método HTTP (solo GET se reintenta)
+            send: Callable que recibe el timeout y devuelve un ``requests.Response``
+
+        Returns:
+            requests.Response: La última respuesta obtenida
+
+        Raises:
+            OrchestrationError: 503 si el breaker está abierto o el bulkhead lleno
+            requests.RequestException: Si el último intento falla por red o timeout
+        """
+        self.retry_budget.deposit()
+        max_attempts = 1 + (self.config['RETRIES'] if method.upper() in RETRYABLE_METHODS else 0)
+        attempt = 0
+        while True:
+            response, error = self._attempt(send)
+            failed = error is not None or response.status_code in RETRYABLE_STATUS
+            attempt += 1
+            if not failed or attempt >= max_attempts or not self.retry_budget.try_withdraw():
+                if error is not None:
+                    raise error
+                return response
+            self._count('retries')
+            time.sleep(self._backoff(attempt))
+
+    async def call_async(self, method, send):
+        """
+        Versión asíncrona de ``call``: ``send(timeout)`` devuelve una corrutina
+        que resuelve a un ``httpx.Response``.
+
+        Raises:
+            OrchestrationError: 503 si el breaker está abierto o el bulkhead lleno
+            httpx.TransportError: Si el último intento falla por red o timeout
+        """
+        self.retry_budget.deposit()
+        max_attempts = 1 + (self.config['RETRIES'] if method.upper() in RETRYABLE_METHODS else 0)
+        attempt = 0
+        while True:
+            response, error = await self._attempt_async(send)
+            failed = error is not None or response.status_code in RETRYABLE_STATUS
+            attempt += 1
+            if not failed or attempt >= max_attempts or not self.retry_budget.try_withdraw():
+                if error is not None:
+                    raise error
+                return response
+            self._count('retries')
+            await asyncio.sleep(self._backoff(attempt))
+
+    def _check_breaker(self):
+        if not self.breaker.allow_request():
+            raise OrchestrationError(
+                f"Servicio {self.service_name} no disponible temporalmente (circuit breaker abierto)",
+                status_code=503,
+                details={'servicio': self.service_name, 'circuit_breaker': OPEN}
+            )
+
+    def _bulkhead_lleno(self):
+        return OrchestrationError(
+            f"Servicio {self.service_name} saturado: demasiadas llamadas en curso",
+            status_code=503,
+            details={'servicio': self.service_name, 'bulkhead': self.bulkhead.max_concurrent}
+        )
+
+    def _record_transport_error(self, is_timeout):
+        self._count('failures')
+        if is_timeout:
+            self._count('timeouts')
+        self.breaker.record_failure()
+
+    def _record_response(self, response):
+        if response.status_code >= 500:
+            self._count('failures')
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response, None
+
+    def _attempt(self, send):
+        self._check_breaker()
+        resultado = None
+        try:
+            if not self.bulkhead.acquire():
+                raise self._bulkhead_lleno()
+            self._count('calls')
+            try:
+                response = send(self.timeout)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                self._record_transport_error(isinstance(e, requests.Timeout))
+                resultado = None, e
+            else:
+                resultado = self._record_response(response)
+            finally:
+                self.bulkhead.release()
+        finally:
+            if resultado is None:
+                # Sin resultado que registrar: si era una prueba, libera su cupo
+                self.breaker.release_probe()
+        return resultado
+
+    async def _attempt_async(self, send):
+        import httpx
+
+        self._check_breaker()
+        resultado = None
+        try:
+            if not await self.bulkhead.acquire_async():
+                raise self._bulkhead_lleno()
+            self._count('calls')
+            try:
+                response = await send(self.timeout)
+            except httpx.TransportError as e:
+                self._record_transport_error(isinstance(e, httpx.TimeoutException))
+                resultado = None, e
+            else:
+                resultado = self._record_response(response)
+            finally:
+                self.bulkhead.release()
+        finally:
+            # También con CancelledError (run_concurrently_async cancela las
+            # tareas hermanas cuando una falla)
+            if resultado is None:
+                self.breaker.release_probe()
+        return resultado
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            'circuit_breaker': self.breaker.snapshot(),
+            'bulkhead': {
+                'max_concurrent': self.bulkhead.max_concurrent,
+                'in_flight': self.bulkhead.in_flight,
+                'rejected': self.bulkhead.rejected,
+            },
+            'retry_budget_tokens': self.retry_budget.tokens,
+            'timeout': {'connect': self.timeout[0], 'read': self.timeout[1]},
+            **counters,
+        }
+
+
+_downstreams = {}
+_downstreams_lock = threading.Lock()
+
+
+def get_downstream(service_name):
+    downstream = _downstreams.get(service_name)
+    if downstream is None:
+        with _downstreams_lock:
+            downstream = _downstreams.get(service_name)
+            if downstream is None:
+                downstream = Downstream(service_name, get_resilience_config(service_name))
+                _downstreams[service_name] = downstream
+    return downstream
+
+
+def resilience_stats():
+    """Estado del circuit breaker, bulkhead y contadores por microservicio."""
+    return {name: downstream.snapshot() for name, downstream in list(_downstreams.items())}
@@ -1,11 +1,24 @@
 """
 Servicios de orquestación que coordinan llamadas entre microservicios.
+
+Las validaciones y el armado de respuestas están en funciones puras
+(``_validar_stock``, ``_enriquecer_compra``, ...) que comparten estos
+flujos síncronos y los asíncronos de ``async_services``.
 """
 
+from collections import deque
+
 import requests
 from django.conf import settings
+from .auth import identidad_desde_claims, user_me_cache, verificar_token
+from .cache import product_cache
+from .concurrency import run_concurrently
+from .http_client import registry, resolve_service_name
+from .jsoncodec import dumps, loads
+from .pagination import DETALLE_FULL, DETALLE_NONE, paginar
+from .resilience import get_downstream
+from .tracing import current_trace, propagation_headers, span, use_trace
 from .utils import OrchestrationError
-import requests
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,99 +29,201 @@ def _get_microservice_url(service_name):
     return settings.MICROSERVICES.get(service_name)
 
 
-def _make_request(method, url, headers=None, json=None, params=None):
-    """Realiza una petición HTTP a un microservicio con manejo de errores y logging de debug."""
-    try:
-        logger.info(f"[ORQUESTADOR][REQUEST] {method} {url} headers={headers} params={params} json={json}")
-        response = requests.request(
-            method=method,
-            url=url,
-            headers=headers,
-            json=json,
-            params=params
-        )
-        logger.debug(f"[ORQUESTADOR][RESPONSE] status={response.status_code} body={response.text}")
-
-        if response.status_code >= 400:
-            # Log response error details
-            logger.error(f"[ORQUESTADOR][ERROR RESPONSE] status={response.status_code} body={response.text}")
-            try:
-                error_data = response.json() if response.content else {}
-            except Exception as json_err:
-                logger.error(f"[ORQUESTADOR][ERROR RESPONSE][JSON ERROR] {json_err}")
-                error_data = {"error": response.text}
-            raise OrchestrationError(
-                f"Error en microservicio: {error_data.get('error', response.text)}",
-                status_code=response.status_code,
-                details=error_data
-            )
+def _procesar_respuesta(method, url, response):
+    """Convierte la respuesta de un microservicio en datos o en una OrchestrationError."""
+    logger.debug("[ORQUESTADOR][RESPONSE] %s %s status=%s", method, url, response.status_code)
 
-        # Intentar parsear JSON de la respuesta
+    if response.status_code >= 400:
+        # Log response error details
+        logger.error("[ORQUESTADOR][ERROR RESPONSE] %s %s status=%s body=%s", method, url, response.status_code, response.text)
         try:
-            return response.json() if response.content else {}
+            error_data = loads(response.content) if response.content else {}
         except Exception as json_err:
-            logger.error(f"[ORQUESTADOR][RESPONSE][JSON ERROR] status={response.status_code} body={response.text}")
-            raise OrchestrationError(
-                f"Error en petición al microservicio: {str(json_err)}",
-                status_code=500
+            logger.error("[ORQUESTADOR][ERROR RESPONSE][JSON ERROR] %s", json_err)
+            error_data = {"error": response.text}
+        raise OrchestrationError(
+            f"Error en microservicio: {error_data.get('error', response.text)}",
+            status_code=response.status_code,
+            details=error_data
+        )
+
+    # Intentar parsear JSON de la respuesta
+    try:
+        return loads(response.content) if response.content else {}
+    except Exception as json_err:
+        logger.error("[ORQUESTADOR][RESPONSE][JSON ERROR] status=%s body=%s", response.status_code, response.text)
+        raise OrchestrationError(
+            f"Error en petición al microservicio: {str(json_err)}",
+            status_code=500
+        )
+
+
+def _make_request(method, url, headers=None, json=None, params=None):
+    """Realiza una petición HTTP a un microservicio con manejo de errores y logging de debug."""
+    try:
+        # Logging perezoso y sin headers: no se formatea nada si el nivel está
+        # desactivado y el token de Authorization nunca llega a los logs
+        logger.debug("[ORQUESTADOR][REQUEST] %s %s params=%s json=%s", method, url, params, json)
+        service_name = resolve_service_name(url)
+        client = registry.get(service_name)
+        with span('http', servicio=service_name, method=method, url=url) as http_span:
+            request_headers = dict(headers or {}, **propagation_headers())
+            body = None
+            if json is not None:
+                body = dumps(json)
+                request_headers['Content-Type'] = 'application/json'
+            response = get_downstream(service_name).call(
+                method,
+                lambda timeout: client.request(
+                    method,
+                    url,
+                    headers=request_headers,
+                    data=body,
+                    params=params,
+                    timeout=timeout
+                )
             )
+            if http_span is not None:
+                http_span.attrs['status'] = response.status_code
+        return _procesar_respuesta(method, url, response)
 
+    except OrchestrationError:
+        raise
     except requests.Timeout:
-        logger.error(f"[ORQUESTADOR][TIMEOUT] {method} {url}")
+        logger.error("[ORQUESTADOR][TIMEOUT] %s %s", method, url)
         raise OrchestrationError("Timeout al comunicarse con el microservicio", status_code=504)
     except requests.ConnectionError:
-        logger.error(f"[ORQUESTADOR][CONNECTION ERROR] {method} {url}")
+        logger.error("[ORQUESTADOR][CONNECTION ERROR] %s %s", method, url)
         raise OrchestrationError("No se pudo conectar con el microservicio", status_code=503)
     except Exception as e:
-        logger.exception(f"[ORQUESTADOR][UNEXPECTED ERROR] {method} {url}: {str(e)}")
-        if isinstance(e, OrchestrationError):
-            raise
+        logger.exception("[ORQUESTADOR][UNEXPECTED ERROR] %s %s", method, url)
         raise OrchestrationError(f"Error en petición al microservicio: {str(e)}", status_code=500)
 
-def registrar_compra_orquestada(productos_compra, cantidades_compra, auth_token, datos_adicionales=None):
-    headers = {'Authorization': auth_token}
 
-    # Paso 1: Obtener info usuario
-    usuarios_url = _get_microservice_url('usuarios_y_autenticacion_y_compras')
-    usuario_response = _make_request(
-        'GET',
-        f"{usuarios_url}/api/user/me",
-        headers=headers
-    )
-    usuario_dni = usuario_response.get('dni')
-    if not usuario_dni:
+# ---------------------------------------------------------------------------
+# Validaciones y armado de respuestas (compartidas con async_services)
+# ---------------------------------------------------------------------------
+
+def _identidad_local(auth_token, requiere_id=False):
+    """Identidad leída del JWT verificado localmente, o None si no alcanza."""
+    claims = verificar_token(auth_token)
+    if claims is not None:
+        identidad = identidad_desde_claims(claims)
+        if identidad.get('dni') and (not requiere_id or identidad.get('id') is not None):
+            return identidad
+    return None
+
+
+def _usuario_conocido(auth_token, requiere_id=False):
+    """Identidad sin consultar ``/api/user/me``: del JWT verificado o memoizada por token; None si no hay."""
+    identidad = _identidad_local(auth_token, requiere_id)
+    if identidad is not None:
+        return identidad
+    return user_me_cache.get(auth_token)
+
+
+def _usuario_y_productos(resultados):
+    """
+    Separa los resultados del primer paso de una compra: la identidad del
+    usuario y, detrás, las tandas de ``/api/productos/batch``.
+
+    Returns:
+        tuple: ``(usuario_response, productos_por_id)``
+
+    Raises:
+        OrchestrationError: 400 si la identidad no trae el DNI
+    """
+    usuario_response = resultados[0]
+    if not usuario_response.get('dni'):
         raise OrchestrationError("No se pudo obtener el DNI del usuario", status_code=400)
+    return usuario_response, {producto.get('id'): producto for parte in resultados[1:] for producto in parte}
 
-    # Paso 2: Obtener recetas validadas del usuario
-    recetas_url = _get_microservice_url('recetas_y_medicos')
-    recetas_response = _make_request(
-        'GET',
-        f"{recetas_url}/api/recetas/filter",
-        headers=headers,
-        params={
-            'dni': usuario_dni,
+
+def _productos_batch(respuesta):
+    """Productos de una respuesta de ``/api/productos/batch``; refresca la caché con cada uno."""
+    productos = respuesta.get('productos', [])
+    for producto in productos:
+        product_cache.set(producto.get('id'), producto)
+    return productos
+
+
+class _IndiceRecetasBase:
+    """
+    Productos cubiertos por las recetas validadas de un paciente, cargados a demanda.
+
+    Las páginas de ``/api/recetas/filter`` se piden de a una y solo mientras
+    quede algún producto sin cubrir; lo ya leído queda en el índice y se
+    reutiliza en consultas posteriores de la misma petición.
+    """
+
+    def __init__(self, dni, headers, pagesize=None):
+        self.dni = dni
+        self.headers = headers
+        self.pagesize = pagesize or getattr(settings, 'ORCHESTRATOR_RECETAS_PAGESIZE', 100)
+        self.productos = set()
+        self.paginas_leidas = 0
+        self.agotado = False
+
+    def _url(self):
+        return f"{_get_microservice_url('recetas_y_medicos')}/api/recetas/filter"
+
+    def _params(self):
+        return {
+            'dni': self.dni,
             'estado': 'validada',
-            'page': 1,
-            'pagesize': 100
+            'page': self.paginas_leidas + 1,
+            'pagesize': self.pagesize
         }
-    )
-    recetas_validadas = recetas_response.get('items', [])
-    productos_con_receta_validada = set()
-    for receta in recetas_validadas:
-        for prod in receta.get('productos', []):
-            productos_con_receta_validada.add(prod.get('id'))
 
-    # Paso 3: Validar productos y stock
-    productos_url = _get_microservice_url('productos_y_ofertas')
+    def _registrar_pagina(self, recetas_response):
+        items = recetas_response.get('items', [])
+        for receta in items:
+            for prod in receta.get('productos', []):
+                self.productos.add(prod.get('id'))
+        self.paginas_leidas += 1
+        pagesize = recetas_response.get('pagesize') or self.pagesize
+        total = recetas_response.get('total')
+        if not items or len(items) < pagesize or (total is not None and self.paginas_leidas * pagesize >= total):
+            self.agotado = True
+
+    def _sin_cubrir(self, producto_ids):
+        return {producto_id for producto_id in producto_ids if producto_id not in self.productos}
+
+    @classmethod
+    def del_paciente(cls, indice_recetas, dni, headers):
+        """``indice_recetas`` si ya es del paciente ``dni``; si no, un índice nuevo."""
+        if indice_recetas is not None and indice_recetas.dni == dni:
+            return indice_recetas
+        return cls(dni, headers)
+
+
+class IndiceRecetasValidadas(_IndiceRecetasBase):
+
+    def sin_cubrir(self, producto_ids):
+        """
+        Devuelve los ids que ninguna receta validada cubre, leyendo solo las
+        páginas necesarias para decidirlo.
+        """
+        faltantes = self._sin_cubrir(producto_ids)
+        while faltantes and not self.agotado:
+            params = self._params()
+            with span('recetas', page=params['page']):
+                self._registrar_pagina(_make_request('GET', self._url(), headers=self.headers, params=params))
+            faltantes = self._sin_cubrir(faltantes)
+        return faltantes
+
+
+def _validar_stock(productos_compra, cantidades_compra, productos_info):
+    """
+    Valida el stock de cada línea del carrito.
+
+    Returns:
+        tuple: Líneas del carrito con el producto consultado y productos que requieren receta
+    """
     productos_detallados = []
     productos_requieren_receta = []
 
-    for producto_id, cantidad in zip(productos_compra, cantidades_compra):
-        producto = _make_request(
-            'GET',
-            f"{productos_url}/api/productos/{producto_id}",
-            headers=headers
-        )
+    for producto_id, cantidad, producto in zip(productos_compra, cantidades_compra, productos_info):
         if producto.get('stock', 0) < cantidad:
             raise OrchestrationError(
                 f"Stock insuficiente para el producto '{producto.get('nombre')}'. "
@@ -126,11 +241,33 @@ def registrar_compra_orquestada(productos_compra, cantidades_compra, auth_token,
                 'id': producto_id,
                 'nombre': producto.get('nombre')
             })
+    return productos_detallados, productos_requieren_receta
+
+
+def _productos_carrito(producto_ids, productos_por_id):
+    """Productos de las líneas del carrito, en orden; 404 si alguno no existe."""
+    faltantes = list(dict.fromkeys(p for p in producto_ids if p not in productos_por_id))
+    if faltantes:
+        raise OrchestrationError(
+            f"Productos no encontrados: {', '.join(str(p) for p in faltantes)}",
+            status_code=404,
+            details={'productos_no_encontrados': faltantes}
+        )
+    return [productos_por_id[p] for p in producto_ids]
 
-    # Validar que todos los productos que requieren receta estén en alguna receta validada
+
+def _validar_carrito(productos_compra, cantidades_compra, productos_por_id):
+    """Existencia y stock de las líneas de un carrito; devuelve lo mismo que ``_validar_stock``."""
+    return _validar_stock(
+        productos_compra, cantidades_compra, _productos_carrito(productos_compra, productos_por_id)
+    )
+
+
+def _validar_recetas(productos_requieren_receta, ids_sin_receta):
+    """Falla si algún producto que requiere receta no está en una receta validada."""
     productos_sin_receta_validada = [
         prod['nombre'] for prod in productos_requieren_receta
-        if prod['id'] not in productos_con_receta_validada
+        if prod['id'] in ids_sin_receta
     ]
     if productos_sin_receta_validada:
         raise OrchestrationError(
@@ -139,34 +276,59 @@ def registrar_compra_orquestada(productos_compra, cantidades_compra, auth_token,
             details={'productos_sin_receta': productos_sin_receta_validada}
         )
 
-    # Paso 4: Actualizar stock en backend de productos
-    for prod in productos_detallados:
-        producto_id = prod['producto_id']
-        cantidad = prod['cantidad']
-        _make_request(
-            'PUT',
-            f"{productos_url}/api/productos/{producto_id}",
-            headers=headers,
-            json={'stock': prod['producto']['stock'] - cantidad}
-        )
 
-    # Paso 5: Registrar la compra en backend de usuarios/compras
+def _items_descuento(productos_detallados):
+    return {'items': [
+        {'producto_id': p['producto_id'], 'cantidad': p['cantidad']}
+        for p in productos_detallados
+    ]}
+
+
+def _error_descuento_stock(error):
+    """Traduce el 409 de ``/stock/descontar`` a un error de orquestación; None si es otro error."""
+    if error.status_code != 409:
+        return None
+    detalle = (error.details or {}).get('detail') or {}
+    return OrchestrationError(
+        "Stock insuficiente al confirmar la compra; no se descontó ningún producto",
+        status_code=400,
+        details={'productos_sin_stock': detalle.get('items', [])}
+    )
+
+
+def _compra_no_registrada(error, repuesto):
+    """
+    ``error`` de una compra que ya había descontado stock, con
+    ``stock_repuesto`` en los detalles. Si el stock no se repuso lleva además
+    ``requiere_revision``: con Idempotency-Key ese resultado se guarda y un
+    reintento no vuelve a descontar.
+    """
+    if isinstance(error.details, dict):
+        details = dict(error.details)
+    else:
+        details = {} if error.details is None else {'respuesta': error.details}
+    details['stock_repuesto'] = repuesto
+    if not repuesto:
+        details['requiere_revision'] = True
+    return OrchestrationError(error.message, status_code=error.status_code, details=details)
+
+
+def _armar_compra_request(usuario_response, productos_detallados, datos_adicionales):
     compra_request = {
-        'usuarioId': usuario_response.get('id'),
         'productos': [p['producto_id'] for p in productos_detallados],
         'cantidades': [p['cantidad'] for p in productos_detallados]
     }
+    # El microservicio de compras toma el usuario del token; el id solo se
+    # envía si ya se conoce (sin ir a /api/user/me a buscarlo)
+    if usuario_response.get('id') is not None:
+        compra_request['usuarioId'] = usuario_response['id']
     if datos_adicionales:
         compra_request.update(datos_adicionales)
+    return compra_request
 
-    compra_response = _make_request(
-        'POST',
-        f"{usuarios_url}/api/compras",
-        headers=headers,
-        json=compra_request
-    )
 
-    compra_response['productos_detalle'] = [
+def _detalle_compra(productos_detallados):
+    return [
         {
             'producto_id': p['producto_id'],
             'cantidad': p['cantidad'],
@@ -177,67 +339,708 @@ def registrar_compra_orquestada(productos_compra, cantidades_compra, auth_token,
         }
         for p in productos_detallados
     ]
+
+
+def _ids_productos_compras(compras):
+    """Ids de producto distintos de una lista de compras, en orden de aparición."""
+    return list(dict.fromkeys(
+        producto_id
+        for compra in compras
+        for producto_id in compra.get('productos', [])
+    ))
+
+
+def _enriquecer_compra(compra, productos_por_id, detalle=DETALLE_FULL):
+    """Agrega ``productos_detalle`` a una compra; con ``detalle='none'`` la deja como está."""
+    if detalle == DETALLE_NONE:
+        return compra
+    productos_ids = compra.get('productos', [])
+    cantidades = compra.get('cantidades', [])
+    productos_detalle = []
+
+    # Iterar en paralelo productos y cantidades
+    for producto_id, cantidad in zip(productos_ids, cantidades):
+        producto = productos_por_id.get(producto_id)
+        if producto is not None:
+            linea = {
+                'producto_id': producto_id,
+                'cantidad': cantidad,
+                'nombre': producto.get('nombre'),
+                'precio': producto.get('precio')
+            }
+            if detalle == DETALLE_FULL:
+                linea['tipo'] = producto.get('tipo')
+                linea['stock'] = producto.get('stock')
+            productos_detalle.append(linea)
+        else:
+            productos_detalle.append({
+                'producto_id': producto_id,
+                'cantidad': cantidad,
+                'error': 'Producto no disponible'
+            })
+
+    compra['productos_detalle'] = productos_detalle
+    return compra
+
+
+def _error_producto_receta_inexistente(producto_id):
+    return OrchestrationError(
+        f"El producto con ID {producto_id} mencionado en la receta no existe",
+        status_code=400
+    )
+
+
+def _validar_nombre_producto(producto, producto_info):
+    producto_id = producto.get('id')
+    producto_nombre = producto.get('nombre')
+    if producto_info.get('nombre') != producto_nombre:
+        raise OrchestrationError(
+            f"Nombre del producto con ID {producto_id} no coincide: '{producto_nombre}' vs '{producto_info.get('nombre')}'",
+            status_code=400
+        )
+
+
+def _validar_paciente(receta, usuario_me):
+    paciente_dni = receta.get('pacienteDNI') or receta.get('pacientedni')
+    usuario_me_dni = str(usuario_me.get('dni'))
+
+    if str(paciente_dni) != usuario_me_dni:
+        raise OrchestrationError(
+            f"El DNI del usuario autenticado ({usuario_me_dni}) no coincide con el paciente de la receta ({paciente_dni})",
+            status_code=400
+        )
+
+
+def _respuesta_receta(resultado, productos_receta):
+    return {
+        'mensaje': 'Receta validada y actualizada exitosamente',
+        'receta': resultado,
+        'validaciones': {
+            'productos_validados': len(productos_receta),
+            'medico_valido': True,
+            'paciente_valido': True
+        }
+    }
+
+
+# ---------------------------------------------------------------------------
+# Compra en lote: varios carritos del mismo usuario
+# ---------------------------------------------------------------------------
+
+def leer_carritos(data):
+    """
+    Valida el cuerpo de ``compras/lote`` y devuelve la lista de carritos.
+
+    Raises:
+        OrchestrationError: 400 si el cuerpo no tiene carritos válidos o
+            supera ``ORCHESTRATOR_LOTE_MAX_CARRITOS``
+    """
+    carritos = data.get('carritos') if isinstance(data, dict) else None
+    if not isinstance(carritos, list) or not carritos:
+        raise OrchestrationError("Se requiere un array 'carritos' con al menos un carrito", status_code=400)
+    maximo = settings.ORCHESTRATOR_LOTE_MAX_CARRITOS
+    if len(carritos) > maximo:
+        raise OrchestrationError(f"Se permiten como máximo {maximo} carritos por lote", status_code=400)
+
+    invalidos = []
+    for indice, carrito in enumerate(carritos):
+        productos = carrito.get('productos') if isinstance(carrito, dict) else None
+        cantidades = carrito.get('cantidades') if isinstance(carrito, dict) else None
+        if (
+            not isinstance(productos, list) or not isinstance(cantidades, list)
+            or not productos or len(productos) != len(cantidades)
+            or not all(isinstance(p, int) and not isinstance(p, bool) for p in productos)
+            or not all(isinstance(c, int) and not isinstance(c, bool) and c > 0 for c in cantidades)
+        ):
+            invalidos.append(indice)
+    if invalidos:
+        raise OrchestrationError(
+            "Cada carrito requiere arrays de productos (ids) y cantidades (positivas) del mismo tamaño",
+            status_code=400,
+            details={'carritos_invalidos': invalidos}
+        )
+    return carritos
+
+
+def status_lote(respuesta):
+    """201 si se registraron todos los carritos; 207 si alguno fue rechazado."""
+    return 201 if respuesta['resumen']['rechazadas'] == 0 else 207
+
+
+def _partes(ids, tamano):
+    """Divide ``ids`` en tandas de a lo sumo ``tamano`` elementos."""
+    return [ids[i:i + tamano] for i in range(0, len(ids), tamano)]
+
+
+def _ids_productos_carritos(carritos):
+    """Ids de producto distintos de todos los carritos, en orden de aparición."""
+    return list(dict.fromkeys(
+        producto_id
+        for carrito in carritos
+        for producto_id in carrito['productos']
+    ))
+
+
+def _ids_requieren_receta(productos_por_id):
+    return [producto_id for producto_id, producto in productos_por_id.items() if producto.get('requiere_receta')]
+
+
+def _resultado_error(indice, error):
+    return {
+        'indice': indice,
+        'status_code': error.status_code,
+        'error': str(error),
+        'details': error.details
+    }
+
+
+def _asignar_carritos(carritos, productos_por_id, ids_sin_receta):
+    """
+    Valida los carritos en orden contra el stock que van dejando los anteriores.
+
+    Un carrito que no pasa (producto inexistente, stock o receta) queda
+    rechazado sin reservar nada, y los siguientes pueden usar ese stock.
+
+    Returns:
+        tuple: ``(aceptados, resultados)``; ``aceptados`` es una lista de
+        ``(indice, productos_detallados)`` y ``resultados`` tiene el error de
+        cada carrito rechazado y ``None`` en los aceptados
+    """
+    stock_restante = {producto_id: producto.get('stock', 0) for producto_id, producto in productos_por_id.items()}
+    aceptados = []
+    resultados = [None] * len(carritos)
+
+    for indice, carrito in enumerate(carritos):
+        try:
+            productos_info = _productos_carrito(carrito['productos'], productos_por_id)
+            # Stock que piden las líneas del carrito, sumando productos repetidos
+            demanda = {}
+            for producto_id, cantidad in zip(carrito['productos'], carrito['cantidades']):
+                demanda[producto_id] = demanda.get(producto_id, 0) + cantidad
+            _validar_stock(
+                list(demanda),
+                list(demanda.values()),
+                [dict(productos_por_id[p], stock=stock_restante[p]) for p in demanda]
+            )
+            productos_detallados, productos_requieren_receta = _validar_stock(
+                carrito['productos'], carrito['cantidades'], productos_info
+            )
+            _validar_recetas(productos_requieren_receta, ids_sin_receta)
+        except OrchestrationError as e:
+            resultados[indice] = _resultado_error(indice, e)
+            continue
+        for producto_id, cantidad in demanda.items():
+            stock_restante[producto_id] -= cantidad
+        aceptados.append((indice, productos_detallados))
+
+    return aceptados, resultados
+
+
+def _resultado_compra(indice, compra_response, productos_detallados):
+    compra_response['productos_detalle'] = _detalle_compra(productos_detallados)
+    return {'indice': indice, 'status_code': 201, 'compra': compra_response}
+
+
+def _respuesta_lote(resultados):
+    registradas = sum(1 for r in resultados if r['status_code'] == 201)
+    return {
+        'resultados': resultados,
+        'resumen': {
+            'total': len(resultados),
+            'registradas': registradas,
+            'rechazadas': len(resultados) - registradas
+        }
+    }
+
+
+def _lote_no_soportado(error):
+    """El microservicio de compras no expone ``/api/compras/lote`` (versión anterior)."""
+    return error.status_code in (404, 405)
+
+
+def _lineas(carritos):
+    return [linea for _, productos_detallados in carritos for linea in productos_detallados]
+
+
+def _en_una_operacion(carritos):
+    """Los carritos no superan juntos el máximo de productos por operación de stock."""
+    producto_ids = {linea['producto_id'] for linea in _lineas(carritos)}
+    return len(producto_ids) <= settings.ORCHESTRATOR_PRODUCTOS_BATCH_MAX
+
+
+def _sin_stock(error):
+    """El error es el rechazo de ``/stock/descontar`` por falta de stock (ver ``_error_descuento_stock``)."""
+    return 'productos_sin_stock' in (error.details or {})
+
+
+def _compras_request_lote(usuario_response, aceptados, carritos):
+    return [
+        _armar_compra_request(usuario_response, productos_detallados, carritos[indice].get('datos_adicionales'))
+        for indice, productos_detallados in aceptados
+    ]
+
+
+def _registrar_resultados_compras(aceptados, compras_response, resultados):
+    """
+    Anota en ``resultados`` las compras registradas.
+
+    Returns:
+        list: ``(indice, productos_detallados, error)`` de los carritos con
+        stock descontado cuya compra no se registró
+    """
+    no_registrados = []
+    for (indice, productos_detallados), compra_response in zip(aceptados, compras_response):
+        if isinstance(compra_response, OrchestrationError):
+            no_registrados.append((indice, productos_detallados, compra_response))
+        else:
+            resultados[indice] = _resultado_compra(indice, compra_response, productos_detallados)
+    return no_registrados
+
+
+def _grupos_reposicion(no_registrados):
+    """
+    Carritos cuyo stock se repone, en una llamada o de a uno si superan el
+    máximo de productos por operación. Un timeout no dice si la compra llegó
+    a registrarse: esos carritos no se reponen.
+    """
+    reponer = [(indice, productos_detallados) for indice, productos_detallados, error in no_registrados
+               if error.status_code != 504]
+    if _en_una_operacion(reponer):
+        return [reponer] if reponer else []
+    return [[carrito] for carrito in reponer]
+
+
+def _resultado_no_registrado(indice, error, repuesto):
+    """Carrito con stock descontado cuya compra falló; sin reposición queda para revisar a mano."""
+    resultado = _resultado_error(indice, error)
+    resultado['stock_repuesto'] = repuesto
+    if not repuesto:
+        resultado['requiere_revision'] = True
+    return resultado
+
+
+def _registrar_no_registrados(no_registrados, repuestos, resultados):
+    for indice, _, error in no_registrados:
+        resultados[indice] = _resultado_no_registrado(indice, error, indice in repuestos)
+
+
+# ---------------------------------------------------------------------------
+# Flujos síncronos
+# ---------------------------------------------------------------------------
+
+def _obtener_usuario(usuarios_url, auth_token, headers, requiere_id=False):
+    """
+    Obtiene la identidad del usuario autenticado.
+
+    Primero intenta leerla del JWT verificado localmente; si los claims no
+    alcanzan (por ejemplo, se necesita el id y el token solo trae el DNI) se
+    consulta ``/api/user/me``, memoizado por token hasta su expiración.
+    """
+    usuario = _usuario_conocido(auth_token, requiere_id)
+    if usuario is not None:
+        return usuario
+    usuario = _make_request(
+        'GET',
+        f"{usuarios_url}/api/user/me",
+        headers=headers
+    )
+    user_me_cache.set(auth_token, usuario)
+    return usuario
+
+
+def _obtener_producto(productos_url, producto_id, headers, use_cache=True):
+    """
+    Obtiene un producto del microservicio de productos.
+
+    Con ``use_cache=False`` se omite la lectura de la caché (por ejemplo para
+    validar stock antes de una compra), aunque la respuesta sí la refresca.
+    """
+    if use_cache:
+        producto = product_cache.get(producto_id)
+        if producto is not None:
+            return producto
+    producto = _make_request(
+        'GET',
+        f"{productos_url}/api/productos/{producto_id}",
+        headers=headers
+    )
+    product_cache.set(producto_id, producto)
+    return producto
+
+
+def _descontar_stock(productos_url, productos_detallados, headers):
+    """Descuenta atómicamente el stock de todas las líneas del carrito."""
+    try:
+        # El stock cambia (o pudo cambiar) en cualquier caso: se invalida la caché
+        return _make_request(
+            'POST',
+            f"{productos_url}/api/productos/stock/descontar",
+            headers=headers,
+            json=_items_descuento(productos_detallados)
+        )
+    except OrchestrationError as e:
+        error = _error_descuento_stock(e)
+        if error is None:
+            raise
+        raise error
+    finally:
+        product_cache.invalidate([p['producto_id'] for p in productos_detallados])
+
+
+def registrar_compra_orquestada(productos_compra, cantidades_compra, auth_token, datos_adicionales=None,
+                                max_concurrency=None, indice_recetas=None, antes_de_escribir=None):
+    """
+    Registra una compra validando stock y recetas.
+
+    ``indice_recetas`` permite reutilizar un ``IndiceRecetasValidadas`` ya
+    cargado para el mismo paciente dentro de la misma petición.
+    ``antes_de_escribir`` se llama después de las validaciones y antes de
+    descontar stock (el primer paso que no se puede repetir).
+    """
+    headers = {'Authorization': auth_token}
+    usuarios_url = _get_microservice_url('usuarios_y_autenticacion_y_compras')
+    productos_url = _get_microservice_url('productos_y_ofertas')
+
+    def obtener_usuario():
+        with span('usuario'):
+            return _obtener_usuario(usuarios_url, auth_token, headers)
+
+    def obtener_productos(producto_ids):
+        # Se leen siempre de Productos (no de la caché) para validar stock
+        with span('productos', cantidad=len(producto_ids)):
+            return _obtener_productos_lote(productos_url, producto_ids, headers)
+
+    # Paso 1: info del usuario y productos del carrito en paralelo, con
+    # /api/productos/batch (una llamada cada PRODUCTOS_BATCH_MAX productos)
+    partes = _partes(list(dict.fromkeys(productos_compra)), settings.ORCHESTRATOR_PRODUCTOS_BATCH_MAX)
+    resultados = run_concurrently(
+        [obtener_usuario]
+        + [lambda parte=parte: obtener_productos(parte) for parte in partes],
+        max_concurrency
+    )
+    usuario_response, productos_por_id = _usuario_y_productos(resultados)
+
+    # Paso 2: Validar stock
+    productos_detallados, productos_requieren_receta = _validar_carrito(
+        productos_compra, cantidades_compra, productos_por_id
+    )
+
+    # Paso 3: Solo si hay productos con receta, buscar las recetas validadas
+    # que los cubren (se detiene en cuanto están todos cubiertos)
+    if productos_requieren_receta:
+        indice_recetas = IndiceRecetasValidadas.del_paciente(indice_recetas, usuario_response['dni'], headers)
+        _validar_recetas(
+            productos_requieren_receta,
+            indice_recetas.sin_cubrir([p['id'] for p in productos_requieren_receta])
+        )
+
+    if antes_de_escribir is not None:
+        antes_de_escribir()
+
+    # Paso 4: Descontar stock en backend de productos (todo o nada, en una sola llamada)
+    with span('stock'):
+        try:
+            _descontar_stock(productos_url, productos_detallados, headers)
+        except OrchestrationError as e:
+            if e.status_code != 504:
+                raise
+            # Un timeout no dice si el descuento se aplicó
+            raise _compra_no_registrada(e, False) from e
+
+    # Paso 5: Registrar la compra en backend de usuarios/compras
+    compra_request = _armar_compra_request(usuario_response, productos_detallados, datos_adicionales)
+    try:
+        with span('compra'):
+            compra_response = _make_request(
+                'POST',
+                f"{usuarios_url}/api/compras",
+                headers=headers,
+                json=compra_request
+            )
+    except OrchestrationError as e:
+        # La compra no se registró: se devuelve el stock. Con un timeout pudo
+        # haberse registrado, así que no se repone
+        with span('stock'):
+            repuesto = e.status_code != 504 and _reponer_stock(productos_url, productos_detallados, headers)
+        raise _compra_no_registrada(e, repuesto) from e
+
+    compra_response['productos_detalle'] = _detalle_compra(productos_detallados)
     return compra_response
 
-def listar_compras_usuario_detalladas(auth_token):
+
+def _obtener_productos_lote(productos_url, producto_ids, headers):
+    """Productos por id en una sola llamada a ``/api/productos/batch`` (refresca la caché)."""
+    respuesta = _make_request(
+        'GET',
+        f"{productos_url}/api/productos/batch",
+        headers=headers,
+        params={'ids': producto_ids}
+    )
+    return _productos_batch(respuesta)
+
+
+def _descontar_stock_lote(productos_url, aceptados, headers, resultados):
     """
-    Obtiene las compras del usuario con detalles de productos y ofertas.
+    Descuenta el stock de todos los carritos aceptados en una sola llamada.
+
+    Si no alcanza (otra compra se llevó stock entre la lectura y el
+    descuento) o el lote supera el máximo de productos por operación, se
+    descuenta carrito por carrito en orden y los que no alcanzan se marcan
+    como rechazados en ``resultados``.
+
+    Returns:
+        list: Los carritos de ``aceptados`` a los que se les descontó el stock
+    """
+    if _en_una_operacion(aceptados):
+        try:
+            _descontar_stock(productos_url, _lineas(aceptados), headers)
+            return aceptados
+        except OrchestrationError as e:
+            if not _sin_stock(e):
+                raise
+
+    descontados = []
+    for indice, productos_detallados in aceptados:
+        try:
+            _descontar_stock(productos_url, productos_detallados, headers)
+        except OrchestrationError as e:
+            if not _sin_stock(e):
+                raise
+            resultados[indice] = _resultado_error(indice, e)
+            continue
+        descontados.append((indice, productos_detallados))
+    return descontados
+
+
+def _reponer_stock(productos_url, productos_detallados, headers):
+    """Devuelve al stock lo descontado para compras que no se registraron; False si no se pudo."""
+    try:
+        _make_request(
+            'POST',
+            f"{productos_url}/api/productos/stock/reponer",
+            headers=headers,
+            json=_items_descuento(productos_detallados)
+        )
+        return True
+    except OrchestrationError as e:
+        logger.error(f"No se pudo reponer el stock de compras no registradas: {str(e)}")
+        return False
+    finally:
+        product_cache.invalidate([p['producto_id'] for p in productos_detallados])
+
+
+def _reponer_no_registrados(productos_url, no_registrados, headers, resultados):
+    repuestos = set()
+    for grupo in _grupos_reposicion(no_registrados):
+        if _reponer_stock(productos_url, _lineas(grupo), headers):
+            repuestos.update(indice for indice, _ in grupo)
+    _registrar_no_registrados(no_registrados, repuestos, resultados)
+
+
+def _registrar_compras_lote(usuarios_url, compras_request, headers, max_concurrency):
+    """
+    Registra las compras en una sola llamada; si el servicio no la soporta, una por una.
+
+    Returns:
+        list: Por cada compra, la respuesta del servicio o el
+        ``OrchestrationError`` con el que falló
+    """
+    try:
+        return _make_request('POST', f"{usuarios_url}/api/compras/lote", headers=headers, json=compras_request)
+    except OrchestrationError as e:
+        if not _lote_no_soportado(e):
+            # El lote es una sola transacción: no se registró ninguna
+            return [e] * len(compras_request)
+
+    def registrar(compra_request):
+        try:
+            return _make_request('POST', f"{usuarios_url}/api/compras", headers=headers, json=compra_request)
+        except OrchestrationError as e:
+            return e
+
+    return run_concurrently(
+        [lambda compra_request=compra_request: registrar(compra_request) for compra_request in compras_request],
+        max_concurrency
+    )
+
+
+def registrar_compras_lote(carritos, auth_token, max_concurrency=None):
+    """
+    Registra varios carritos del mismo usuario con una sola ronda de consultas.
+
+    La identidad y las recetas validadas se resuelven una vez, los productos
+    de todos los carritos se leen juntos en ``/api/productos/batch``, el
+    stock se valida contra la demanda acumulada (en el orden de los
+    carritos) y se descuenta y registra todo en una llamada a cada servicio.
+    Cada carrito tiene su propio resultado: un carrito rechazado no impide
+    registrar los demás. Si la compra de un carrito no se registra, su stock
+    se repone; si no se puede reponer queda marcado con ``requiere_revision``.
 
     Args:
-        auth_token: Token JWT del usuario
+        carritos: Lista de dicts con ``productos``, ``cantidades`` y
+            opcionalmente ``datos_adicionales``
 
     Returns:
-        dict: Compras con detalles completos
+        dict: ``resultados`` (uno por carrito, en orden) y ``resumen``
     """
     headers = {'Authorization': auth_token}
-
-    # Obtener compras del usuario
     usuarios_url = _get_microservice_url('usuarios_y_autenticacion_y_compras')
-    compras_response = _make_request(
-        'GET',
-        f"{usuarios_url}/api/compras/me",
-        headers=headers
+    productos_url = _get_microservice_url('productos_y_ofertas')
+
+    def obtener_usuario():
+        with span('usuario'):
+            return _obtener_usuario(usuarios_url, auth_token, headers)
+
+    def obtener_productos(producto_ids):
+        with span('productos', cantidad=len(producto_ids)):
+            return _obtener_productos_lote(productos_url, producto_ids, headers)
+
+    # Paso 1: usuario y productos distintos de todos los carritos en paralelo
+    partes = _partes(_ids_productos_carritos(carritos), settings.ORCHESTRATOR_PRODUCTOS_BATCH_MAX)
+    resultados = run_concurrently(
+        [obtener_usuario]
+        + [lambda parte=parte: obtener_productos(parte) for parte in partes],
+        max_concurrency
+    )
+    usuario_response, productos_por_id = _usuario_y_productos(resultados)
+
+    # Paso 2: una sola búsqueda de recetas para todos los productos con receta
+    ids_receta = _ids_requieren_receta(productos_por_id)
+    ids_sin_receta = (
+        IndiceRecetasValidadas(usuario_response['dni'], headers).sin_cubrir(ids_receta) if ids_receta else set()
     )
 
+    # Paso 3: stock y recetas de cada carrito contra la demanda acumulada
+    aceptados, resultados = _asignar_carritos(carritos, productos_por_id, ids_sin_receta)
+
+    if aceptados:
+        # Paso 4: descontar el stock de todos los carritos aceptados a la vez
+        with span('stock'):
+            aceptados = _descontar_stock_lote(productos_url, aceptados, headers, resultados)
+
+    if aceptados:
+        # Paso 5: registrar las compras
+        compras_request = _compras_request_lote(usuario_response, aceptados, carritos)
+        with span('compra', cantidad=len(compras_request)):
+            compras_response = _registrar_compras_lote(usuarios_url, compras_request, headers, max_concurrency)
+        no_registrados = _registrar_resultados_compras(aceptados, compras_response, resultados)
+
+        if no_registrados:
+            # Paso 6: devolver el stock de las compras que no se registraron
+            with span('stock'):
+                _reponer_no_registrados(productos_url, no_registrados, headers, resultados)
+
+    return _respuesta_lote(resultados)
+
+
+def obtener_compras_usuario(auth_token):
+    """Compras del usuario autenticado tal como las devuelve ``/api/compras/me``."""
+    usuarios_url = _get_microservice_url('usuarios_y_autenticacion_y_compras')
+    with span('compras'):
+        compras_response = _make_request(
+            'GET',
+            f"{usuarios_url}/api/compras/me",
+            headers={'Authorization': auth_token}
+        )
     # La respuesta debe ser una lista
-    compras = compras_response if isinstance(compras_response, list) else []
+    return compras_response if isinstance(compras_response, list) else []
+
 
+def _consultar_productos_compras(compras, headers, max_concurrency, detalle=DETALLE_FULL):
+    """Productos de un grupo de compras por id; los que no se pudieron obtener quedan en None."""
+    if detalle == DETALLE_NONE:
+        return {}
     productos_url = _get_microservice_url('productos_y_ofertas')
 
+    # Cada producto distinto se consulta una sola vez, en paralelo
+    productos_ids_unicos = _ids_productos_compras(compras)
+
+    def consultar(producto_id):
+        try:
+            return _obtener_producto(productos_url, producto_id, headers)
+        except Exception as e:
+            logger.warning(f"No se pudo obtener detalle del producto {producto_id}: {str(e)}")
+            return None
+
+    with span('productos'):
+        return dict(zip(
+            productos_ids_unicos,
+            run_concurrently(
+                [lambda producto_id=producto_id: consultar(producto_id) for producto_id in productos_ids_unicos],
+                max_concurrency
+            )
+        ))
+
+
+def listar_compras_usuario_detalladas(auth_token, max_concurrency=None, page=None, pagesize=None,
+                                      detalle=DETALLE_FULL):
+    """
+    Obtiene las compras del usuario con detalles de productos y ofertas.
+
+    Solo se enriquecen las compras de la página pedida, de modo que el costo
+    depende del tamaño de página y no del largo del historial.
+
+    Args:
+        auth_token: Token JWT del usuario
+        max_concurrency: Máximo de consultas de productos simultáneas
+        page: Página a devolver (desde 1); None devuelve todas
+        pagesize: Compras por página
+        detalle: ``none`` (sin productos), ``basic`` (nombre y precio) o ``full``
+
+    Returns:
+        dict: Compras con detalles y, si se paginó, ``page``, ``pagesize``,
+        ``total`` y ``total_pages``
+    """
+    headers = {'Authorization': auth_token}
+    compras, paginacion = paginar(obtener_compras_usuario(auth_token), page, pagesize)
+    productos_por_id = _consultar_productos_compras(compras, headers, max_concurrency, detalle)
+
     for compra in compras:
-        productos_ids = compra.get('productos', [])
-        cantidades = compra.get('cantidades', [])
-        productos_detalle = []
-
-        # Iterar en paralelo productos y cantidades
-        for producto_id, cantidad in zip(productos_ids, cantidades):
-            try:
-                producto = _make_request(
-                    'GET',
-                    f"{productos_url}/api/productos/{producto_id}",
-                    headers=headers
-                )
-                productos_detalle.append({
-                    'producto_id': producto_id,
-                    'cantidad': cantidad,
-                    'nombre': producto.get('nombre'),
-                    'precio': producto.get('precio'),
-                    'tipo': producto.get('tipo'),
-                    'stock': producto.get('stock')
-                })
-            except Exception as e:
-                logger.warning(f"No se pudo obtener detalle del producto {producto_id}: {str(e)}")
-                productos_detalle.append({
-                    'producto_id': producto_id,
-                    'cantidad': cantidad,
-                    'error': 'Producto no disponible'
-                })
-
-        compra['productos_detalle'] = productos_detalle
-
-    return {'compras': compras}
-
-def validar_y_actualizar_estado_receta(receta_id, nuevo_estado, auth_token):
+        _enriquecer_compra(compra, productos_por_id, detalle)
+
+    return {'compras': compras, **paginacion}
+
+
+def iterar_compras_usuario_detalladas(compras, auth_token, max_concurrency=None, ventana=10,
+                                      detalle=DETALLE_FULL):
+    """
+    Genera las compras enriquecidas de a una, para respuestas en streaming.
+
+    Las compras se procesan en ventanas de ``ventana`` elementos: se consultan
+    los productos de la ventana, se emiten sus compras y se liberan antes de
+    pasar a la siguiente, de modo que la memoria no crece con el largo del
+    historial. Los productos repetidos entre ventanas salen de la caché.
+
+    Args:
+        compras: Lista devuelta por ``obtener_compras_usuario`` (se consume)
+        auth_token: Token JWT del usuario
+        max_concurrency: Máximo de consultas de productos simultáneas
+        ventana: Compras enriquecidas por tanda
+        detalle: ``none``, ``basic`` o ``full`` (ver ``listar_compras_usuario_detalladas``)
+
+    Returns:
+        generator: Cada compra con ``productos_detalle``
+    """
+    headers = {'Authorization': auth_token}
+    # La traza se toma ahora, durante el view: el generador se itera después
+    # de que el middleware la cerró
+    trace = current_trace()
+    pendientes = deque(compras)
+    compras.clear()
+
+    def generar():
+        while pendientes:
+            lote = [pendientes.popleft() for _ in range(min(ventana, len(pendientes)))]
+            # Se reactiva solo mientras se consulta, nunca entre yields
+            with use_trace(trace):
+                productos_por_id = _consultar_productos_compras(lote, headers, max_concurrency, detalle)
+            for compra in lote:
+                yield _enriquecer_compra(compra, productos_por_id, detalle)
+
+    return generar()
+
+
+def validar_y_actualizar_estado_receta(receta_id, nuevo_estado, auth_token, max_concurrency=None):
     """
     Valida una receta y actualiza su estado:
     1. Obtiene información de la receta
@@ -250,6 +1053,7 @@ def validar_y_actualizar_estado_receta(receta_id, nuevo_estado, auth_token):
         receta_id: ID de la receta
         nuevo_estado: Nuevo estado a asignar
         auth_token: Token JWT
+        max_concurrency: Máximo de consultas simultáneas
 
     Returns:
         dict: Receta actualizada
@@ -257,70 +1061,47 @@ def validar_y_actualizar_estado_receta(receta_id, nuevo_estado, auth_token):
 
     headers = {'Authorization': auth_token}
     recetas_url = _get_microservice_url('recetas_y_medicos')
+    usuarios_url = _get_microservice_url('usuarios_y_autenticacion_y_compras')
 
-    # Paso 1: Obtener información de la receta
-    receta = _make_request(
-        'GET',
-        f"{recetas_url}/api/recetas/{receta_id}",
-        headers=headers
-    )
+    # Paso 1: Obtener información de la receta (y del usuario, en paralelo)
+    def obtener_receta():
+        with span('receta'):
+            return _make_request('GET', f"{recetas_url}/api/recetas/{receta_id}", headers=headers)
+
+    def obtener_usuario():
+        with span('usuario'):
+            return _obtener_usuario(usuarios_url, auth_token, headers)
+
+    receta, usuario_me = run_concurrently([obtener_receta, obtener_usuario], max_concurrency)
 
     # Paso 2: Validar productos existan y coincidan nombre
     productos_url = _get_microservice_url('productos_y_ofertas')
     productos_receta = receta.get('productos', [])
 
-    for producto in productos_receta:
-        producto_id = producto.get('id')
-        producto_nombre = producto.get('nombre')
+    def validar_producto(producto):
         try:
-            producto_info = _make_request(
-                'GET',
-                f"{productos_url}/api/productos/{producto_id}",
-                headers=headers
-            )
+            producto_info = _obtener_producto(productos_url, producto.get('id'), headers)
         except OrchestrationError:
-            raise OrchestrationError(
-                f"El producto con ID {producto_id} mencionado en la receta no existe",
-                status_code=400
-            )
+            raise _error_producto_receta_inexistente(producto.get('id'))
         # Validar que el nombre coincide
-        if producto_info.get('nombre') != producto_nombre:
-            raise OrchestrationError(
-                f"Nombre del producto con ID {producto_id} no coincide: '{producto_nombre}' vs '{producto_info.get('nombre')}'",
-                status_code=400
-            )
-
-    # Paso 4: Validar paciente coincide con el del token
-    usuarios_url = _get_microservice_url('usuarios_y_autenticacion_y_compras')
-    paciente_dni = receta.get('pacienteDNI') or receta.get('pacientedni')
-
-    usuario_me = _make_request(
-        'GET',
-        f"{usuarios_url}/api/user/me",
-        headers=headers
-    )
-    usuario_me_dni = str(usuario_me.get('dni'))
+        _validar_nombre_producto(producto, producto_info)
 
-    if str(paciente_dni) != usuario_me_dni:
-        raise OrchestrationError(
-            f"El DNI del usuario autenticado ({usuario_me_dni}) no coincide con el paciente de la receta ({paciente_dni})",
-            status_code=400
+    with span('productos'):
+        run_concurrently(
+            [lambda producto=producto: validar_producto(producto) for producto in productos_receta],
+            max_concurrency
         )
 
+    # Paso 4: Validar paciente coincide con el del token
+    _validar_paciente(receta, usuario_me)
+
     # Paso 5: Actualizar estado de la receta
-    resultado = _make_request(
-        'PUT',
-        f"{recetas_url}/api/recetas/{receta_id}/validar",
-        headers=headers,
-        json={'estadovalidacion': nuevo_estado}
-    )
+    with span('actualizacion'):
+        resultado = _make_request(
+            'PUT',
+            f"{recetas_url}/api/recetas/{receta_id}/validar",
+            headers=headers,
+            json={'estadovalidacion': nuevo_estado}
+        )
 
-    return {
-        'mensaje': 'Receta validada y actualizada exitosamente',
-        'receta': resultado,
-        'validaciones': {
-            'productos_validados': len(productos_receta),
-            'medico_valido': True,
-            'paciente_valido': True
-        }
-    }
\ No newline at end of file
+    return _respuesta_receta(resultado, productos_receta)
@@ -0,0 +1,63 @@
+"""
+Respuestas en streaming NDJSON (un documento JSON por línea).
+"""
+
+import logging
+
+from django.conf import settings
+
+from .jsoncodec import dumps
+
+logger = logging.getLogger(__name__)
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+NDJSON_ACCEPT = (NDJSON_CONTENT_TYPE, 'application/ndjson', 'application/jsonl')
+DEFAULT_STREAM_WINDOW = 10
+
+
+def pide_ndjson(request):
+    """True si el cliente pidió NDJSON con ``?formato=ndjson`` o con el header ``Accept``."""
+    if request.GET.get('formato', '').lower() == 'ndjson':
+        return True
+    accept = request.headers.get('Accept', '')
+    return any(tipo in accept for tipo in NDJSON_ACCEPT)
+
+
+def get_stream_window():
+    """Compras que se enriquecen juntas antes de emitirlas (acota la memoria por petición)."""
+    return max(1, getattr(settings, 'ORCHESTRATOR_STREAM_WINDOW', DEFAULT_STREAM_WINDOW))
+
+
+def ndjson_line(data):
+    return dumps(data) + b'\n'
+
+
+def streaming_headers(response):
+    # Evita que un proxy (nginx) acumule la respuesta completa antes de enviarla
+    response['X-Accel-Buffering'] = 'no'
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _error_line(e):
+    # El status HTTP ya se envió: el error se informa como última línea
+    logger.exception("Error durante la respuesta en streaming")
+    return ndjson_line({'error': 'Respuesta interrumpida', 'details': str(e)})
+
+
+def stream_ndjson(items):
+    """Serializa un iterable de documentos como líneas NDJSON."""
+    try:
+        for item in items:
+            yield ndjson_line(item)
+    except Exception as e:
+        yield _error_line(e)
+
+
+async def astream_ndjson(items):
+    """Versión para iterables asíncronos (views ASGI)."""
+    try:
+        async for item in items:
+            yield ndjson_line(item)
+    except Exception as e:
+        yield _error_line(e)
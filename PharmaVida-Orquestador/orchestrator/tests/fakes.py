@@ -0,0 +1,91 @@
+"""
+Microservicios en memoria para los tests.
+
+``MicroserviciosFalsos`` reemplaza a ``services._make_request`` (y a la
+versión asíncrona con ``acall``): responde como Usuarios/Compras, Productos y
+Recetas, guarda el stock y las compras, y permite inyectar errores por ruta.
+"""
+
+from urllib.parse import urlparse
+
+from orchestrator.utils import OrchestrationError
+
+USUARIO = {'id': 7, 'dni': '12345678'}
+
+
+class MicroserviciosFalsos:
+
+    def __init__(self, productos):
+        self.productos = {p['id']: dict(p) for p in productos}
+        self.compras = []
+        self.llamadas = []
+        # (método, ruta) -> lista de errores; cada llamada consume el primero
+        self.fallas = {}
+
+    def fallar(self, method, path, status_code, veces=1):
+        error = OrchestrationError(f"Error en microservicio ({status_code})", status_code=status_code)
+        self.fallas.setdefault((method, path), []).extend([error] * veces)
+
+    def llamadas_a(self, method, path):
+        return sum(1 for llamada in self.llamadas if llamada == (method, path))
+
+    def stock(self, producto_id):
+        return self.productos[producto_id]['stock']
+
+    def __call__(self, method, url, headers=None, json=None, params=None):
+        path = urlparse(url).path
+        self.llamadas.append((method, path))
+        pendientes = self.fallas.get((method, path))
+        if pendientes:
+            raise pendientes.pop(0)
+        return self._responder(method, path, json, params or {})
+
+    async def acall(self, method, url, headers=None, json=None, params=None):
+        return self(method, url, headers=headers, json=json, params=params)
+
+    def _responder(self, method, path, body, params):
+        if path == '/api/user/me':
+            return dict(USUARIO)
+        if path == '/api/productos/batch':
+            ids = [int(i) for i in params.get('ids', [])]
+            return {
+                'productos': [dict(self.productos[i]) for i in ids if i in self.productos],
+                'faltantes': [i for i in ids if i not in self.productos],
+            }
+        if path == '/api/productos/stock/descontar':
+            return self._descontar(body['items'])
+        if path == '/api/productos/stock/reponer':
+            for item in body['items']:
+                if item['producto_id'] in self.productos:
+                    self.productos[item['producto_id']]['stock'] += item['cantidad']
+            return {'items': []}
+        if path == '/api/recetas/filter':
+            return {'items': [], 'page': int(params.get('page', 1)), 'total': 0}
+        if path == '/api/compras' and method == 'POST':
+            compra = dict(body, id=len(self.compras) + 1)
+            self.compras.append(compra)
+            return dict(compra)
+        raise OrchestrationError(f"Ruta no simulada: {method} {path}", status_code=404)
+
+    def _descontar(self, items):
+        # Todo o nada, como Productos
+        demanda = {}
+        for item in items:
+            demanda[item['producto_id']] = demanda.get(item['producto_id'], 0) + item['cantidad']
+        insuficientes = [
+            {'producto_id': producto_id, 'solicitado': cantidad,
+             'disponible': self.productos.get(producto_id, {}).get('stock')}
+            for producto_id, cantidad in demanda.items()
+            if self.productos.get(producto_id, {}).get('stock', 0) < cantidad
+        ]
+        if insuficientes:
+            raise OrchestrationError(
+                "Error en microservicio", status_code=409,
+                details={'detail': {'mensaje': 'Stock insuficiente', 'items': insuficientes}}
+            )
+        for producto_id, cantidad in demanda.items():
+            self.productos[producto_id]['stock'] -= cantidad
+        return {'items': [
+            {'producto_id': producto_id, 'cantidad': cantidad, 'stock_restante': self.stock(producto_id)}
+            for producto_id, cantidad in demanda.items()
+        ]}
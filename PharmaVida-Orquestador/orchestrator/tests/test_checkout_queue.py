@@ -0,0 +1,124 @@
+import pytest
+
+from orchestrator import services
+from orchestrator.checkout_queue import (
+    COMPLETADO, DEFAULT_CHECKOUT, EN_PROCESO, FALLIDO, PEDIDO_INTERRUMPIDO, PENDIENTE,
+    CheckoutWorkerPool, SQLiteCheckoutQueue,
+)
+from orchestrator.tests.fakes import MicroserviciosFalsos
+
+AUTH = 'Bearer token-de-prueba'
+PAYLOAD = {'productos_compra': [1], 'cantidades_compra': [2], 'datos_adicionales': {}, 'max_concurrency': 1}
+VENCIDO = -1  # lease que ya venció al tomarlo, como si el worker hubiera muerto
+
+
+@pytest.fixture
+def config(tmp_path):
+    return dict(DEFAULT_CHECKOUT, SQLITE_PATH=tmp_path / 'cola.sqlite3', MAX_ATTEMPTS=2)
+
+
+@pytest.fixture
+def cola(config):
+    return SQLiteCheckoutQueue(config)
+
+
+def test_claim_toma_el_pedido_mas_antiguo(cola):
+    primero = cola.enqueue('dni:1', AUTH, PAYLOAD)
+    segundo = cola.enqueue('dni:1', AUTH, PAYLOAD)
+
+    pedido = cola.claim(lease=60)
+
+    assert pedido['id'] == primero
+    assert pedido['estado'] == EN_PROCESO
+    assert pedido['intentos'] == 1
+    assert pedido['payload'] == PAYLOAD
+    assert cola.claim(lease=60)['id'] == segundo
+    assert cola.claim(lease=60) is None
+    assert cola.pending_count() == 0
+
+
+def test_lease_vencido_vuelve_a_la_cola(cola):
+    pedido_id = cola.enqueue('dni:1', AUTH, PAYLOAD)
+    cola.claim(lease=VENCIDO)
+
+    pedido = cola.claim(lease=60)
+
+    assert pedido['id'] == pedido_id
+    assert pedido['intentos'] == 2
+    # El worker del primer intento ya no puede empezar a escribir
+    assert not cola.checkpoint(pedido_id, 1)
+    assert cola.checkpoint(pedido_id, 2)
+
+
+def test_pedido_interrumpido_tras_el_checkpoint_no_se_repite(cola):
+    pedido_id = cola.enqueue('dni:1', AUTH, PAYLOAD)
+    cola.claim(lease=VENCIDO)
+    assert cola.checkpoint(pedido_id, 1)
+
+    assert cola.claim(lease=60) is None
+
+    pedido = cola.get(pedido_id)
+    assert pedido['estado'] == FALLIDO
+    assert pedido['resultado'] == PEDIDO_INTERRUMPIDO
+    assert pedido['auth'] is None
+
+
+def test_pedido_que_agota_los_intentos_falla(cola):
+    pedido_id = cola.enqueue('dni:1', AUTH, PAYLOAD)
+    cola.claim(lease=VENCIDO)
+    cola.claim(lease=VENCIDO)
+
+    assert cola.claim(lease=60) is None
+    assert cola.get(pedido_id)['estado'] == FALLIDO
+
+
+def test_finish_borra_el_token_y_purge_los_terminados(cola):
+    terminado = cola.enqueue('dni:1', AUTH, PAYLOAD)
+    pendiente = cola.enqueue('dni:1', AUTH, PAYLOAD)
+    cola.claim(lease=60)
+
+    cola.finish(terminado, 201, {'id': 10})
+
+    pedido = cola.get(terminado)
+    assert (pedido['estado'], pedido['status_code'], pedido['resultado']) == (COMPLETADO, 201, {'id': 10})
+    assert pedido['auth'] is None
+    assert cola.counts() == {COMPLETADO: 1, PENDIENTE: 1}
+
+    cola.purge(older_than=pedido['actualizado'] + 1)
+
+    assert cola.get(terminado) is None
+    assert cola.get(pendiente) is not None
+
+
+@pytest.fixture
+def servicios(monkeypatch):
+    falsos = MicroserviciosFalsos([
+        {'id': 1, 'nombre': 'Paracetamol', 'precio': 2.5, 'stock': 10, 'requiere_receta': False},
+    ])
+    monkeypatch.setattr(services, '_make_request', falsos)
+    return falsos
+
+
+def test_worker_registra_la_compra(cola, config, servicios):
+    pedido_id = cola.enqueue('dni:1', AUTH, PAYLOAD)
+    pool = CheckoutWorkerPool(cola, workers=0, config=config)
+
+    pool.process(cola.claim(lease=60))
+
+    pedido = cola.get(pedido_id)
+    assert (pedido['estado'], pedido['status_code']) == (COMPLETADO, 201)
+    assert servicios.stock(1) == 8
+    assert len(servicios.compras) == 1
+
+
+def test_worker_con_el_pedido_reasignado_no_escribe(cola, config, servicios):
+    pedido_id = cola.enqueue('dni:1', AUTH, PAYLOAD)
+    viejo = cola.claim(lease=VENCIDO)
+    cola.claim(lease=60)
+    pool = CheckoutWorkerPool(cola, workers=0, config=config)
+
+    pool.process(viejo)
+
+    assert cola.get(pedido_id)['estado'] == EN_PROCESO
+    assert servicios.stock(1) == 10
+    assert servicios.compras == []
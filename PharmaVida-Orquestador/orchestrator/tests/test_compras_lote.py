@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from orchestrator import async_services, services
+from orchestrator.tests.fakes import MicroserviciosFalsos
+
+AUTH = 'Bearer token-de-prueba'
+
+
+@pytest.fixture(params=['sync', 'async'])
+def modo(request, monkeypatch):
+    """Corre cada test con los flujos síncronos y con los de ``async_services``."""
+    falsos = MicroserviciosFalsos([
+        {'id': 1, 'nombre': 'Paracetamol', 'precio': 2.5, 'stock': 3, 'requiere_receta': False},
+        {'id': 2, 'nombre': 'Amoxicilina', 'precio': 8.0, 'stock': 5, 'requiere_receta': True},
+    ])
+    monkeypatch.setattr(services, '_make_request', falsos)
+    monkeypatch.setattr(async_services, '_make_request', falsos.acall)
+
+    def registrar(carritos):
+        if request.param == 'sync':
+            return services.registrar_compras_lote(carritos, AUTH, max_concurrency=1)
+        return asyncio.run(async_services.registrar_compras_lote(carritos, AUTH, max_concurrency=1))
+
+    return falsos, registrar
+
+
+def test_carritos_se_validan_contra_el_stock_acumulado(modo):
+    falsos, registrar = modo
+    respuesta = registrar([
+        {'productos': [1], 'cantidades': [2]},
+        {'productos': [1, 1], 'cantidades': [1, 1]},
+        {'productos': [1], 'cantidades': [1]},
+    ])
+
+    assert [r['status_code'] for r in respuesta['resultados']] == [201, 400, 201]
+    assert respuesta['resumen'] == {'total': 3, 'registradas': 2, 'rechazadas': 1}
+    assert falsos.stock(1) == 0
+    assert falsos.llamadas_a('POST', '/api/productos/stock/descontar') == 1
+
+
+def test_carrito_sin_receta_validada_se_rechaza_sin_frenar_el_resto(modo):
+    falsos, registrar = modo
+    respuesta = registrar([
+        {'productos': [2], 'cantidades': [1]},
+        {'productos': [1], 'cantidades': [1]},
+    ])
+
+    rechazado, registrado = respuesta['resultados']
+    assert rechazado['details'] == {'productos_sin_receta': ['Amoxicilina']}
+    assert registrado['status_code'] == 201
+    assert falsos.stock(2) == 5
+    assert falsos.llamadas_a('GET', '/api/recetas/filter') == 1
+
+
+def test_compra_no_registrada_repone_su_stock(modo):
+    falsos, registrar = modo
+    falsos.fallar('POST', '/api/compras', 502)
+    respuesta = registrar([
+        {'productos': [1], 'cantidades': [2]},
+        {'productos': [1], 'cantidades': [1]},
+    ])
+
+    fallido, registrado = respuesta['resultados']
+    assert fallido['status_code'] == 502
+    assert fallido['stock_repuesto'] is True
+    assert registrado['status_code'] == 201
+    assert falsos.stock(1) == 2
+    assert len(falsos.compras) == 1
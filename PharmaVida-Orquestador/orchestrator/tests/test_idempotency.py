@@ -0,0 +1,151 @@
+import asyncio
+import json
+
+import pytest
+from django.test import Client
+
+from orchestrator import async_services, idempotency, services
+from orchestrator.tests.fakes import MicroserviciosFalsos
+from orchestrator.utils import OrchestrationError
+
+URL = '/api/orchestrator/compras'
+AUTH = {'HTTP_AUTHORIZATION': 'Bearer token-de-prueba'}
+CARRITO = {'productos': [1, 2], 'cantidades': [2, 1]}
+
+
+@pytest.fixture
+def servicios(monkeypatch):
+    falsos = MicroserviciosFalsos([
+        {'id': 1, 'nombre': 'Paracetamol', 'precio': 2.5, 'stock': 10, 'requiere_receta': False},
+        {'id': 2, 'nombre': 'Ibuprofeno', 'precio': 3.0, 'stock': 5, 'requiere_receta': False},
+    ])
+    monkeypatch.setattr(services, '_make_request', falsos)
+    monkeypatch.setattr(async_services, '_make_request', falsos.acall)
+    return falsos
+
+
+def comprar(body=CARRITO, clave='clave-1'):
+    extra = {'HTTP_IDEMPOTENCY_KEY': clave} if clave else {}
+    response = Client().post(URL, data=json.dumps(body), content_type='application/json', **AUTH, **extra)
+    return response, json.loads(response.content)
+
+
+def test_reintento_con_la_misma_clave_repite_la_respuesta(servicios):
+    primera, body = comprar()
+    segunda, body_repetido = comprar()
+
+    assert primera.status_code == segunda.status_code == 201
+    assert body_repetido == body
+    assert segunda['Idempotent-Replayed'] == 'true'
+    assert len(servicios.compras) == 1
+    assert servicios.llamadas_a('POST', '/api/productos/stock/descontar') == 1
+    assert servicios.stock(1) == 8
+
+
+def test_clave_reusada_con_otro_cuerpo_es_422(servicios):
+    comprar()
+    response, body = comprar({'productos': [1], 'cantidades': [1]})
+
+    assert response.status_code == 422
+    assert 'cuerpo distinto' in body['error']
+    assert len(servicios.compras) == 1
+
+
+def test_error_4xx_se_guarda(servicios):
+    primera, _ = comprar({'productos': [2], 'cantidades': [50]})
+    servicios.productos[2]['stock'] = 100
+    segunda, _ = comprar({'productos': [2], 'cantidades': [50]})
+
+    assert primera.status_code == segunda.status_code == 400
+    assert segunda['Idempotent-Replayed'] == 'true'
+
+
+def test_error_5xx_sin_escrituras_libera_la_clave(servicios):
+    servicios.fallar('GET', '/api/productos/batch', 503)
+    primera, _ = comprar()
+    segunda, _ = comprar()
+
+    assert primera.status_code == 503
+    assert segunda.status_code == 201
+    assert not segunda.has_header('Idempotent-Replayed')
+    assert len(servicios.compras) == 1
+
+
+def test_falla_de_la_compra_repone_el_stock_y_el_reintento_descuenta_una_vez(servicios):
+    servicios.fallar('POST', '/api/compras', 502)
+    primera, body = comprar()
+
+    assert primera.status_code == 502
+    assert body['details']['stock_repuesto'] is True
+    assert servicios.stock(1) == 10 and servicios.stock(2) == 5
+
+    segunda, _ = comprar()
+
+    assert segunda.status_code == 201
+    assert len(servicios.compras) == 1
+    assert servicios.stock(1) == 8 and servicios.stock(2) == 4
+
+
+def test_timeout_de_la_compra_se_guarda_sin_reponer_ni_repetir(servicios):
+    servicios.fallar('POST', '/api/compras', 504)
+    primera, body = comprar()
+    segunda, _ = comprar()
+
+    assert primera.status_code == segunda.status_code == 504
+    assert body['details'] == {'stock_repuesto': False, 'requiere_revision': True}
+    assert segunda['Idempotent-Replayed'] == 'true'
+    assert servicios.llamadas_a('POST', '/api/productos/stock/descontar') == 1
+    assert servicios.llamadas_a('POST', '/api/productos/stock/reponer') == 0
+    assert servicios.stock(1) == 8
+
+
+def test_falla_de_la_reposicion_queda_para_revision(servicios):
+    servicios.fallar('POST', '/api/compras', 500)
+    servicios.fallar('POST', '/api/productos/stock/reponer', 503)
+    primera, body = comprar()
+    segunda, _ = comprar()
+
+    assert primera.status_code == 500
+    assert body['details']['requiere_revision'] is True
+    assert segunda['Idempotent-Replayed'] == 'true'
+    assert servicios.llamadas_a('POST', '/api/productos/stock/descontar') == 1
+
+
+def test_version_asincrona_repone_el_stock(servicios):
+    servicios.fallar('POST', '/api/compras', 502)
+
+    with pytest.raises(OrchestrationError) as error:
+        asyncio.run(async_services.registrar_compra_orquestada([1, 2], [2, 1], 'Bearer token-de-prueba'))
+
+    assert error.value.details['stock_repuesto'] is True
+    assert servicios.stock(1) == 10 and servicios.stock(2) == 5
+
+
+def _store_memoria(max_entries):
+    config = dict(idempotency.DEFAULT_IDEMPOTENCY, MAX_ENTRIES=max_entries)
+    return idempotency.MemoryIdempotencyStore(config)
+
+
+def test_store_en_memoria_descarta_solo_registros_completados():
+    store = _store_memoria(2)
+    store.begin('a', 'f')
+    store.begin('b', 'f')
+    store.complete('b', 201, {})
+
+    assert store.begin('c', 'f') == (True, None)
+    assert store.get('a')['estado'] == idempotency.EN_CURSO
+    assert store.get('b') is None
+
+
+def test_store_en_memoria_lleno_de_registros_en_curso_rechaza_con_503():
+    store = _store_memoria(2)
+    store.begin('a', 'f')
+    store.begin('b', 'f')
+
+    with pytest.raises(OrchestrationError) as error:
+        store.begin('c', 'f')
+
+    assert error.value.status_code == 503
+    assert store.get('a') is not None and store.get('b') is not None
+    # Un duplicado de una clave en curso sigue viendo su registro
+    assert store.begin('a', 'f')[0] is False
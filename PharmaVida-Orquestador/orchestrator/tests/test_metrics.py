@@ -0,0 +1,17 @@
+from django.test import RequestFactory
+
+from orchestrator.async_views import AsyncRegistrarCompraOrquestadaView
+from orchestrator.middleware import MetricsMiddleware
+from orchestrator.views import RegistrarCompraOrquestadaView
+
+
+def _etiqueta(view_class):
+    request = RequestFactory().post('/api/orchestrator/compras')
+    middleware = MetricsMiddleware(lambda request: None)
+    middleware.process_view(request, view_class.as_view(), (), {})
+    return request._metrics_view
+
+
+def test_views_sincrono_y_asincrono_comparten_la_etiqueta():
+    assert _etiqueta(RegistrarCompraOrquestadaView) == 'RegistrarCompraOrquestadaView'
+    assert _etiqueta(AsyncRegistrarCompraOrquestadaView) == 'RegistrarCompraOrquestadaView'
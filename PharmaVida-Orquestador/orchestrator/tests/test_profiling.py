@@ -0,0 +1,37 @@
+import threading
+import time
+
+from orchestrator import profiling
+from orchestrator.concurrency import run_concurrently
+from orchestrator.profiling import Profile, Sampler
+
+
+def consultar_microservicio():
+    time.sleep(0.05)
+    return threading.get_ident()
+
+
+def test_el_sampler_muestrea_los_hilos_de_run_concurrently():
+    sampler = Sampler(interval=0.001, max_depth=64)
+    profile = Profile('peticion-1', threading.get_ident())
+    sampler.start(profile)
+    token = profiling._perfil_activo.set((sampler, profile))
+    try:
+        hilos = run_concurrently([consultar_microservicio, consultar_microservicio], max_concurrency=2)
+    finally:
+        profiling._perfil_activo.reset(token)
+        sampler.stop(profile)
+
+    assert threading.get_ident() not in hilos
+    assert any('consultar_microservicio' in pila for pila in profile.samples)
+    assert sampler._activos == {}
+
+
+def test_sin_perfil_activo_los_hilos_no_se_registran():
+    sampler = Sampler(interval=0.001, max_depth=64)
+    profile = Profile('peticion-2', threading.get_ident())
+
+    run_concurrently([consultar_microservicio, consultar_microservicio], max_concurrency=2)
+    sampler.agregar_hilo(profile, 12345)
+
+    assert sampler._activos == {}
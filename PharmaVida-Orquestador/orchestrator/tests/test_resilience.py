@@ -0,0 +1,231 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from orchestrator.resilience import (
+    CLOSED, DEFAULT_RESILIENCE, HALF_OPEN, OPEN, CircuitBreaker, Downstream, RetryBudget,
+)
+from orchestrator.utils import OrchestrationError
+
+
+class Reloj:
+
+    def __init__(self):
+        self.ahora = 0.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj():
+    return Reloj()
+
+
+@pytest.fixture
+def breaker(reloj):
+    return CircuitBreaker(failure_threshold=3, reset_timeout=10, half_open_max_calls=1, clock=reloj)
+
+
+def abrir(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_breaker_se_abre_tras_los_fallos_seguidos(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+    assert breaker.snapshot()['rejected'] == 1
+
+
+def test_breaker_pasa_a_half_open_y_limita_las_pruebas(breaker, reloj):
+    abrir(breaker)
+    reloj.ahora = 9.9
+    assert breaker.state == OPEN
+
+    reloj.ahora = 10
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+def test_prueba_exitosa_cierra_el_breaker(breaker, reloj):
+    abrir(breaker)
+    reloj.ahora = 10
+    assert breaker.allow_request()
+
+    breaker.record_success()
+
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()['consecutive_failures'] == 0
+
+
+def test_prueba_fallida_vuelve_a_abrir(breaker, reloj):
+    abrir(breaker)
+    reloj.ahora = 10
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 2
+    reloj.ahora = 19.9
+    assert breaker.state == OPEN
+    reloj.ahora = 20
+    assert breaker.state == HALF_OPEN
+
+
+def test_release_probe_devuelve_el_cupo_de_prueba(breaker, reloj):
+    abrir(breaker)
+    reloj.ahora = 10
+    assert breaker.allow_request()
+
+    breaker.release_probe()
+
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+def test_release_probe_no_afecta_al_breaker_cerrado(breaker):
+    breaker.release_probe()
+
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+
+def test_presupuesto_de_reintentos():
+    budget = RetryBudget(ratio=0.5, minimum=2)
+
+    assert budget.try_withdraw()
+    assert budget.try_withdraw()
+    assert not budget.try_withdraw()
+
+    budget.deposit()
+    assert not budget.try_withdraw()
+    budget.deposit()
+    assert budget.try_withdraw()
+
+    for _ in range(10):
+        budget.deposit()
+    assert budget.tokens == budget.maximum == 2
+
+
+def downstream(**config):
+    config = dict(DEFAULT_RESILIENCE, CONNECT_TIMEOUT=1, READ_TIMEOUT=1, BACKOFF_BASE=0, **config)
+    return Downstream('productos_y_ofertas', config)
+
+
+def respuestas(*status_codes):
+    """``send`` que devuelve en orden respuestas con esos status y cuenta las llamadas."""
+    pendientes = list(status_codes)
+
+    def send(timeout):
+        send.llamadas += 1
+        return SimpleNamespace(status_code=pendientes.pop(0))
+
+    send.llamadas = 0
+    return send
+
+
+def test_get_se_reintenta_ante_503():
+    servicio = downstream(RETRIES=2)
+    send = respuestas(503, 503, 200)
+
+    assert servicio.call('GET', send).status_code == 200
+    assert send.llamadas == 3
+    assert servicio.counters['retries'] == 2
+    assert servicio.breaker.state == CLOSED
+
+
+def test_post_no_se_reintenta():
+    servicio = downstream(RETRIES=2)
+    send = respuestas(503, 200)
+
+    assert servicio.call('POST', send).status_code == 503
+    assert send.llamadas == 1
+
+
+def test_sin_presupuesto_no_hay_reintentos():
+    servicio = downstream(RETRIES=2, RETRY_BUDGET_MIN=1, RETRY_BUDGET_RATIO=0)
+    servicio.retry_budget.try_withdraw()
+    send = respuestas(503, 200)
+
+    assert servicio.call('GET', send).status_code == 503
+    assert send.llamadas == 1
+
+
+def test_breaker_abierto_rechaza_sin_llamar():
+    servicio = downstream(RETRIES=0, BREAKER_FAILURE_THRESHOLD=2)
+    send = respuestas(500, 500, 200)
+    servicio.call('GET', send)
+    servicio.call('GET', send)
+
+    with pytest.raises(OrchestrationError) as error:
+        servicio.call('GET', send)
+
+    assert error.value.status_code == 503
+    assert error.value.details['circuit_breaker'] == OPEN
+    assert send.llamadas == 2
+
+
+def test_timeout_cuenta_como_fallo_y_se_propaga():
+    servicio = downstream(RETRIES=0, BREAKER_FAILURE_THRESHOLD=1)
+
+    def send(timeout):
+        raise requests.Timeout()
+
+    with pytest.raises(requests.Timeout):
+        servicio.call('GET', send)
+
+    assert servicio.counters['timeouts'] == 1
+    assert servicio.breaker.state == OPEN
+
+
+def test_bulkhead_lleno_libera_la_prueba_del_breaker(reloj):
+    servicio = downstream(RETRIES=0, BULKHEAD_MAX_CONCURRENT=1, BULKHEAD_TIMEOUT=0)
+    servicio.breaker = CircuitBreaker(1, 10, 1, clock=reloj)
+    servicio.breaker.record_failure()
+    reloj.ahora = 10
+    servicio.bulkhead.acquire()
+
+    with pytest.raises(OrchestrationError) as error:
+        servicio.call('GET', respuestas(200))
+
+    assert error.value.details['bulkhead'] == 1
+    servicio.bulkhead.release()
+    assert servicio.call('GET', respuestas(200)).status_code == 200
+    assert servicio.breaker.state == CLOSED
+
+
+def test_llamada_asincrona_cancelada_libera_la_prueba(reloj):
+    servicio = downstream(RETRIES=0)
+    servicio.breaker = CircuitBreaker(1, 10, 1, clock=reloj)
+    servicio.breaker.record_failure()
+    reloj.ahora = 10
+
+    async def colgada(timeout):
+        await asyncio.sleep(10)
+
+    async def cancelar():
+        tarea = asyncio.ensure_future(servicio.call_async('GET', colgada))
+        await asyncio.sleep(0.01)
+        tarea.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await tarea
+
+    asyncio.run(cancelar())
+
+    assert servicio.breaker.state == HALF_OPEN
+    assert servicio.breaker.allow_request()
+    assert servicio.bulkhead.in_flight == 0
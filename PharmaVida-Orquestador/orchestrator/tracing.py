@@ -0,0 +1,229 @@
+"""
+Trazas por petición: request id propagado, spans por paso y Server-Timing.
+
+Cada petición recibe un request id (el del header ``X-Request-ID`` si viene,
+o uno nuevo) que se reenvía a los microservicios. Los pasos de las
+orquestaciones se registran como spans; al terminar la petición se emiten
+como una línea de log estructurada y, opcionalmente, como header
+``Server-Timing``.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .jsoncodec import dumps
+
+logger = logging.getLogger('orchestrator.tracing')
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+PARENT_SPAN_HEADER = 'X-Parent-Span-ID'
+SERVER_TIMING_REQUEST_HEADER = 'X-Server-Timing'
+
+DEFAULT_TRACING = {
+    'SERVER_TIMING': False,
+    'LOG_SPANS': True,
+}
+
+_current_trace = contextvars.ContextVar('orchestrator_trace', default=None)
+_current_span = contextvars.ContextVar('orchestrator_span', default=None)
+
+
+def get_tracing_config():
+    """Combina la configuración por defecto con ``settings.ORCHESTRATOR_TRACING``."""
+    config = dict(DEFAULT_TRACING)
+    config.update(getattr(settings, 'ORCHESTRATOR_TRACING', {}) or {})
+    return config
+
+
+class Span:
+    __slots__ = ('span_id', 'parent_id', 'name', 'attrs', 'start', 'end')
+
+    def __init__(self, name, parent_id, attrs):
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end = None
+
+    @property
+    def duration_ms(self):
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    def as_dict(self, origin):
+        return {
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round(self.duration_ms, 3),
+            **({'attrs': self.attrs} if self.attrs else {}),
+        }
+
+
+class Trace:
+    """Spans de una petición; compartido entre los hilos de ``run_concurrently``."""
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.start = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def steps(self):
+        """
+        Duración por nombre de paso, tomando solo los spans de primer nivel.
+
+        Si un paso tiene varios spans en paralelo se reporta el tiempo de
+        reloj que cubren (del primer inicio al último fin), no la suma.
+        """
+        with self._lock:
+            spans = [s for s in self.spans if s.parent_id is None and s.end is not None]
+        pasos = {}
+        for s in spans:
+            inicio, fin = pasos.get(s.name, (s.start, s.end))
+            pasos[s.name] = (min(inicio, s.start), max(fin, s.end))
+        return sorted(
+            ((nombre, (fin - inicio) * 1000, inicio) for nombre, (inicio, fin) in pasos.items()),
+            key=lambda paso: paso[2]
+        )
+
+    def server_timing(self, total_ms):
+        partes = [f'{nombre};dur={dur:.1f}' for nombre, dur, _ in self.steps()]
+        partes.append(f'total;dur={total_ms:.1f}')
+        return ', '.join(partes)
+
+    def as_dict(self):
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            'request_id': self.request_id,
+            'spans': [s.as_dict(self.start) for s in spans],
+        }
+
+
+def start_trace(request_id=None):
+    trace = Trace(request_id or uuid.uuid4().hex)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def current_request_id():
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Registra un span en la traza de la petición actual.
+
+    Fuera de una petición (sin traza activa) no hace nada.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    s = Span(name, parent.span_id if parent else None, attrs)
+    token = _current_span.set(s)
+    try:
+        yield s
+    finally:
+        s.end = time.perf_counter()
+        _current_span.reset(token)
+        trace.add(s)
+
+
+@contextmanager
+def use_trace(trace):
+    """
+    Reactiva una traza fuera del middleware, por ejemplo mientras se generan
+    las partes de una respuesta en streaming (que se iteran después de que
+    el middleware ya cerró la traza).
+    """
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def propagation_headers():
+    """Headers que se reenvían a los microservicios para correlacionar la traza."""
+    trace = _current_trace.get()
+    if trace is None:
+        return {}
+    headers = {REQUEST_ID_HEADER: trace.request_id}
+    parent = _current_span.get()
+    if parent is not None:
+        headers[PARENT_SPAN_HEADER] = parent.span_id
+    return headers
+
+
+class TracingMiddleware:
+    """
+    Abre una traza por petición y la cierra al responder.
+
+    La respuesta siempre lleva ``X-Request-ID``. El header ``Server-Timing``
+    se agrega si ``ORCHESTRATOR_TRACING['SERVER_TIMING']`` está activo o si el
+    cliente lo pide con ``X-Server-Timing: 1``. Admite WSGI y ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        trace, token = start_trace(request.headers.get(REQUEST_ID_HEADER))
+        try:
+            response = self.get_response(request)
+        finally:
+            end_trace(token)
+        return self._finish(request, response, trace)
+
+    async def __acall__(self, request):
+        trace, token = start_trace(request.headers.get(REQUEST_ID_HEADER))
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_trace(token)
+        return self._finish(request, response, trace)
+
+    def _finish(self, request, response, trace):
+        total_ms = (time.perf_counter() - trace.start) * 1000
+        config = get_tracing_config()
+
+        response[REQUEST_ID_HEADER] = trace.request_id
+        if config['SERVER_TIMING'] or request.headers.get(SERVER_TIMING_REQUEST_HEADER) in ('1', 'true'):
+            response['Server-Timing'] = trace.server_timing(total_ms)
+        if config['LOG_SPANS'] and trace.spans:
+            data = trace.as_dict()
+            data.update(path=request.path, method=request.method, status=response.status_code,
+                        total_ms=round(total_ms, 3))
+            logger.info(dumps(data).decode('utf-8'))
+        return response
@@ -1,9 +1,17 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     RegistrarCompraOrquestadaView,
+    RegistrarComprasLoteView,
     ListarMisComprasDetalladasView,
+    EstadoCompraView,
     ValidarYActualizarRecetaView,
     HealthCheckView,
+    HttpPoolStatsView,
+    ProductCacheStatsView,
+    ResilienceStatsView,
+    AdmissionStatsView,
+    MetricsView,
 )
 
 from .swagger_view import (
@@ -11,13 +19,29 @@ from .swagger_view import (
     OpenAPIYAMLView
 )
 
+if settings.ORCHESTRATOR_ASYNC:
+    from .async_views import (  # noqa: F811
+        AsyncRegistrarCompraOrquestadaView as RegistrarCompraOrquestadaView,
+        AsyncRegistrarComprasLoteView as RegistrarComprasLoteView,
+        AsyncListarMisComprasDetalladasView as ListarMisComprasDetalladasView,
+        AsyncEstadoCompraView as EstadoCompraView,
+        AsyncValidarYActualizarRecetaView as ValidarYActualizarRecetaView,
+    )
+
 urlpatterns = [
     # Health check
     path('echo', HealthCheckView.as_view(), name='echo'),
+    path('stats/http', HttpPoolStatsView.as_view(), name='stats-http'),
+    path('stats/cache', ProductCacheStatsView.as_view(), name='stats-cache'),
+    path('stats/resilience', ResilienceStatsView.as_view(), name='stats-resilience'),
+    path('stats/admission', AdmissionStatsView.as_view(), name='stats-admission'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 
     # Compras orquestadas
     path('compras', RegistrarCompraOrquestadaView.as_view(), name='comprar'),
+    path('compras/lote', RegistrarComprasLoteView.as_view(), name='comprar-lote'),
     path('compras/me', ListarMisComprasDetalladasView.as_view(), name='mis-compras'),
+    path('compras/status/<str:pedido_id>', EstadoCompraView.as_view(), name='estado-compra'),
 
     # Recetas orquestadas
     path('recetas/validar/<str:receta_id>', ValidarYActualizarRecetaView.as_view(), name='validar-receta'),
@@ -27,6 +27,8 @@ def custom_exception_handler(exc, context):
 
     # Si es una OrchestrationError, personalizamos la respuesta
     if isinstance(exc, OrchestrationError):
+        from .metrics import record_orchestration_error
+        record_orchestration_error(exc)
         return Response(
             {
                 'error': exc.message,
@@ -2,14 +2,38 @@
 Views del orquestador para coordinar llamadas entre microservicios.
 """
 
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views import View
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from .services import (
+    leer_carritos,
     registrar_compra_orquestada,
+    registrar_compras_lote,
+    status_lote,
     listar_compras_usuario_detalladas,
+    iterar_compras_usuario_detalladas,
+    obtener_compras_usuario,
     validar_y_actualizar_estado_receta
 )
+from .admission import admission_stats
+from .cache import product_cache
+from .checkout_queue import (
+    encolar_compra,
+    estado_pedido,
+    headers_checkout,
+    pide_checkout_asincrono,
+    respuesta_encolado
+)
+from .concurrency import get_max_concurrency
+from . import metrics
+from .http_client import pool_stats
+from .idempotency import REPLAYED_HEADER, ejecutar_idempotente, get_idempotency_key
+from .pagination import get_detalle, get_paginacion, paginar
+from .resilience import resilience_stats
+from .streaming import NDJSON_CONTENT_TYPE, get_stream_window, pide_ndjson, stream_ndjson, streaming_headers
+from .tracing import current_request_id
 from .utils import OrchestrationError
 import logging
 
@@ -30,15 +54,45 @@ class RegistrarCompraOrquestadaView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            resultado = registrar_compra_orquestada(
-                productos_compra=productos,
-                cantidades_compra=cantidades,
-                auth_token=auth_header,
-                datos_adicionales=data.get('datos_adicionales', {})
-            )
-            return Response(resultado, status=status.HTTP_201_CREATED)
+            encolar = pide_checkout_asincrono(request)
+
+            def ejecutar():
+                try:
+                    if encolar:
+                        # Checkout asíncrono: la compra la ejecuta un worker
+                        pedido_id = encolar_compra(auth_header, {
+                            'productos_compra': productos,
+                            'cantidades_compra': cantidades,
+                            'datos_adicionales': data.get('datos_adicionales', {}),
+                            'max_concurrency': get_max_concurrency(request),
+                        }, request_id=current_request_id())
+                        return status.HTTP_202_ACCEPTED, respuesta_encolado(pedido_id)
+                    return status.HTTP_201_CREATED, registrar_compra_orquestada(
+                        productos_compra=productos,
+                        cantidades_compra=cantidades,
+                        auth_token=auth_header,
+                        datos_adicionales=data.get('datos_adicionales', {}),
+                        max_concurrency=get_max_concurrency(request)
+                    )
+                except OrchestrationError as e:
+                    # El error también es un resultado: con Idempotency-Key se guarda
+                    metrics.record_orchestration_error(e)
+                    logger.error(f"Error de orquestación: {str(e)}")
+                    return e.status_code, {'error': str(e), 'details': e.details}
+
+            clave = get_idempotency_key(request)
+            if clave is None:
+                status_code, body = ejecutar()
+                return headers_checkout(Response(body, status=status_code), body)
+
+            status_code, body, replayed = ejecutar_idempotente(clave, auth_header, request.path, data, ejecutar)
+            response = headers_checkout(Response(body, status=status_code), body)
+            if replayed:
+                response[REPLAYED_HEADER] = 'true'
+            return response
 
         except OrchestrationError as e:
+            metrics.record_orchestration_error(e)
             logger.error(f"Error de orquestación: {str(e)}")
             return Response(
                 {'error': str(e), 'details': getattr(e, 'details', None)},
@@ -51,6 +105,56 @@ class RegistrarCompraOrquestadaView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class RegistrarComprasLoteView(APIView):
+    """
+    POST /api/orchestrator/compras/lote
+
+    Registra varios carritos del mismo usuario: ``{"carritos": [{"productos",
+    "cantidades", "datos_adicionales"}, ...]}``. Responde un resultado por
+    carrito (201 si se registraron todos, 207 si alguno fue rechazado).
+    Acepta ``Idempotency-Key`` igual que ``compras``.
+    """
+
+    def post(self, request):
+        try:
+            auth_header = request.headers.get('Authorization')
+            data = request.data
+            carritos = leer_carritos(data)
+
+            def ejecutar():
+                try:
+                    body = registrar_compras_lote(carritos, auth_header, get_max_concurrency(request))
+                    return status_lote(body), body
+                except OrchestrationError as e:
+                    metrics.record_orchestration_error(e)
+                    logger.error(f"Error de orquestación: {str(e)}")
+                    return e.status_code, {'error': str(e), 'details': e.details}
+
+            clave = get_idempotency_key(request)
+            if clave is None:
+                status_code, body = ejecutar()
+                return Response(body, status=status_code)
+
+            status_code, body, replayed = ejecutar_idempotente(clave, auth_header, request.path, data, ejecutar)
+            response = Response(body, status=status_code)
+            if replayed:
+                response[REPLAYED_HEADER] = 'true'
+            return response
+
+        except OrchestrationError as e:
+            metrics.record_orchestration_error(e)
+            logger.error(f"Error de orquestación: {str(e)}")
+            return Response(
+                {'error': str(e), 'details': getattr(e, 'details', None)},
+                status=getattr(e, 'status_code', status.HTTP_400_BAD_REQUEST)
+            )
+        except Exception as e:
+            logger.exception("Error inesperado en registrar compras en lote")
+            return Response(
+                {'error': 'Error interno del servidor', 'details': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
 class ListarMisComprasDetalladasView(APIView):
     """
     GET /api/orchestrator/compras/me
@@ -59,8 +163,17 @@ class ListarMisComprasDetalladasView(APIView):
     - Información de productos
     - Ofertas aplicadas
     - Cantidades y precios
+
+    Query params opcionales: ``page`` y ``pagesize`` (solo se enriquece la
+    página pedida) y ``detalle=none|basic|full``. Con
+    ``Accept: application/x-ndjson`` o ``?formato=ndjson`` responde en
+    streaming, una compra enriquecida por línea.
     """
 
+    def perform_content_negotiation(self, request, force=False):
+        # NDJSON no pasa por los renderers de DRF: no debe responder 406
+        return super().perform_content_negotiation(request, force=force or pide_ndjson(request))
+
     def get(self, request):
         try:
             auth_header = request.headers.get('Authorization')
@@ -70,11 +183,36 @@ class ListarMisComprasDetalladasView(APIView):
                     status=status.HTTP_401_UNAUTHORIZED
                 )
 
-            resultado = listar_compras_usuario_detalladas(auth_header)
+            page, pagesize = get_paginacion(request)
+            detalle = get_detalle(request)
+
+            if pide_ndjson(request):
+                # Las compras se piden antes de responder para que un error
+                # del microservicio se devuelva con su status
+                compras, _ = paginar(obtener_compras_usuario(auth_header), page, pagesize)
+                return streaming_headers(StreamingHttpResponse(
+                    stream_ndjson(iterar_compras_usuario_detalladas(
+                        compras,
+                        auth_header,
+                        max_concurrency=get_max_concurrency(request),
+                        ventana=get_stream_window(),
+                        detalle=detalle
+                    )),
+                    content_type=NDJSON_CONTENT_TYPE
+                ))
+
+            resultado = listar_compras_usuario_detalladas(
+                auth_header,
+                max_concurrency=get_max_concurrency(request),
+                page=page,
+                pagesize=pagesize,
+                detalle=detalle
+            )
 
             return Response(resultado, status=status.HTTP_200_OK)
 
         except OrchestrationError as e:
+            metrics.record_orchestration_error(e)
             logger.error(f"Error de orquestación: {str(e)}")
             return Response(
                 {'error': str(e), 'details': e.details if hasattr(e, 'details') else None},
@@ -87,6 +225,37 @@ class ListarMisComprasDetalladasView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class EstadoCompraView(APIView):
+    """
+    GET /api/orchestrator/compras/status/{id}
+
+    Estado de una compra encolada con el checkout asíncrono: ``pendiente``,
+    ``en_proceso``, ``completado`` o ``fallido``; al terminar incluye el
+    status y el cuerpo que habría devuelto la compra síncrona.
+    """
+
+    def get(self, request, pedido_id):
+        try:
+            auth_header = request.headers.get('Authorization')
+            if not auth_header:
+                return Response(
+                    {'error': 'Token de autenticación requerido'},
+                    status=status.HTTP_401_UNAUTHORIZED
+                )
+            return Response(estado_pedido(pedido_id, auth_header), status=status.HTTP_200_OK)
+
+        except OrchestrationError as e:
+            return Response(
+                {'error': str(e), 'details': getattr(e, 'details', None)},
+                status=getattr(e, 'status_code', status.HTTP_400_BAD_REQUEST)
+            )
+        except Exception as e:
+            logger.error(f"Error inesperado en estado de compra: {str(e)}")
+            return Response(
+                {'error': 'Error interno del servidor', 'details': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
 class ValidarYActualizarRecetaView(APIView):
     """
     PUT /api/orchestrator/recetas/estado/{id}
@@ -115,12 +284,14 @@ class ValidarYActualizarRecetaView(APIView):
             resultado = validar_y_actualizar_estado_receta(
                 receta_id=receta_id,
                 nuevo_estado=nuevo_estado,
-                auth_token=auth_header
+                auth_token=auth_header,
+                max_concurrency=get_max_concurrency(request)
             )
 
             return Response(resultado, status=status.HTTP_200_OK)
 
         except OrchestrationError as e:
+            metrics.record_orchestration_error(e)
             logger.error(f"Error de orquestación: {str(e)}")
             return Response(
                 {'error': str(e), 'details': getattr(e, 'details', None)},
@@ -146,4 +317,67 @@ class HealthCheckView(APIView):
             'status': 'healthy',
             'service': 'orchestrator',
             'message': 'Backend orquestador operativo'
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+        }, status=status.HTTP_200_OK)
+
+
+class HttpPoolStatsView(APIView):
+    """
+    GET /api/orchestrator/stats/http
+
+    Contadores del pool de conexiones por microservicio (hits, misses y
+    tiempo de espera) para dimensionar ``ORCHESTRATOR_HTTP_CLIENT``.
+    """
+
+    def get(self, request):
+        return Response({'pools': pool_stats()}, status=status.HTTP_200_OK)
+
+
+class ProductCacheStatsView(APIView):
+    """
+    GET /api/orchestrator/stats/cache
+
+    Contadores de la caché de productos (hit ratio, expiraciones, desalojos
+    e invalidaciones).
+    """
+
+    def get(self, request):
+        return Response({'productos': product_cache.stats()}, status=status.HTTP_200_OK)
+
+
+class ResilienceStatsView(APIView):
+    """
+    GET /api/orchestrator/stats/resilience
+
+    Estado del circuit breaker, ocupación del bulkhead, reintentos y
+    timeouts por microservicio.
+    """
+
+    def get(self, request):
+        return Response({'servicios': resilience_stats()}, status=status.HTTP_200_OK)
+
+
+class AdmissionStatsView(APIView):
+    """
+    GET /api/orchestrator/stats/admission
+
+    Lugares ocupados, cola de espera y rechazos del control de admisión por
+    endpoint.
+    """
+
+    def get(self, request):
+        return Response({'endpoints': admission_stats()}, status=status.HTTP_200_OK)
+
+
+class MetricsView(View):
+    """
+    GET /api/orchestrator/metrics
+
+    Métricas en formato de texto de Prometheus: latencia por view y por
+    microservicio, peticiones en curso y errores de orquestación.
+    """
+
+    def get(self, request):
+        return HttpResponse(
+            metrics.registry.expose(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
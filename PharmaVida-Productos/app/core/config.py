@@ -14,6 +14,29 @@ class Settings:
     HOST: str = "0.0.0.0"
     PORT: int = int("8000")
 
+    # Máximo de ids aceptados por GET /api/productos/batch
+    PRODUCTOS_BATCH_MAX: int = int(os.getenv("PRODUCTOS_BATCH_MAX", "200"))
+
+    # Total de los listados paginados por defecto (?conteo=): "exact",
+    # "cached" (caché TTL por filtro, se invalida al escribir productos),
+    # "estimate" (estimación del planificador de MySQL) o "none"
+    CONTEO_DEFAULT: str = os.getenv("CONTEO_DEFAULT", "exact")
+    CONTEO_CACHE_TTL: float = float(os.getenv("CONTEO_CACHE_TTL", "30"))
+    CONTEO_CACHE_MAX: int = int(os.getenv("CONTEO_CACHE_MAX", "1024"))
+
+    # Búsqueda por nombre con el índice en memoria (app/productos/busqueda.py);
+    # con "false" se vuelve al LIKE '%texto%' en la base (y el autocompletado
+    # a LIKE 'texto%')
+    BUSQUEDA_INDICE: bool = os.getenv("BUSQUEDA_INDICE", "true").lower() in ("1", "true", "yes")
+    # Cada cuántos segundos se comprueba si otro proceso cambió nombres o tipos
+    BUSQUEDA_REFRESCO: float = float(os.getenv("BUSQUEDA_REFRESCO", "5"))
+    # Hasta cuántos ids del índice se filtran con IN en /consulta (más, LIKE)
+    BUSQUEDA_IN_MAX: int = int(os.getenv("BUSQUEDA_IN_MAX", "1000"))
+    AUTOCOMPLETAR_LIMITE_MAX: int = int(os.getenv("AUTOCOMPLETAR_LIMITE_MAX", "20"))
+
+    # Codec JSON de las respuestas: "auto" (orjson si está instalado) o "json"
+    JSON_CODEC: str = os.getenv("JSON_CODEC", "auto")
+
     # Configuración de base de datose
     @property
     def DATABASE_URL(self) -> str:
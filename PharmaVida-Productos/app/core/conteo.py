@@ -0,0 +1,119 @@
+"""
+Estrategias para el total de los listados paginados.
+
+- ``exact``: ``COUNT(*)`` sobre la consulta filtrada (lo de siempre)
+- ``cached``: el ``COUNT(*)`` se guarda por filtro normalizado durante
+  ``CONTEO_CACHE_TTL`` segundos; cualquier escritura de productos vacía la
+  caché. Es por proceso: cada worker tiene la suya
+- ``estimate``: filas estimadas por el planificador (``EXPLAIN`` de MySQL),
+  sin recorrer la tabla. En otras bases se usa ``cached``
+- ``none``: sin total
+
+``contar`` devuelve el total y la estrategia que efectivamente lo produjo
+(un ``cached`` que no estaba en caché se informa como ``exact``).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from app.core.config import settings
+
+EXACT = "exact"
+CACHED = "cached"
+ESTIMATE = "estimate"
+NONE = "none"
+ESTRATEGIAS = (EXACT, CACHED, ESTIMATE, NONE)
+
+_DIALECTOS_EXPLAIN = ("mysql", "mariadb")
+
+
+class ConteoCache:
+    """Caché LRU con TTL de totales por filtro."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Cambia con cada invalidación: un COUNT empezado antes de una
+        # escritura no se guarda después de ella
+        self.generacion = 0
+
+    def get(self, clave):
+        with self._lock:
+            entry = self._entries.get(clave)
+            if entry is None:
+                return None
+            total, expira = entry
+            if expira < time.monotonic():
+                del self._entries[clave]
+                return None
+            self._entries.move_to_end(clave)
+            return total
+
+    def set(self, clave, total, generacion):
+        with self._lock:
+            if generacion != self.generacion:
+                return
+            self._entries[clave] = (total, time.monotonic() + self.ttl)
+            self._entries.move_to_end(clave)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.generacion += 1
+
+
+conteo_cache = ConteoCache(settings.CONTEO_CACHE_TTL, settings.CONTEO_CACHE_MAX)
+
+
+def _estimar(query):
+    """Filas estimadas por ``EXPLAIN`` (``rows * filtered``), o None si no se puede."""
+    conexion = query.session.connection()
+    if conexion.dialect.name not in _DIALECTOS_EXPLAIN:
+        return None
+    compilado = query.statement.compile(dialect=conexion.dialect)
+    params = compilado.params
+    if compilado.positional:
+        # pymysql usa %s: los parámetros van en el orden en que aparecen
+        params = tuple(params[nombre] for nombre in compilado.positiontup)
+    fila = conexion.exec_driver_sql(f"EXPLAIN {compilado}", params).mappings().first()
+    if fila is None or fila.get("rows") is None:
+        return None
+    return int(fila["rows"] * float(fila.get("filtered") or 100) / 100)
+
+
+def _contar_cacheado(query, clave):
+    total = conteo_cache.get(clave)
+    if total is not None:
+        return total, CACHED
+    generacion = conteo_cache.generacion
+    total = query.count()
+    conteo_cache.set(clave, total, generacion)
+    return total, EXACT
+
+
+def contar(query, estrategia: str, clave):
+    """
+    Total de ``query`` según ``estrategia``.
+
+    Args:
+        clave: Filtro normalizado (por ejemplo ``("tipo", "analgesico")``)
+            con el que se guarda el total en caché
+
+    Returns:
+        tuple: ``(total, estrategia)``; ``total`` es None con ``none``
+    """
+    if estrategia == NONE:
+        return None, NONE
+    if estrategia == ESTIMATE:
+        total = _estimar(query)
+        if total is not None:
+            return total, ESTIMATE
+        return _contar_cacheado(query, clave)
+    if estrategia == CACHED:
+        return _contar_cacheado(query, clave)
+    return query.count(), EXACT
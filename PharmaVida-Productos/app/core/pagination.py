@@ -0,0 +1,106 @@
+"""
+Paginación por cursor (keyset) para los listados.
+
+El cursor ``after`` es opaco para el cliente: codifica la columna de orden,
+su valor y el id de la última fila devuelta. La página siguiente se pide con
+``WHERE (orden, id) > (valor, id)`` sobre un orden estable ``orden, id``, así
+que cuesta lo mismo la página 1 que la 10.000 (no hay OFFSET que descartar
+filas ni COUNT del total).
+"""
+
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from fastapi import HTTPException, status
+from sqlalchemy import Numeric, and_, or_
+
+
+def _cursor_invalido():
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor 'after' inválido")
+
+
+def codificar_cursor(orden: str, valor, id_: int) -> str:
+    if isinstance(valor, datetime):
+        valor = valor.isoformat()
+    data = json.dumps({"o": orden, "v": valor, "id": id_}, separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(after: str, orden: str):
+    """Devuelve ``(valor, id)`` del cursor; 400 si no es válido o es de otro orden."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(after + "=" * (-len(after) % 4)))
+        valor, id_ = data["v"], int(data["id"])
+        if data["o"] != orden:
+            raise ValueError(data["o"])
+    except (ValueError, TypeError, KeyError):
+        raise _cursor_invalido()
+    return valor, id_
+
+
+def _valor_columna(columna, valor):
+    if valor is None:
+        return valor
+    # Las fechas viajan como ISO 8601 en el cursor
+    if columna.type.python_type is datetime:
+        try:
+            return datetime.fromisoformat(valor)
+        except (TypeError, ValueError):
+            raise _cursor_invalido()
+    # Los DECIMAL se comparan con el valor exacto, no con su float
+    if isinstance(columna.type, Numeric):
+        try:
+            return Decimal(str(valor))
+        except InvalidOperation:
+            raise _cursor_invalido()
+    return valor
+
+
+def criterios_orden(modelo, orden: str = "id", descendente: bool = False):
+    """ORDER BY estable: ``orden`` y ``id`` para desempatar."""
+    id_col = modelo.id
+    columna = getattr(modelo, orden)
+    if columna is id_col:
+        return [id_col.desc() if descendente else id_col.asc()]
+    return [columna.desc(), id_col.desc()] if descendente else [columna.asc(), id_col.asc()]
+
+
+def paginar_keyset(query, modelo, after: str, pagesize: int, orden: str = "id", descendente: bool = False):
+    """
+    Página de ``query`` ordenada por ``orden`` (y ``id`` para desempatar).
+
+    Args:
+        after: Cursor devuelto por la página anterior; vacío para la primera
+        orden: Nombre de la columna de ``modelo`` por la que se ordena
+
+    Returns:
+        tuple: ``(items, has_more, siguiente)`` con ``siguiente`` el cursor de
+        la página siguiente o None si es la última
+    """
+    id_col = modelo.id
+    columna = getattr(modelo, orden)
+    # El cursor guarda también la dirección: no sirve para el orden inverso
+    clave_orden = f"-{orden}" if descendente else orden
+    if after:
+        valor, ultimo_id = decodificar_cursor(after, clave_orden)
+        valor = _valor_columna(columna, valor)
+        mayor = (lambda a, b: a < b) if descendente else (lambda a, b: a > b)
+        if columna is id_col:
+            query = query.filter(mayor(id_col, ultimo_id))
+        else:
+            query = query.filter(or_(
+                mayor(columna, valor),
+                and_(columna == valor, mayor(id_col, ultimo_id))
+            ))
+
+    # Una fila de más dice si hay página siguiente sin contar el total
+    items = query.order_by(*criterios_orden(modelo, orden, descendente)).limit(pagesize + 1).all()
+    has_more = len(items) > pagesize
+    items = items[:pagesize]
+    siguiente = None
+    if has_more:
+        ultimo = items[-1]
+        siguiente = codificar_cursor(clave_orden, getattr(ultimo, orden), ultimo.id)
+    return items, has_more, siguiente
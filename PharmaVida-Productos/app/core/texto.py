@@ -0,0 +1,9 @@
+import unicodedata
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sin tildes ni signos y con espacios simples."""
+    sin_tildes = unicodedata.normalize("NFKD", texto or "")
+    sin_tildes = "".join(c for c in sin_tildes if not unicodedata.combining(c))
+    limpio = "".join(c if c.isalnum() else " " for c in sin_tildes.lower())
+    return " ".join(limpio.split())
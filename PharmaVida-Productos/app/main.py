@@ -1,7 +1,10 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.core.database import Base, engine, wait_for_db
+from app.core.config import settings
+from app.core.database import Base, SessionLocal, engine, wait_for_db
+from app.core.jsoncodec import FastJSONResponse
 from app.productos.controller import router as productos_router
+from app.productos.esquema import actualizar_esquema
 from app.ofertas.controller import router as ofertas_router
 import logging
 
@@ -18,6 +21,13 @@ if not wait_for_db():
 # Crear las tablas
 logger.info("Creando tablas en la base de datos...")
 Base.metadata.create_all(bind=engine)
+actualizar_esquema(engine)
+
+# Índice de nombres para búsqueda y autocompletado
+if settings.BUSQUEDA_INDICE:
+    from app.productos.busqueda import indice_nombres
+    with SessionLocal() as db:
+        indice_nombres.reconstruir(db)
 
 # Crear la aplicación FastAPI
 app = FastAPI(
@@ -25,7 +35,8 @@ app = FastAPI(
     description="Microservicio para gestionar productos de farmacia",
     version="1.0.0",
     docs_url="/api/productos/docs",      # Swagger UI ahora está en /api/docs
-    redoc_url="/api/productos/redoc"     # ReDoc ahora está en /api/redoc
+    redoc_url="/api/productos/redoc",    # ReDoc ahora está en /api/redoc
+    default_response_class=FastJSONResponse
 )
 
 app.add_middleware(
@@ -51,5 +62,4 @@ def echo_get(message: str = "OK"):
 
 if __name__ == "__main__":
     import uvicorn
-    from app.core.config import settings
     uvicorn.run(app, host=settings.HOST, port=settings.PORT)
\ No newline at end of file
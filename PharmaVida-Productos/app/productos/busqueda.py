@@ -0,0 +1,240 @@
+"""
+Índice en memoria de nombres de productos para búsqueda y autocompletado.
+
+``nombre.ilike('%texto%')`` no puede usar el índice de ``nombre`` (el
+comodín inicial obliga a recorrer la tabla). Este índice guarda, por
+proceso, los nombres normalizados (minúsculas y sin tildes: "acido" encuentra
+"Ácido fólico") con:
+
+- trigramas -> ids: una búsqueda de 3 o más caracteres solo verifica los
+  productos que tienen todos los trigramas del texto
+- palabras ordenadas: prefijos cortos por búsqueda binaria (autocompletado)
+
+Se construye al arrancar y se actualiza con las altas, cambios y bajas de este
+proceso. Si otro proceso cambió nombres o tipos (la versión de
+``productos_nombres_version`` avanzó más que las escrituras propias; se
+comprueba cada ``BUSQUEDA_REFRESCO`` segundos), se reconstruye en un hilo
+aparte y se reemplaza de una vez. Los cambios de stock o precio no lo tocan.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.texto import normalizar
+from app.productos.domain import ProductoDB
+from app.productos.repository import get_version_nombres
+
+logger = logging.getLogger(__name__)
+
+N = 3
+
+# Relevancia del autocompletado (menor es mejor)
+NOMBRE_EXACTO = 0
+PREFIJO_NOMBRE = 1
+PREFIJO_PALABRA = 2
+SUBCADENA = 3
+
+
+def _ngramas(texto: str):
+    return {texto[i:i + N] for i in range(len(texto) - N + 1)}
+
+
+def _relevancia(normalizado: str, q: str):
+    if normalizado == q:
+        return NOMBRE_EXACTO
+    if normalizado.startswith(q):
+        return PREFIJO_NOMBRE
+    if f" {q}" in f" {normalizado}":
+        return PREFIJO_PALABRA
+    if q in normalizado:
+        return SUBCADENA
+    return None
+
+
+class IndiceNombres:
+
+    def __init__(self, refresco: float):
+        self.refresco = refresco
+        self._lock = threading.RLock()
+        self._reconstruyendo = threading.RLock()
+        self._productos = {}                 # id -> (nombre, tipo, normalizado)
+        self._ngramas = defaultdict(set)     # trigrama -> ids
+        self._palabras = []                  # (palabra, id) ordenadas
+        self.listo = False
+        # Versión de los nombres en la base que refleja el índice, y cuántas
+        # escrituras de este proceso ya aplicadas la adelantaron desde entonces
+        self.version = None
+        self._locales = 0
+        self._en_segundo_plano = False
+        self._verificado = 0.0
+
+    # -- mantenimiento -------------------------------------------------------
+
+    @staticmethod
+    def _construir(filas):
+        """Estructuras del índice para ``filas`` (id, nombre, tipo); las palabras se ordenan una sola vez."""
+        productos, ngramas, palabras = {}, defaultdict(set), []
+        for producto_id, nombre, tipo in filas:
+            normalizado = normalizar(nombre)
+            productos[producto_id] = (nombre, tipo, normalizado)
+            for grama in _ngramas(normalizado):
+                ngramas[grama].add(producto_id)
+            palabras.extend((palabra, producto_id) for palabra in set(normalizado.split()))
+        palabras.sort()
+        return productos, ngramas, palabras
+
+    def _agregar(self, producto_id, nombre, tipo):
+        normalizado = normalizar(nombre)
+        self._productos[producto_id] = (nombre, tipo, normalizado)
+        for grama in _ngramas(normalizado):
+            self._ngramas[grama].add(producto_id)
+        for palabra in set(normalizado.split()):
+            bisect.insort(self._palabras, (palabra, producto_id))
+
+    def _quitar(self, producto_id):
+        anterior = self._productos.pop(producto_id, None)
+        if anterior is None:
+            return
+        normalizado = anterior[2]
+        for grama in _ngramas(normalizado):
+            ids = self._ngramas.get(grama)
+            if ids is not None:
+                ids.discard(producto_id)
+                if not ids:
+                    del self._ngramas[grama]
+        for palabra in set(normalizado.split()):
+            i = bisect.bisect_left(self._palabras, (palabra, producto_id))
+            if i < len(self._palabras) and self._palabras[i] == (palabra, producto_id):
+                del self._palabras[i]
+
+    def actualizar(self, producto):
+        """Alta o cambio de nombre o tipo de un producto escrito por este proceso."""
+        with self._lock:
+            self._quitar(producto.id)
+            self._agregar(producto.id, producto.nombre, producto.tipo)
+            self._locales += 1
+
+    def quitar(self, producto_id):
+        with self._lock:
+            self._quitar(producto_id)
+            self._locales += 1
+
+    def reconstruir(self, db: Session):
+        """Vuelve a leer todos los nombres de la base y reemplaza el índice de una vez."""
+        with self._reconstruyendo:
+            # La versión se lee antes que las filas: un cambio que llegue en el
+            # medio deja la versión atrasada y la próxima comprobación reconstruye
+            version = get_version_nombres(db)
+            filas = db.query(ProductoDB.id, ProductoDB.nombre, ProductoDB.tipo).all()
+            productos, ngramas, palabras = self._construir(filas)
+            with self._lock:
+                self._productos, self._ngramas, self._palabras = productos, ngramas, palabras
+                self.version = version
+                self._locales = 0
+                self.listo = True
+                self._verificado = time.monotonic()
+        logger.info("Índice de nombres reconstruido: %d productos", len(filas))
+
+    def _reconstruir_en_segundo_plano(self):
+        with self._lock:
+            if self._en_segundo_plano:
+                return
+            self._en_segundo_plano = True
+
+        def reconstruir():
+            try:
+                with SessionLocal() as db:
+                    self.reconstruir(db)
+            except Exception:
+                logger.exception("No se pudo reconstruir el índice de nombres")
+            finally:
+                with self._lock:
+                    self._en_segundo_plano = False
+
+        threading.Thread(target=reconstruir, name="indice-nombres", daemon=True).start()
+
+    def asegurar(self, db: Session):
+        """
+        Construye el índice si todavía no existe. Después, cada ``refresco``
+        segundos compara la versión de los nombres en la base (una lectura por
+        clave primaria) y, si otro proceso los cambió, lo reconstruye en un
+        hilo aparte: mientras tanto las búsquedas usan el índice actual.
+        """
+        if not self.listo:
+            with self._reconstruyendo:
+                if not self.listo:
+                    self.reconstruir(db)
+            return
+        ahora = time.monotonic()
+        if ahora - self._verificado < self.refresco:
+            return
+        self._verificado = ahora
+        version = get_version_nombres(db)
+        with self._lock:
+            if version == self.version + self._locales:
+                # Solo cambió por escrituras de este proceso, ya aplicadas
+                self.version, self._locales = version, 0
+                return
+        self._reconstruir_en_segundo_plano()
+
+    # -- consultas -----------------------------------------------------------
+
+    def _candidatos(self, q):
+        if len(q) < N:
+            return list(self._productos)
+        conjuntos = sorted((self._ngramas.get(grama, set()) for grama in _ngramas(q)), key=len)
+        return set.intersection(*conjuntos) if conjuntos else set()
+
+    def buscar(self, texto: str):
+        """Ids (ascendentes) cuyo nombre contiene ``texto``, sin distinguir mayúsculas ni tildes."""
+        q = normalizar(texto)
+        with self._lock:
+            if not q:
+                return sorted(self._productos)
+            return sorted(
+                producto_id for producto_id in self._candidatos(q)
+                if q in self._productos[producto_id][2]
+            )
+
+    def _por_prefijo(self, q):
+        i = bisect.bisect_left(self._palabras, (q,))
+        ids = set()
+        while i < len(self._palabras) and self._palabras[i][0].startswith(q):
+            ids.add(self._palabras[i][1])
+            i += 1
+        return ids
+
+    def autocompletar(self, texto: str, limite: int):
+        """
+        Sugerencias para ``texto`` ordenadas por relevancia: nombre igual,
+        nombre que empieza con el texto, palabra que empieza con el texto y,
+        desde 3 caracteres, el texto en cualquier parte. A igual relevancia,
+        primero los nombres más cortos.
+        """
+        q = normalizar(texto)
+        if not q:
+            return []
+        with self._lock:
+            # Con menos de 3 caracteres solo cuentan los comienzos de palabra
+            candidatos = self._candidatos(q) if len(q) >= N else self._por_prefijo(q.split()[0])
+            puntuados = []
+            for producto_id in candidatos:
+                nombre, tipo, normalizado = self._productos[producto_id]
+                relevancia = _relevancia(normalizado, q)
+                if relevancia is not None:
+                    puntuados.append((relevancia, len(normalizado), normalizado, producto_id, nombre, tipo))
+        puntuados.sort()
+        return [
+            {"id": producto_id, "nombre": nombre, "tipo": tipo}
+            for _, _, _, producto_id, nombre, tipo in puntuados[:limite]
+        ]
+
+
+indice_nombres = IndiceNombres(settings.BUSQUEDA_REFRESCO)
@@ -1,12 +1,20 @@
 from fastapi import APIRouter, Depends, status, Query
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.productos.dto import ProductosPaginadosResponse
+from typing import List, Optional, Union
+from app.productos.dto import ProductosPaginadosResponse, ProductosCursorResponse, ProductosBatchResponse
+from app.productos.dto import AutocompletarResponse, FacetasResponse
+from app.productos.dto import ConsultaCursorResponse, ConsultaPaginadaResponse, producto_a_dict_campos
+from app.productos.dto import DescontarStockRequest, DescontarStockResponse
 from app.productos.dto import (
-    ProductoCreate, ProductoUpdate, ProductoResponse
+    ProductoCreate, ProductoUpdate, ProductoResponse, producto_a_dict
 )
+from app.core.conteo import ESTRATEGIAS
+from app.core.jsoncodec import FastJSONResponse
 from app.productos.service import (
-    crear_producto, obtener_producto,
+    crear_producto, obtener_producto, obtener_productos_por_ids,
+    autocompletar_productos, obtener_facetas, consultar_productos,
+    descontar_stock_productos, reponer_stock_productos,
     actualizar_producto, eliminar_producto,
     obtener_productos_paginados,
     obtener_productos_por_receta_paginados,
@@ -20,88 +28,143 @@ router = APIRouter(
     tags=["Productos"]
 )
 
-@router.get("/paged", response_model=ProductosPaginadosResponse)
+
+# Con ?after= la página es por cursor: sin total, con has_more y el cursor
+# de la siguiente (?after= vacío pide la primera)
+ListadoResponse = Union[ProductosPaginadosResponse, ProductosCursorResponse]
+AFTER_DESCRIPTION = "Cursor de la página anterior (vacío para la primera): activa la paginación por cursor"
+CONTEO_DESCRIPTION = (
+    "Cómo calcular el total: exact, cached (caché por filtro), estimate (estimación de MySQL) "
+    "o none. Por defecto CONTEO_DEFAULT"
+)
+CONTEO_PATTERN = "^(" + "|".join(ESTRATEGIAS) + ")$"
+
+
+def _pagina(pagina):
+    # Los listados se serializan sin pasar por modelos Pydantic fila por fila;
+    # response_model sigue documentando el esquema
+    pagina["productos"] = [producto_a_dict(p) for p in pagina["productos"]]
+    return FastJSONResponse(pagina)
+
+@router.get("/paged", response_model=ListadoResponse)
 def listar_paginado(
     page: int = Query(1, ge=1),
     pagesize: int = Query(25, gt=0),
+    after: Optional[str] = Query(None, description=AFTER_DESCRIPTION),
+    conteo: Optional[str] = Query(None, pattern=CONTEO_PATTERN, description=CONTEO_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
-    total, productos = obtener_productos_paginados(db, page, pagesize)
-    return ProductosPaginadosResponse(
-        total=total,
-        page=page,
-        pagesize=pagesize,
-        productos=[ProductoResponse.from_orm(p) for p in productos]
-    )
+    return _pagina(obtener_productos_paginados(db, page, pagesize, after, conteo))
 
-@router.get("/nombre", response_model=ProductosPaginadosResponse)
+@router.get("/nombre", response_model=ListadoResponse)
 def buscar_por_nombre(
     nombre: str = Query(..., description="Texto a buscar en el nombre del producto"),
     page: int = Query(1, ge=1),
     pagesize: int = Query(25, gt=0),
+    after: Optional[str] = Query(None, description=AFTER_DESCRIPTION),
+    conteo: Optional[str] = Query(None, pattern=CONTEO_PATTERN, description=CONTEO_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
-    total, productos = obtener_productos_por_nombre_paginados(db, nombre, page, pagesize)
-    return ProductosPaginadosResponse(
-        total=total,
-        page=page,
-        pagesize=pagesize,
-        productos=[ProductoResponse.from_orm(p) for p in productos]
-    )
+    return _pagina(obtener_productos_por_nombre_paginados(db, nombre, page, pagesize, after, conteo))
+
+@router.get("/autocompletar", response_model=AutocompletarResponse)
+def autocompletar(
+    q: str = Query(..., min_length=1, description="Texto escrito hasta ahora (sin distinguir tildes)"),
+    limit: int = Query(10, ge=1, description="Máximo de sugerencias (tope AUTOCOMPLETAR_LIMITE_MAX)"),
+    db: Session = Depends(get_db)
+):
+    # Con BUSQUEDA_INDICE se responde desde el índice en memoria, sin leer la base
+    return FastJSONResponse({"sugerencias": autocompletar_productos(db, q, limit)})
 
-@router.get("/receta", response_model=ProductosPaginadosResponse)
+@router.get("/receta", response_model=ListadoResponse)
 def listar_por_receta(
     requiere_receta: bool = Query(..., description="True para productos que requieren receta, False para los que no"),
     page: int = Query(1, ge=1),
     pagesize: int = Query(25, gt=0),
+    after: Optional[str] = Query(None, description=AFTER_DESCRIPTION),
+    conteo: Optional[str] = Query(None, pattern=CONTEO_PATTERN, description=CONTEO_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
-    total, productos = obtener_productos_por_receta_paginados(db, requiere_receta, page, pagesize)
-    return ProductosPaginadosResponse(
-        total=total,
-        page=page,
-        pagesize=pagesize,
-        productos=[ProductoResponse.from_orm(p) for p in productos]
-    )
+    return _pagina(obtener_productos_por_receta_paginados(db, requiere_receta, page, pagesize, after, conteo))
 
-@router.get("/tipo", response_model=ProductosPaginadosResponse)
+@router.get("/tipo", response_model=ListadoResponse)
 def listar_por_tipo(
-    tipo: str = Query(..., description="Tipo de producto"),
+    tipo: str = Query(..., description="Tipo de producto (sin distinguir mayúsculas ni tildes)"),
+    parcial: bool = Query(False, description="True para buscar el texto dentro del tipo (sin índice)"),
     page: int = Query(1, ge=1),
     pagesize: int = Query(25, gt=0),
+    after: Optional[str] = Query(None, description=AFTER_DESCRIPTION),
+    conteo: Optional[str] = Query(None, pattern=CONTEO_PATTERN, description=CONTEO_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
-    total, productos = obtener_productos_por_tipo_paginados(db, tipo, page, pagesize)
-    return ProductosPaginadosResponse(
-        total=total,
-        page=page,
-        pagesize=pagesize,
-        productos=[ProductoResponse.from_orm(p) for p in productos]
+    return _pagina(obtener_productos_por_tipo_paginados(db, tipo, page, pagesize, after, conteo, parcial))
+
+@router.get("/consulta", response_model=Union[ConsultaPaginadaResponse, ConsultaCursorResponse])
+def consultar(
+    tipo: Optional[str] = Query(None, description="Tipo exacto (sin distinguir mayúsculas ni tildes)"),
+    requiere_receta: Optional[bool] = Query(None),
+    stock_min: Optional[int] = Query(None, ge=0),
+    stock_max: Optional[int] = Query(None, ge=0),
+    precio_min: Optional[float] = Query(None, ge=0),
+    precio_max: Optional[float] = Query(None, ge=0),
+    nombre: Optional[str] = Query(None, description="Texto contenido en el nombre"),
+    orden: str = Query("id", description="id, nombre, precio, stock, fecha_creacion o fecha_actualizacion; -campo para descendente"),
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por coma (ej. id,nombre,precio)"),
+    page: int = Query(1, ge=1),
+    pagesize: int = Query(25, gt=0),
+    after: Optional[str] = Query(None, description=AFTER_DESCRIPTION),
+    conteo: Optional[str] = Query(None, pattern=CONTEO_PATTERN, description=CONTEO_DESCRIPTION),
+    db: Session = Depends(get_db)
+):
+    pagina, campos = consultar_productos(
+        db, tipo, requiere_receta, stock_min, stock_max, precio_min, precio_max, nombre,
+        orden, fields, page, pagesize, after, conteo
     )
+    pagina["productos"] = [producto_a_dict_campos(p, campos) for p in pagina["productos"]]
+    return FastJSONResponse(pagina)
+
+@router.get("/facetas", response_model=FacetasResponse)
+def facetas(db: Session = Depends(get_db)):
+    return FastJSONResponse(obtener_facetas(db))
 
-@router.get("/stock-bajo", response_model=ProductosPaginadosResponse)
+@router.get("/stock-bajo", response_model=ListadoResponse)
 def listar_stock_bajo(
     minimo: int = Query(10, ge=0, description="Stock mínimo"),
     page: int = Query(1, ge=1),
     pagesize: int = Query(25, gt=0),
+    after: Optional[str] = Query(None, description=AFTER_DESCRIPTION),
+    conteo: Optional[str] = Query(None, pattern=CONTEO_PATTERN, description=CONTEO_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
-    total, productos = obtener_productos_stock_bajo_paginados(db, minimo, page, pagesize)
-    return ProductosPaginadosResponse(
-        total=total,
-        page=page,
-        pagesize=pagesize,
-        productos=[ProductoResponse.from_orm(p) for p in productos]
-    )
+    return _pagina(obtener_productos_stock_bajo_paginados(db, minimo, page, pagesize, after, conteo))
+
+@router.get("/batch", response_model=ProductosBatchResponse)
+def obtener_lote(
+    ids: List[int] = Query(..., description="Ids de productos (?ids=1&ids=2)"),
+    db: Session = Depends(get_db)
+):
+    productos, faltantes = obtener_productos_por_ids(db, ids)
+    return FastJSONResponse({
+        "productos": [producto_a_dict(p) for p in productos],
+        "faltantes": faltantes,
+    })
 
 @router.get("/{producto_id}", response_model=ProductoResponse)
 def obtener(producto_id: int, db: Session = Depends(get_db)):
-    return ProductoResponse.from_orm(obtener_producto(db, producto_id))
+    return FastJSONResponse(producto_a_dict(obtener_producto(db, producto_id)))
 
 @router.post("", response_model=ProductoResponse, status_code=status.HTTP_201_CREATED)
 def crear(producto: ProductoCreate, db: Session = Depends(get_db)):
     return ProductoResponse.from_orm(crear_producto(db, producto))
 
+@router.post("/stock/descontar", response_model=DescontarStockResponse)
+def descontar_stock(request: DescontarStockRequest, db: Session = Depends(get_db)):
+    return DescontarStockResponse(items=descontar_stock_productos(db, request.items))
+
+@router.post("/stock/reponer", response_model=DescontarStockResponse)
+def reponer_stock(request: DescontarStockRequest, db: Session = Depends(get_db)):
+    return DescontarStockResponse(items=reponer_stock_productos(db, request.items))
+
 @router.put("/{producto_id}", response_model=ProductoResponse)
 def actualizar(producto_id: int, producto_update: ProductoUpdate, db: Session = Depends(get_db)):
     return ProductoResponse.from_orm(actualizar_producto(db, producto_id, producto_update))
@@ -1,13 +1,50 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, func
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, Boolean, Index, func
+from sqlalchemy.orm import validates
 from app.core.database import Base
+from app.core.texto import normalizar
 
 class ProductoDB(Base):
     __tablename__ = "productos"
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     nombre = Column(String(255), nullable=False, index=True)
     tipo = Column(String(100), nullable=False)
-    precio = Column(Float, nullable=False)
+    # Tipo normalizado (minúsculas, sin tildes): "Analgésico" y "analgesico "
+    # son la misma categoría. Se calcula al asignar ``tipo``
+    tipo_clave = Column(String(100), nullable=True)
+    # DECIMAL exacto: con FLOAT (precisión simple en MySQL) el valor leído no
+    # es igual al guardado y el cursor de los listados por precio no funciona.
+    # Se lee como float, igual que antes
+    precio = Column(Numeric(10, 2, asdecimal=False), nullable=False)
     stock = Column(Integer, nullable=False, default=0)
     requiere_receta = Column(Boolean, nullable=False, default=False)
     fecha_creacion = Column(DateTime, server_default=func.now())
     fecha_actualizacion = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    # Los listados ordenan por id: con la igualdad del filtro primero, el
+    # índice ya devuelve las filas en orden de id (OFFSET y cursor sin filesort)
+    __table_args__ = (
+        Index("ix_productos_tipo_clave_id", "tipo_clave", "id"),
+        Index("ix_productos_receta_id", "requiere_receta", "id"),
+        Index("ix_productos_stock", "stock"),
+        # Facetas por tipo y receta: el GROUP BY se resuelve solo con el índice
+        Index("ix_productos_tipo_clave_receta", "tipo_clave", "requiere_receta"),
+    )
+
+    @validates("tipo")
+    def _asignar_tipo(self, key, tipo):
+        self.tipo_clave = normalizar(tipo)
+        return tipo
+
+
+class NombresVersionDB(Base):
+    """
+    Versión de los nombres y tipos de productos (una sola fila, ``id = 1``).
+
+    Las altas, bajas y cambios de nombre o tipo la incrementan en su misma
+    transacción; el índice de búsqueda de cada proceso la compara con la que
+    cargó para saber si tiene que reconstruirse. Los cambios de stock o
+    precio no la tocan.
+    """
+    __tablename__ = "productos_nombres_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
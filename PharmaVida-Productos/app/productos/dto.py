@@ -42,8 +42,118 @@ class ProductoResponse(ProductoBase):
         from_attributes = True
 
 
+def producto_a_dict(obj) -> dict:
+    """Mismo contenido que ProductoResponse, sin construir el modelo (listados)."""
+    return {
+        "nombre": obj.nombre,
+        "tipo": obj.tipo,
+        "precio": obj.precio,
+        "stock": obj.stock,
+        "requiere_receta": bool(obj.requiere_receta),
+        "id": obj.id,
+        "fecha_creacion": obj.fecha_creacion,
+        "fecha_actualizacion": obj.fecha_actualizacion,
+    }
+
+
+CAMPOS_PRODUCTO = (
+    "id", "nombre", "tipo", "precio", "stock", "requiere_receta", "fecha_creacion", "fecha_actualizacion"
+)
+
+
+def producto_a_dict_campos(fila, campos) -> dict:
+    """Solo ``campos`` de un producto o de una fila con esas columnas (?fields=)."""
+    data = {campo: getattr(fila, campo) for campo in campos}
+    if "requiere_receta" in data:
+        data["requiere_receta"] = bool(data["requiere_receta"])
+    return data
+
+
 class ProductosPaginadosResponse(BaseModel):
+    total: Optional[int] = Field(None, description="Null con conteo=none")
+    conteo: str = Field(..., description="Estrategia que produjo el total: exact, cached, estimate o none")
+    page: int
+    pagesize: int
+    productos: List[ProductoResponse]
+
+
+class ProductosCursorResponse(BaseModel):
+    pagesize: int
+    has_more: bool
+    after: Optional[str] = Field(None, description="Cursor de la página siguiente (null en la última)")
+    productos: List[ProductoResponse]
+
+
+class SugerenciaProducto(BaseModel):
+    id: int
+    nombre: str
+    tipo: str
+
+
+class AutocompletarResponse(BaseModel):
+    sugerencias: List[SugerenciaProducto]
+
+
+class FacetaTipo(BaseModel):
+    tipo: str
+    clave: Optional[str] = Field(None, description="Valor para /tipo?tipo= (minúsculas y sin tildes)")
+    total: int
+
+
+class FacetaReceta(BaseModel):
+    requiere: int
+    no_requiere: int
+
+
+class FacetasResponse(BaseModel):
     total: int
+    tipos: List[FacetaTipo]
+    receta: FacetaReceta
+
+
+class ProductoParcial(BaseModel):
+    """Producto con solo los campos pedidos en ``fields``."""
+    id: Optional[int] = None
+    nombre: Optional[str] = None
+    tipo: Optional[str] = None
+    precio: Optional[float] = None
+    stock: Optional[int] = None
+    requiere_receta: Optional[bool] = None
+    fecha_creacion: Optional[datetime] = None
+    fecha_actualizacion: Optional[datetime] = None
+
+
+class ConsultaPaginadaResponse(BaseModel):
+    total: Optional[int] = None
+    conteo: str
     page: int
     pagesize: int
+    productos: List[ProductoParcial]
+
+
+class ConsultaCursorResponse(BaseModel):
+    pagesize: int
+    has_more: bool
+    after: Optional[str] = None
+    productos: List[ProductoParcial]
+
+
+class ProductosBatchResponse(BaseModel):
     productos: List[ProductoResponse]
+    faltantes: List[int]
+
+
+class StockItem(BaseModel):
+    producto_id: int
+    cantidad: int = Field(..., gt=0)
+
+class DescontarStockRequest(BaseModel):
+    items: List[StockItem] = Field(..., min_length=1)
+
+class StockItemResultado(BaseModel):
+    producto_id: int
+    cantidad: int
+    stock_restante: int
+
+class DescontarStockResponse(BaseModel):
+    items: List[StockItemResultado]
@@ -0,0 +1,62 @@
+"""
+Ajustes de esquema para bases creadas con versiones anteriores.
+
+``Base.metadata.create_all`` crea las tablas que faltan pero no agrega
+columnas ni índices a una tabla existente: esto agrega ``tipo_clave``, la
+completa a partir de ``tipo``, pasa ``precio`` de FLOAT a DECIMAL(10,2) y crea
+los índices que falten. También crea la fila de ``productos_nombres_version``.
+"""
+
+import logging
+
+from sqlalchemy import Float, bindparam, inspect, select, text, update
+
+from app.core.texto import normalizar
+from app.productos.domain import NombresVersionDB, ProductoDB
+
+logger = logging.getLogger(__name__)
+
+LOTE = 1000
+
+
+def _completar_tipo_clave(conn):
+    tabla = ProductoDB.__table__
+    filas = conn.execute(
+        text("SELECT id, tipo FROM productos WHERE tipo_clave IS NULL")
+    ).fetchall()
+    stmt = (
+        update(tabla)
+        .where(tabla.c.id == bindparam("_id"))
+        .values(tipo_clave=bindparam("_clave"))
+    )
+    for i in range(0, len(filas), LOTE):
+        conn.execute(stmt, [{"_id": id_, "_clave": normalizar(tipo)} for id_, tipo in filas[i:i + LOTE]])
+    return len(filas)
+
+
+def actualizar_esquema(engine):
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        columnas = {c["name"] for c in inspector.get_columns("productos")}
+        if "tipo_clave" not in columnas:
+            logger.info("Agregando columna productos.tipo_clave")
+            conn.execute(text("ALTER TABLE productos ADD COLUMN tipo_clave VARCHAR(100) NULL"))
+        completados = _completar_tipo_clave(conn)
+        if completados:
+            logger.info("tipo_clave completado en %d productos", completados)
+
+        # SQLite guarda REAL de doble precisión y no tiene MODIFY: solo MySQL
+        tipo_precio = next(c["type"] for c in inspector.get_columns("productos") if c["name"] == "precio")
+        if conn.dialect.name == "mysql" and isinstance(tipo_precio, Float):
+            logger.info("Convirtiendo productos.precio a DECIMAL(10,2)")
+            conn.execute(text("ALTER TABLE productos MODIFY precio DECIMAL(10,2) NOT NULL"))
+
+        existentes = {i["name"] for i in inspector.get_indexes("productos")}
+        for indice in ProductoDB.__table__.indexes:
+            if indice.name not in existentes:
+                logger.info("Creando índice %s", indice.name)
+                indice.create(conn)
+
+        version = NombresVersionDB.__table__
+        if conn.execute(select(version.c.id).where(version.c.id == 1)).first() is None:
+            conn.execute(version.insert().values(id=1, version=0))
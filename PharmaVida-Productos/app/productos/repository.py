@@ -1,11 +1,15 @@
 from datetime import datetime
 
+from sqlalchemy import case, func, update as sql_update
 from sqlalchemy.orm import Session
-from app.productos.domain import ProductoDB
+from app.productos.domain import NombresVersionDB, ProductoDB
 
 def get_by_id(db: Session, producto_id: int):
     return db.query(ProductoDB).filter(ProductoDB.id == producto_id).first()
 
+def get_by_ids(db: Session, producto_ids: list):
+    return db.query(ProductoDB).filter(ProductoDB.id.in_(producto_ids)).all()
+
 def get_by_nombre(db: Session, nombre: str):
     return db.query(ProductoDB).filter(ProductoDB.nombre == nombre).first()
 
@@ -44,6 +48,18 @@ def update(db: Session, producto, update_data: dict):
     db.refresh(producto)
     return producto
 
+def get_version_nombres(db: Session):
+    return db.query(NombresVersionDB.version).filter(NombresVersionDB.id == 1).scalar() or 0
+
+def incrementar_version_nombres(db: Session):
+    """Incrementa la versión de los nombres dentro de la transacción en curso (sin commit)."""
+    db.execute(
+        sql_update(NombresVersionDB)
+        .where(NombresVersionDB.id == 1)
+        .values(version=NombresVersionDB.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
 def update_stock(db: Session, producto, nuevo_stock: int):
     producto.stock = nuevo_stock
     producto.fecha_actualizacion = datetime.utcnow()
@@ -53,4 +69,52 @@ def update_stock(db: Session, producto, nuevo_stock: int):
 
 def delete(db: Session, producto):
     db.delete(producto)
-    db.commit()
\ No newline at end of file
+    db.commit()
+
+def get_stocks(db: Session, producto_ids: list):
+    rows = db.query(ProductoDB.id, ProductoDB.stock).filter(ProductoDB.id.in_(producto_ids)).all()
+    return {producto_id: stock for producto_id, stock in rows}
+
+def descontar_stock(db: Session, cantidades: dict):
+    """
+    Descuenta stock de varios productos con un único UPDATE condicional.
+
+    Solo se confirma si todas las filas cumplen ``stock >= cantidad``; en
+    caso contrario se revierte y se devuelve False.
+    """
+    descuento = case(cantidades, value=ProductoDB.id)
+    stmt = (
+        sql_update(ProductoDB)
+        .where(ProductoDB.id.in_(list(cantidades)), ProductoDB.stock >= descuento)
+        .values(stock=ProductoDB.stock - descuento, fecha_actualizacion=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    try:
+        result = db.execute(stmt)
+        if result.rowcount != len(cantidades):
+            db.rollback()
+            return False, get_stocks(db, list(cantidades))
+        stocks = get_stocks(db, list(cantidades))
+        db.commit()
+        return True, stocks
+    except Exception:
+        db.rollback()
+        raise
+
+def reponer_stock(db: Session, cantidades: dict):
+    """Suma stock a varios productos con un único UPDATE; devuelve el stock resultante."""
+    reposicion = case(cantidades, value=ProductoDB.id)
+    stmt = (
+        sql_update(ProductoDB)
+        .where(ProductoDB.id.in_(list(cantidades)))
+        .values(stock=ProductoDB.stock + reposicion, fecha_actualizacion=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    try:
+        db.execute(stmt)
+        stocks = get_stocks(db, list(cantidades))
+        db.commit()
+        return stocks
+    except Exception:
+        db.rollback()
+        raise
@@ -1,9 +1,20 @@
+import bisect
+from typing import Optional
+
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.conteo import EXACT, NONE, conteo_cache, contar
+from app.core.texto import normalizar
+from app.core.pagination import codificar_cursor, criterios_orden, decodificar_cursor, paginar_keyset
+from app.productos.busqueda import indice_nombres
+from app.productos.domain import ProductoDB
 from app.productos.repository import (
-    get_by_id, get_by_nombre, get_all, create, update, delete,
-    get_by_tipo, get_stock_bajo, get_con_receta, get_sin_receta, update_stock
+    get_by_id, get_by_ids, get_by_nombre, get_all, create, update, delete,
+    get_by_tipo, get_stock_bajo, get_con_receta, get_sin_receta, update_stock,
+    descontar_stock, reponer_stock, incrementar_version_nombres
 )
-from app.productos.dto import ProductoCreate, ProductoUpdate
+from app.productos.dto import CAMPOS_PRODUCTO, ProductoCreate, ProductoUpdate
 
 from fastapi import HTTPException, status, Query
 
@@ -12,7 +23,11 @@ def crear_producto(db: Session, producto: ProductoCreate):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ya existe un producto con este nombre")
     data = producto.dict()
     data["requiere_receta"] = 1 if data["requiere_receta"] else 0
-    return create(db, data)
+    incrementar_version_nombres(db)
+    producto = create(db, data)
+    conteo_cache.invalidate()
+    indice_nombres.actualizar(producto)
+    return producto
 
 def obtener_productos(db: Session, skip=0, limit=100, tipo=None, stock_minimo=None):
     return get_all(db, skip, limit, tipo, stock_minimo)
@@ -23,18 +38,43 @@ def obtener_producto(db: Session, producto_id: int):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
     return producto
 
+def obtener_productos_por_ids(db: Session, producto_ids: list):
+    ids_unicos = list(dict.fromkeys(producto_ids))
+    if len(ids_unicos) > settings.PRODUCTOS_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Se permiten como máximo {settings.PRODUCTOS_BATCH_MAX} ids por consulta"
+        )
+    productos_por_id = {p.id: p for p in get_by_ids(db, ids_unicos)}
+    productos = [productos_por_id[i] for i in ids_unicos if i in productos_por_id]
+    faltantes = [i for i in ids_unicos if i not in productos_por_id]
+    return productos, faltantes
+
 def actualizar_producto(db: Session, producto_id: int, producto_update: ProductoUpdate):
     producto = get_by_id(db, producto_id)
     if not producto:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
     update_data = producto_update.dict(exclude_unset=True)
-    return update(db, producto, update_data)
+    # Solo nombre y tipo cambian lo que guarda el índice de búsqueda
+    cambia_indice = any(
+        campo in update_data and update_data[campo] != getattr(producto, campo) for campo in ("nombre", "tipo")
+    )
+    if cambia_indice:
+        incrementar_version_nombres(db)
+    producto = update(db, producto, update_data)
+    conteo_cache.invalidate()
+    if cambia_indice:
+        indice_nombres.actualizar(producto)
+    return producto
 
 def eliminar_producto(db: Session, producto_id: int):
     producto = get_by_id(db, producto_id)
     if not producto:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
+    incrementar_version_nombres(db)
     delete(db, producto)
+    conteo_cache.invalidate()
+    indice_nombres.quitar(producto_id)
 
 def actualizar_stock_producto(db: Session, producto_id: int, nuevo_stock: int):
     producto = get_by_id(db, producto_id)
@@ -42,7 +82,60 @@ def actualizar_stock_producto(db: Session, producto_id: int, nuevo_stock: int):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
     if nuevo_stock < 0:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="nuevo_stock debe ser un número mayor o igual a 0")
-    return update_stock(db, producto, nuevo_stock)
+    producto = update_stock(db, producto, nuevo_stock)
+    conteo_cache.invalidate()
+    return producto
+
+def _cantidades_por_producto(items: list):
+    cantidades = {}
+    for item in items:
+        cantidades[item.producto_id] = cantidades.get(item.producto_id, 0) + item.cantidad
+    if len(cantidades) > settings.PRODUCTOS_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Se permiten como máximo {settings.PRODUCTOS_BATCH_MAX} productos por operación"
+        )
+    return cantidades
+
+def descontar_stock_productos(db: Session, items: list):
+    """Aplica todas las líneas de descuento o ninguna (409 con el detalle de las que no alcanzan)."""
+    cantidades = _cantidades_por_producto(items)
+    aplicado, stocks = descontar_stock(db, cantidades)
+    if aplicado:
+        conteo_cache.invalidate()
+    else:
+        insuficientes = [
+            {
+                "producto_id": producto_id,
+                "solicitado": cantidad,
+                "disponible": stocks.get(producto_id),
+                "motivo": "no_existe" if producto_id not in stocks else "stock_insuficiente"
+            }
+            for producto_id, cantidad in cantidades.items()
+            if producto_id not in stocks or stocks[producto_id] < cantidad
+        ]
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"mensaje": "Stock insuficiente; no se aplicó ningún descuento", "items": insuficientes}
+        )
+    return [
+        {"producto_id": producto_id, "cantidad": cantidad, "stock_restante": stocks[producto_id]}
+        for producto_id, cantidad in cantidades.items()
+    ]
+
+def reponer_stock_productos(db: Session, items: list):
+    """
+    Devuelve al stock lo descontado para una compra que no llegó a
+    registrarse. Los productos que ya no existen se ignoran.
+    """
+    cantidades = _cantidades_por_producto(items)
+    stocks = reponer_stock(db, cantidades)
+    conteo_cache.invalidate()
+    return [
+        {"producto_id": producto_id, "cantidad": cantidad, "stock_restante": stocks[producto_id]}
+        for producto_id, cantidad in cantidades.items()
+        if producto_id in stocks
+    ]
 
 def obtener_productos_por_tipo(db: Session, tipo: str):
     return get_by_tipo(db, tipo)
@@ -56,29 +149,222 @@ def obtener_productos_con_receta(db: Session):
 def obtener_productos_sin_receta(db: Session):
     return get_sin_receta(db)
 
-def paginar_query(query: Query, page: int, pagesize: int):
-    total = query.count()
+def _clave_texto(texto: str) -> str:
+    # ilike no distingue mayúsculas: "Analg" y " analg" son el mismo filtro
+    return texto.strip().lower()
+
+def paginar_query(query: Query, page: int, pagesize: int, after: Optional[str] = None,
+                  conteo: Optional[str] = None, clave: tuple = (), orden: str = "id", descendente: bool = False):
+    """
+    Pagina un listado de productos ordenado por ``orden`` (e id).
+
+    Sin ``after`` usa OFFSET con el total calculado según ``conteo`` (ver
+    ``app.core.conteo``; ``clave`` identifica el filtro en la caché); con
+    ``after`` (vacío para la primera página) pagina por cursor: sin total y
+    con ``has_more`` y el cursor de la página siguiente.
+    """
+    if after is not None:
+        items, has_more, siguiente = paginar_keyset(query, ProductoDB, after, pagesize, orden, descendente)
+        return {"pagesize": pagesize, "has_more": has_more, "after": siguiente, "productos": items}
+    total, estrategia = contar(query, conteo or settings.CONTEO_DEFAULT, clave)
     skip = (page - 1) * pagesize
-    items = query.offset(skip).limit(pagesize).all()
-    return total, items
+    items = query.order_by(*criterios_orden(ProductoDB, orden, descendente)).offset(skip).limit(pagesize).all()
+    return {"total": total, "conteo": estrategia, "page": page, "pagesize": pagesize, "productos": items}
 
-def obtener_productos_paginados(db: Session, page: int = 1, pagesize: int = 25):
-    query = db.query(get_by_id.__globals__['ProductoDB'])
-    return paginar_query(query, page, pagesize)
+def obtener_productos_paginados(db: Session, page: int = 1, pagesize: int = 25, after: Optional[str] = None,
+                                conteo: Optional[str] = None):
+    query = db.query(ProductoDB)
+    return paginar_query(query, page, pagesize, after, conteo, ("todos",))
 
-def obtener_productos_por_tipo_paginados(db: Session, tipo: str, page: int = 1, pagesize: int = 25):
-    query = db.query(get_by_id.__globals__['ProductoDB']).filter(get_by_id.__globals__['ProductoDB'].tipo.ilike(f"%{tipo}%"))
-    return paginar_query(query, page, pagesize)
+def obtener_productos_por_tipo_paginados(db: Session, tipo: str, page: int = 1, pagesize: int = 25,
+                                         after: Optional[str] = None, conteo: Optional[str] = None,
+                                         parcial: bool = False):
+    if parcial:
+        query = db.query(ProductoDB).filter(ProductoDB.tipo.ilike(f"%{tipo}%"))
+        return paginar_query(query, page, pagesize, after, conteo, ("tipo-parcial", _clave_texto(tipo)))
+    # Igualdad sobre el tipo normalizado: usa ix_productos_tipo_clave_id
+    clave = normalizar(tipo)
+    query = db.query(ProductoDB).filter(ProductoDB.tipo_clave == clave)
+    return paginar_query(query, page, pagesize, after, conteo, ("tipo", clave))
 
-def obtener_productos_stock_bajo_paginados(db: Session, minimo: int, page: int = 1, pagesize: int = 25):
-    query = db.query(get_by_id.__globals__['ProductoDB']).filter(get_by_id.__globals__['ProductoDB'].stock < minimo)
-    return paginar_query(query, page, pagesize)
+def obtener_productos_stock_bajo_paginados(db: Session, minimo: int, page: int = 1, pagesize: int = 25,
+                                           after: Optional[str] = None, conteo: Optional[str] = None):
+    query = db.query(ProductoDB).filter(ProductoDB.stock < minimo)
+    return paginar_query(query, page, pagesize, after, conteo, ("stock-bajo", minimo))
 
-def obtener_productos_por_receta_paginados(db: Session, requiere_receta: bool, page: int = 1, pagesize: int = 25):
-    query = db.query(get_by_id.__globals__['ProductoDB']).filter(get_by_id.__globals__['ProductoDB'].requiere_receta.is_(requiere_receta))
-    return paginar_query(query, page, pagesize)
+def obtener_productos_por_receta_paginados(db: Session, requiere_receta: bool, page: int = 1, pagesize: int = 25,
+                                           after: Optional[str] = None, conteo: Optional[str] = None):
+    query = db.query(ProductoDB).filter(ProductoDB.requiere_receta.is_(requiere_receta))
+    return paginar_query(query, page, pagesize, after, conteo, ("receta", requiere_receta))
 
-def obtener_productos_por_nombre_paginados(db: Session, nombre: str, page: int = 1, pagesize: int = 25):
-    ProductoDB = get_by_id.__globals__['ProductoDB']
+def paginar_ids(db: Session, ids: list, page: int, pagesize: int, after: Optional[str] = None,
+                conteo: Optional[str] = None):
+    """
+    Igual que ``paginar_query`` pero sobre ids ya resueltos (ascendentes)
+    por el índice de búsqueda: el total es exacto y sin COUNT, y solo se
+    leen de la base los productos de la página.
+    """
+    if after is not None:
+        if after:
+            _, ultimo_id = decodificar_cursor(after, "id")
+            ids = ids[bisect.bisect_right(ids, ultimo_id):]
+        pagina_ids, has_more = ids[:pagesize], len(ids) > pagesize
+    else:
+        skip = (page - 1) * pagesize
+        pagina_ids = ids[skip:skip + pagesize]
+    productos = sorted(get_by_ids(db, pagina_ids), key=lambda p: p.id) if pagina_ids else []
+    if after is not None:
+        siguiente = codificar_cursor("id", pagina_ids[-1], pagina_ids[-1]) if has_more else None
+        return {"pagesize": pagesize, "has_more": has_more, "after": siguiente, "productos": productos}
+    estrategia = NONE if (conteo or settings.CONTEO_DEFAULT) == NONE else EXACT
+    return {
+        "total": None if estrategia == NONE else len(ids),
+        "conteo": estrategia,
+        "page": page,
+        "pagesize": pagesize,
+        "productos": productos,
+    }
+
+def obtener_productos_por_nombre_paginados(db: Session, nombre: str, page: int = 1, pagesize: int = 25,
+                                           after: Optional[str] = None, conteo: Optional[str] = None):
+    if settings.BUSQUEDA_INDICE:
+        indice_nombres.asegurar(db)
+        return paginar_ids(db, indice_nombres.buscar(nombre), page, pagesize, after, conteo)
     query = db.query(ProductoDB).filter(ProductoDB.nombre.ilike(f"%{nombre}%"))
-    return paginar_query(query, page, pagesize)
\ No newline at end of file
+    return paginar_query(query, page, pagesize, after, conteo, ("nombre", _clave_texto(nombre)))
+
+ORDENES = ("id", "nombre", "precio", "stock", "fecha_creacion", "fecha_actualizacion")
+
+def _campos_consulta(fields: Optional[str]):
+    if not fields:
+        return CAMPOS_PRODUCTO
+    campos = tuple(dict.fromkeys(c.strip() for c in fields.split(",") if c.strip()))
+    desconocidos = [c for c in campos if c not in CAMPOS_PRODUCTO]
+    if desconocidos or not campos:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Campos desconocidos en fields: {', '.join(desconocidos)}. Válidos: {', '.join(CAMPOS_PRODUCTO)}"
+        )
+    return campos
+
+def _validar_rango(nombre: str, minimo, maximo):
+    if minimo is not None and maximo is not None and minimo > maximo:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{nombre}_min no puede ser mayor que {nombre}_max"
+        )
+
+def consultar_productos(db: Session, tipo: Optional[str] = None, requiere_receta: Optional[bool] = None,
+                        stock_min: Optional[int] = None, stock_max: Optional[int] = None,
+                        precio_min: Optional[float] = None, precio_max: Optional[float] = None,
+                        nombre: Optional[str] = None, orden: str = "id", fields: Optional[str] = None,
+                        page: int = 1, pagesize: int = 25, after: Optional[str] = None,
+                        conteo: Optional[str] = None):
+    """
+    Combina los filtros de /tipo, /receta, /stock-bajo y /nombre (más rangos de
+    precio y stock, inclusivos) en una sola consulta, ordenada por ``orden``
+    (``-campo`` para descendente) y leyendo solo las columnas de ``fields``.
+
+    Returns:
+        tuple: ``(pagina, campos)`` como ``paginar_query``; los productos son
+        filas con las columnas pedidas (más id y la de orden)
+    """
+    descendente = orden.startswith("-")
+    orden = orden.lstrip("-")
+    if orden not in ORDENES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"orden debe ser uno de: {', '.join(ORDENES)} (con - para descendente)"
+        )
+    _validar_rango("stock", stock_min, stock_max)
+    _validar_rango("precio", precio_min, precio_max)
+    campos = _campos_consulta(fields)
+
+    # El cursor necesita id y la columna de orden aunque no se pidan
+    columnas = dict.fromkeys(campos + ("id", orden))
+    query = db.query(*(getattr(ProductoDB, c) for c in columnas))
+    clave_tipo = normalizar(tipo) if tipo else None
+    if clave_tipo is not None:
+        query = query.filter(ProductoDB.tipo_clave == clave_tipo)
+    if requiere_receta is not None:
+        query = query.filter(ProductoDB.requiere_receta.is_(requiere_receta))
+    if stock_min is not None:
+        query = query.filter(ProductoDB.stock >= stock_min)
+    if stock_max is not None:
+        query = query.filter(ProductoDB.stock <= stock_max)
+    if precio_min is not None:
+        query = query.filter(ProductoDB.precio >= precio_min)
+    if precio_max is not None:
+        query = query.filter(ProductoDB.precio <= precio_max)
+    if nombre:
+        ids = None
+        if settings.BUSQUEDA_INDICE:
+            indice_nombres.asegurar(db)
+            ids = indice_nombres.buscar(nombre)
+        # Pocos resultados en el índice: IN por clave primaria; si no, LIKE
+        if ids is not None and len(ids) <= settings.BUSQUEDA_IN_MAX:
+            query = query.filter(ProductoDB.id.in_(ids))
+        else:
+            query = query.filter(ProductoDB.nombre.ilike(f"%{nombre}%"))
+
+    clave = (
+        "consulta", clave_tipo, requiere_receta, stock_min, stock_max, precio_min, precio_max,
+        _clave_texto(nombre) if nombre else None
+    )
+    pagina = paginar_query(query, page, pagesize, after, conteo, clave, orden, descendente)
+    return pagina, campos
+
+def obtener_facetas(db: Session):
+    """
+    Cantidad de productos por tipo y por receta con un único GROUP BY
+    (resuelto desde ix_productos_tipo_clave_receta). Se guarda en la caché de
+    conteos, que se vacía con cada escritura de productos.
+    """
+    clave = ("facetas",)
+    facetas = conteo_cache.get(clave)
+    if facetas is not None:
+        return facetas
+    generacion = conteo_cache.generacion
+    filas = (
+        db.query(
+            ProductoDB.tipo_clave,
+            ProductoDB.requiere_receta,
+            func.min(ProductoDB.tipo),
+            func.count(ProductoDB.id),
+        )
+        .group_by(ProductoDB.tipo_clave, ProductoDB.requiere_receta)
+        .all()
+    )
+    tipos = {}
+    receta = {"requiere": 0, "no_requiere": 0}
+    for tipo_clave, requiere_receta, tipo, cantidad in filas:
+        faceta = tipos.setdefault(tipo_clave, {"tipo": tipo, "clave": tipo_clave, "total": 0})
+        faceta["tipo"] = min(faceta["tipo"], tipo)
+        faceta["total"] += cantidad
+        receta["requiere" if requiere_receta else "no_requiere"] += cantidad
+    facetas = {
+        "total": receta["requiere"] + receta["no_requiere"],
+        "tipos": sorted(tipos.values(), key=lambda f: (-f["total"], f["clave"] or "")),
+        "receta": receta,
+    }
+    conteo_cache.set(clave, facetas, generacion)
+    return facetas
+
+def autocompletar_productos(db: Session, texto: str, limite: int = 10):
+    limite = min(limite, settings.AUTOCOMPLETAR_LIMITE_MAX)
+    if settings.BUSQUEDA_INDICE:
+        indice_nombres.asegurar(db)
+        return indice_nombres.autocompletar(texto, limite)
+    # Sin índice en memoria: nombres que empiezan con el texto (LIKE 'texto%'
+    # usa el índice de nombre), primero los más cortos
+    texto = texto.strip()
+    if not texto:
+        return []
+    filas = (
+        db.query(ProductoDB.id, ProductoDB.nombre, ProductoDB.tipo)
+        .filter(ProductoDB.nombre.like(f"{texto}%"))
+        .order_by(func.length(ProductoDB.nombre), ProductoDB.nombre, ProductoDB.id)
+        .limit(limite)
+        .all()
+    )
+    return [{"id": id_, "nombre": nombre, "tipo": tipo} for id_, nombre, tipo in filas]
@@ -0,0 +1,70 @@
+"""
+Fixtures de los tests: la API de productos sobre SQLite en memoria.
+
+No hace falta MySQL: ``get_db`` se reemplaza por sesiones de un engine
+SQLite propio de cada test, con las tablas creadas desde los modelos.
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.conteo import conteo_cache
+from app.core.database import Base, get_db
+from app.core.jsoncodec import FastJSONResponse
+from app.productos.controller import router as productos_router
+from app.productos.esquema import actualizar_esquema
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    actualizar_esquema(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def sesiones(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db(sesiones):
+    with sesiones() as db:
+        yield db
+
+
+@pytest.fixture
+def cliente(sesiones):
+    def get_db_prueba():
+        with sesiones() as db:
+            yield db
+
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.include_router(productos_router, prefix="/api")
+    app.dependency_overrides[get_db] = get_db_prueba
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def _conteos_limpios():
+    conteo_cache.invalidate()
+    yield
+    conteo_cache.invalidate()
+
+
+def crear_productos(cliente, productos):
+    """Da de alta ``productos`` (dicts parciales) por la API y devuelve sus ids."""
+    ids = []
+    for producto in productos:
+        body = {"nombre": "Producto", "tipo": "analgesico", "precio": 1.0, "stock": 10, "requiere_receta": False}
+        body.update(producto)
+        response = cliente.post("/api/productos", json=body)
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+    return ids
@@ -0,0 +1,40 @@
+import pytest
+
+from app.core.config import settings
+from app.productos.busqueda import IndiceNombres
+from app.productos import service
+from tests.conftest import crear_productos
+
+
+@pytest.fixture(params=[True, False], ids=["indice", "sin-indice"])
+def busqueda_indice(request, monkeypatch):
+    monkeypatch.setattr(settings, "BUSQUEDA_INDICE", request.param)
+    monkeypatch.setattr(service, "indice_nombres", IndiceNombres(settings.BUSQUEDA_REFRESCO))
+    return request.param
+
+
+def sugerencias(cliente, q, limit=10):
+    response = cliente.get("/api/productos/autocompletar", params={"q": q, "limit": limit})
+    assert response.status_code == 200, response.text
+    return [s["nombre"] for s in response.json()["sugerencias"]]
+
+
+def test_sugiere_nombres_que_empiezan_con_el_texto(cliente, busqueda_indice):
+    crear_productos(cliente, [
+        {"nombre": "Paracetamol 500mg"},
+        {"nombre": "Paracetamol"},
+        {"nombre": "Ibuprofeno"},
+        {"nombre": "Para-dent"},
+    ])
+
+    assert sugerencias(cliente, "parac") == ["Paracetamol", "Paracetamol 500mg"]
+    assert sugerencias(cliente, "para", limit=2) == ["Para-dent", "Paracetamol"]
+    assert sugerencias(cliente, "amox") == []
+
+
+def test_sin_indice_no_lo_construye(cliente, busqueda_indice):
+    crear_productos(cliente, [{"nombre": "Ibuprofeno"}])
+
+    sugerencias(cliente, "ibu")
+
+    assert service.indice_nombres.listo is busqueda_indice
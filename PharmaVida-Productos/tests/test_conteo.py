@@ -0,0 +1,70 @@
+from app.core.conteo import ConteoCache
+from tests.conftest import crear_productos
+
+
+def test_set_de_una_generacion_anterior_se_descarta():
+    cache = ConteoCache(ttl=30, max_entries=10)
+    generacion = cache.generacion
+
+    # Una escritura entre el COUNT y el set: el total ya no vale
+    cache.invalidate()
+    cache.set(("todos",), 5, generacion)
+
+    assert cache.get(("todos",)) is None
+    cache.set(("todos",), 6, cache.generacion)
+    assert cache.get(("todos",)) == 6
+
+
+def test_invalidate_vacia_la_cache():
+    cache = ConteoCache(ttl=30, max_entries=10)
+    cache.set(("tipo", "analgesico"), 3, cache.generacion)
+
+    cache.invalidate()
+
+    assert cache.get(("tipo", "analgesico")) is None
+
+
+def test_entradas_vencidas_y_lru():
+    vencida = ConteoCache(ttl=-1, max_entries=10)
+    vencida.set(("todos",), 1, vencida.generacion)
+    assert vencida.get(("todos",)) is None
+
+    cache = ConteoCache(ttl=30, max_entries=2)
+    cache.set("a", 1, cache.generacion)
+    cache.set("b", 2, cache.generacion)
+    cache.get("a")
+    cache.set("c", 3, cache.generacion)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+
+def listado(cliente, conteo="cached"):
+    response = cliente.get("/api/productos/paged", params={"conteo": conteo, "pagesize": 1})
+    assert response.status_code == 200, response.text
+    pagina = response.json()
+    return pagina["total"], pagina["conteo"]
+
+
+def test_total_cacheado_se_recalcula_tras_cada_escritura(cliente):
+    (a,) = crear_productos(cliente, [{"nombre": "A"}])
+
+    assert listado(cliente) == (1, "exact")
+    assert listado(cliente) == (1, "cached")
+
+    (b,) = crear_productos(cliente, [{"nombre": "B"}])
+    assert listado(cliente) == (2, "exact")
+    assert listado(cliente) == (2, "cached")
+
+    cliente.post("/api/productos/stock/descontar", json={"items": [{"producto_id": a, "cantidad": 1}]})
+    assert listado(cliente) == (2, "exact")
+
+    cliente.delete(f"/api/productos/{b}")
+    assert listado(cliente) == (1, "exact")
+
+
+def test_none_y_estimate(cliente):
+    crear_productos(cliente, [{"nombre": "A"}, {"nombre": "B"}])
+
+    assert listado(cliente, "none") == (None, "none")
+    # Sin EXPLAIN de MySQL, estimate usa la caché
+    assert listado(cliente, "estimate") == (2, "exact")
+    assert listado(cliente, "estimate") == (2, "cached")
@@ -0,0 +1,70 @@
+import pytest
+
+from app.core.pagination import codificar_cursor
+from app.productos.domain import ProductoDB
+from tests.conftest import crear_productos
+
+PRECIOS = [19.99, 0.1, 2.5, 19.99, 0.3, 2.5, 7.25, 0.1, 19.99, 0.2, 2.5]
+
+
+def recorrer(cliente, orden, pagesize, **params):
+    """Todas las páginas de /consulta siguiendo el cursor; devuelve los productos en orden."""
+    productos, after, paginas = [], "", 0
+    while after is not None:
+        response = cliente.get("/api/productos/consulta", params={
+            "orden": orden, "pagesize": pagesize, "after": after, **params
+        })
+        assert response.status_code == 200, response.text
+        pagina = response.json()
+        productos.extend(pagina["productos"])
+        after = pagina["after"]
+        assert pagina["has_more"] == (after is not None)
+        paginas += 1
+    return productos, paginas
+
+
+@pytest.mark.parametrize("orden", ["precio", "-precio"])
+@pytest.mark.parametrize("pagesize", [1, 2, 3, 5])
+def test_cursor_por_precio_con_empates_y_decimales(cliente, orden, pagesize):
+    ids = crear_productos(cliente, [{"nombre": f"P{i}", "precio": p} for i, p in enumerate(PRECIOS)])
+    esperado = sorted(zip(PRECIOS, ids), reverse=orden.startswith("-"))
+
+    productos, paginas = recorrer(cliente, orden, pagesize, fields="id,precio")
+
+    assert [(p["precio"], p["id"]) for p in productos] == esperado
+    assert paginas == -(-len(PRECIOS) // pagesize)
+
+
+@pytest.mark.parametrize("orden", ["id", "nombre", "-stock"])
+def test_cursor_recorre_todo_sin_repetir(cliente, orden):
+    crear_productos(cliente, [
+        {"nombre": f"Producto {13 - i:02d}", "stock": i % 3, "precio": 1.5 + i / 100} for i in range(13)
+    ])
+
+    productos, _ = recorrer(cliente, orden, 4)
+
+    assert sorted(p["id"] for p in productos) == list(range(1, 14))
+
+
+def test_precio_se_guarda_como_decimal():
+    assert ProductoDB.__table__.c.precio.type.scale == 2
+
+
+def test_cursor_de_otro_orden_es_400(cliente):
+    crear_productos(cliente, [{"precio": 1.0}])
+
+    response = cliente.get("/api/productos/consulta", params={
+        "orden": "precio", "after": codificar_cursor("-precio", 1.0, 1)
+    })
+
+    assert response.status_code == 400
+
+
+def test_cursor_con_precio_invalido_es_400(cliente):
+    crear_productos(cliente, [{"precio": 1.0}])
+
+    response = cliente.get("/api/productos/consulta", params={
+        "orden": "precio", "after": codificar_cursor("precio", "abc", 1)
+    })
+
+    assert response.status_code == 400
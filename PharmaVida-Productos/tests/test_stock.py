@@ -0,0 +1,67 @@
+from tests.conftest import crear_productos
+
+
+def descontar(cliente, *lineas):
+    items = [{"producto_id": producto_id, "cantidad": cantidad} for producto_id, cantidad in lineas]
+    return cliente.post("/api/productos/stock/descontar", json={"items": items})
+
+
+def stock(cliente, producto_id):
+    return cliente.get(f"/api/productos/{producto_id}").json()["stock"]
+
+
+def test_descuenta_todas_las_lineas(cliente):
+    a, b = crear_productos(cliente, [{"nombre": "A", "stock": 5}, {"nombre": "B", "stock": 3}])
+
+    response = descontar(cliente, (a, 2), (b, 3))
+
+    assert response.status_code == 200, response.text
+    assert {i["producto_id"]: i["stock_restante"] for i in response.json()["items"]} == {a: 3, b: 0}
+    assert (stock(cliente, a), stock(cliente, b)) == (3, 0)
+
+
+def test_una_linea_sin_stock_no_descuenta_ninguna(cliente):
+    a, b = crear_productos(cliente, [{"nombre": "A", "stock": 5}, {"nombre": "B", "stock": 1}])
+
+    response = descontar(cliente, (a, 2), (b, 2))
+
+    assert response.status_code == 409
+    assert response.json()["detail"]["items"] == [
+        {"producto_id": b, "solicitado": 2, "disponible": 1, "motivo": "stock_insuficiente"}
+    ]
+    assert (stock(cliente, a), stock(cliente, b)) == (5, 1)
+
+
+def test_producto_inexistente_no_descuenta_ninguna(cliente):
+    (a,) = crear_productos(cliente, [{"nombre": "A", "stock": 5}])
+
+    response = descontar(cliente, (a, 1), (999, 1))
+
+    assert response.status_code == 409
+    assert response.json()["detail"]["items"] == [
+        {"producto_id": 999, "solicitado": 1, "disponible": None, "motivo": "no_existe"}
+    ]
+    assert stock(cliente, a) == 5
+
+
+def test_lineas_repetidas_se_suman(cliente):
+    (a,) = crear_productos(cliente, [{"nombre": "A", "stock": 3}])
+
+    assert descontar(cliente, (a, 2), (a, 2)).status_code == 409
+    assert stock(cliente, a) == 3
+
+    assert descontar(cliente, (a, 1), (a, 2)).status_code == 200
+    assert stock(cliente, a) == 0
+
+
+def test_reponer_devuelve_el_stock_e_ignora_inexistentes(cliente):
+    (a,) = crear_productos(cliente, [{"nombre": "A", "stock": 5}])
+    descontar(cliente, (a, 4))
+
+    response = cliente.post("/api/productos/stock/reponer", json={"items": [
+        {"producto_id": a, "cantidad": 4}, {"producto_id": 999, "cantidad": 1}
+    ]})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["items"] == [{"producto_id": a, "cantidad": 4, "stock_restante": 5}]
+    assert stock(cliente, a) == 5
@@ -30,6 +30,16 @@ public class ComprasController {
         return ResponseEntity.ok(compra);
     }
 
+    @PreAuthorize("hasAnyRole('CLIENTE', 'ADMIN')")
+    @PostMapping("/lote")
+    public ResponseEntity<List<CompraResponseDto>> registrarCompras(
+            @AuthenticationPrincipal UserDetails userDetails,
+            @RequestBody List<CompraRequestDto> dtos) {
+        Long usuarioId = comprasService.getUsuarioIdFromDni(userDetails.getUsername());
+        List<CompraResponseDto> compras = comprasService.registrarCompras(usuarioId, dtos);
+        return ResponseEntity.ok(compras);
+    }
+
     @PreAuthorize("hasAnyRole('CLIENTE', 'ADMIN')")
     @GetMapping("/me")
     public ResponseEntity<List<CompraResponseDto>> listarMisCompras(
@@ -9,6 +9,7 @@ import com.example.farmacy.usuario.infrastructure.UserRepository;
 import com.example.farmacy.utils.SequenceSyncUtil;
 import org.springframework.beans.factory.annotation.Autowired;
 import org.springframework.stereotype.Service;
+import org.springframework.transaction.annotation.Transactional;
 
 import java.time.LocalDateTime;
 import java.util.List;
@@ -38,26 +39,53 @@ public class ComprasService {
         if (!userRepository.existsById(dto.getUsuarioId())) {
             throw new IllegalArgumentException("El usuario no existe");
         }
+        return toResponse(comprasRepository.save(nuevaCompra(dto.getUsuarioId(), dto)));
+    }
+
+    /**
+     * Registra varias compras del mismo usuario en una sola transacción:
+     * o se guardan todas o ninguna.
+     */
+    @Transactional
+    public List<CompraResponseDto> registrarCompras(Long usuarioId, List<CompraRequestDto> dtos) {
+        if (dtos == null || dtos.isEmpty()) {
+            throw new IllegalArgumentException("Se requiere al menos una compra");
+        }
+        sequenceSyncUtil.syncSequence("compras", "id");
+
+        if (!userRepository.existsById(usuarioId)) {
+            throw new IllegalArgumentException("El usuario no existe");
+        }
+        List<Compras> compras = dtos.stream()
+                .map(dto -> nuevaCompra(usuarioId, dto))
+                .collect(Collectors.toList());
+
+        return comprasRepository.saveAll(compras).stream()
+                .map(this::toResponse)
+                .collect(Collectors.toList());
+    }
+
+    private Compras nuevaCompra(Long usuarioId, CompraRequestDto dto) {
         if (dto.getProductos() == null || dto.getCantidades() == null ||
                 dto.getProductos().size() != dto.getCantidades().size() || dto.getProductos().isEmpty()) {
             throw new IllegalArgumentException("Las listas de productos y cantidades deben ser válidas y del mismo tamaño");
         }
 
-        Compras compra = Compras.builder()
-                .usuarioId(dto.getUsuarioId())
+        return Compras.builder()
+                .usuarioId(usuarioId)
                 .productos(dto.getProductos())
                 .cantidades(dto.getCantidades())
                 .fechaCompra(LocalDateTime.now())
                 .build();
+    }
 
-        Compras saved = comprasRepository.save(compra);
-
+    private CompraResponseDto toResponse(Compras compra) {
         return new CompraResponseDto(
-                saved.getId(),
-                saved.getFechaCompra(),
-                saved.getUsuarioId(),
-                saved.getProductos(),
-                saved.getCantidades()
+                compra.getId(),
+                compra.getFechaCompra(),
+                compra.getUsuarioId(),
+                compra.getProductos(),
+                compra.getCantidades()
         );
     }
 